@@ -0,0 +1,106 @@
+import ast
+import hwruntime
+from nodes import *
+from optimize import constantValue
+
+ARITHMETIC_OPS = {'+': ast.Add, '-': ast.Sub, '*': ast.Mult, '/': ast.Div}
+COMPARE_OPS = {'==': ast.Eq, '!=': ast.NotEq, '<': ast.Lt, '<=': ast.LtE, '>': ast.Gt, '>=': ast.GtE}
+
+# CodeObjectBuilder turns a syntax tree from TreeParser into a Python code object in memory, by building
+# the equivalent Python ast and passing it to compile(). It runs the same statements CodeGenerator writes
+# to out.py, without writing the file or parsing the generated source again. Line numbers in tracebacks
+# point at the HelloWorld source.
+class CodeObjectBuilder:
+    def __init__(self, filename="<hw>"):
+        self.filename = filename
+
+    def build(self, tree):
+        body = [ast.Import(names=[ast.alias(name='sys')], lineno=1, col_offset=0, end_lineno=1, end_col_offset=0),
+                ast.ImportFrom(module='hwruntime', names=[ast.alias(name='*')], level=0,
+                               lineno=1, col_offset=0, end_lineno=1, end_col_offset=0)]
+        body.extend(self.block(tree.body))
+        module = ast.Module(body=body, type_ignores=[])
+        ast.fix_missing_locations(module)
+        return compile(module, self.filename, 'exec')
+
+    # Build and run the program in a fresh namespace, as if it were executed as a script.
+    def run(self, tree):
+        hwruntime.execute(self.build(tree))
+
+    def block(self, body):
+        statements = [self.statement(node) for node in body]
+        return statements or [ast.Pass()]
+
+    def statement(self, node):
+        result = self.buildStatement(node)
+        result.lineno = result.end_lineno = node.line or 1
+        result.col_offset = result.end_col_offset = 0
+        return result
+
+    def buildStatement(self, node):
+        kind = type(node)
+        if kind is PrintString:
+            return ast.Expr(self.call('hwPrint', [ast.Constant(node.text)]))
+        if kind is Print:
+            return ast.Expr(self.call('hwPrint', [self.expression(node.value)]))
+        if kind is If:
+            orelse = self.block(node.orelse) if node.orelse is not None else []
+            return ast.If(test=self.expression(node.condition), body=self.block(node.body), orelse=orelse)
+        if kind is While:
+            return ast.While(test=self.expression(node.condition), body=self.block(node.body), orelse=[])
+        if kind is ForRange:
+            # Two statements, for and if, so they go in an always-true if to stay one statement.
+            target = ast.Name(id=node.name, ctx=ast.Load())
+            loop = ast.For(target=ast.Name(id=node.name, ctx=ast.Store()),
+                           iter=self.call('range', [target, self.expression(node.stop)]), body=self.block(node.body), orelse=[])
+            fixup = ast.If(test=ast.Compare(left=target, ops=[ast.Lt()], comparators=[self.expression(node.stop)]),
+                           body=[self.assign(node.name, self.expression(node.stop))], orelse=[])
+            return ast.If(test=ast.Constant(True), body=[loop, fixup], orelse=[])
+        if kind is Func:
+            arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg=param) for param in node.params],
+                                      kwonlyargs=[], kw_defaults=[], defaults=[])
+            # A function the Memoizer picked is wrapped in hwMemo, like the @hwMemo(size) line CodeGenerator writes.
+            decorators = [self.call('hwMemo', [ast.Constant(node.memo)])] if node.memo else []
+            function = ast.FunctionDef(name=node.name, args=arguments, body=self.block(node.body), decorator_list=decorators)
+            if 'type_params' in ast.FunctionDef._fields:
+                function.type_params = []
+            return function
+        if kind is Let:
+            return self.assign(node.name, self.expression(node.value))
+        if kind is Input:
+            return self.assign(node.name, self.call('hwInput', []))
+        if kind is Return:
+            return ast.Return(self.expression(node.value))
+        if kind is Condition:
+            return ast.Expr(self.expression(node.condition))
+        raise ValueError("Unknown statement " + kind.__name__)
+
+    def assign(self, name, value):
+        return ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=value)
+
+    def call(self, name, args):
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=args, keywords=[])
+
+    def expression(self, node):
+        kind = type(node)
+        if kind is Number:
+            return ast.Constant(constantValue(node))
+        if kind is Name:
+            return ast.Name(id=node.name, ctx=ast.Load())
+        if kind is Call:
+            return self.call(node.name, [self.expression(arg) for arg in node.args])
+        if kind is Unary:
+            op = ast.USub() if node.op == '-' else ast.UAdd()
+            return ast.UnaryOp(op=op, operand=self.expression(node.operand))
+        if kind is BinOp:
+            return ast.BinOp(left=self.expression(node.left), op=ARITHMETIC_OPS[node.op](), right=self.expression(node.right))
+        if kind is Compare:
+            return ast.Compare(left=self.expression(node.left), ops=[COMPARE_OPS[op]() for op in node.ops],
+                               comparators=[self.expression(comparator) for comparator in node.comparators])
+        if kind is BoolOp:
+            op = ast.And() if node.op == 'and' else ast.Or()
+            return ast.BoolOp(op=op, values=[self.expression(node.left), self.expression(node.right)])
+        if kind is Not:
+            return ast.UnaryOp(op=ast.Not(), operand=self.expression(node.operand))
+        raise ValueError("Unknown expression " + kind.__name__)
+
@@ -0,0 +1,103 @@
+from lex import *
+from compiler import *
+import argparse
+import concurrent.futures
+import glob
+import os
+import sys
+import time
+
+# Batch compilation: compile many .hw files across a pool of worker processes.
+# Every input gets its own output file, and errors are collected per file instead of stopping the batch.
+#
+#   python3 batch.py example/ 'more/**/*.hw' -o build -j 8
+
+# Expand directories (recursively) and glob patterns into a sorted list of .hw files.
+def findSources(inputs):
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, "**", "*.hw"), recursive=True))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+# Map every source to outDir, keeping its path relative to the directory all sources share.
+def outputPaths(sources, outDir):
+    if not sources:
+        return []
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in sources])
+    outputs = []
+    for path in sources:
+        relative = os.path.relpath(os.path.abspath(path), base)
+        outputs.append(os.path.join(outDir, os.path.splitext(relative)[0] + ".py"))
+    return outputs
+
+# Compile one file in a worker. Returns (source, output, size in bytes, error message or None).
+# The output is only written once the whole file compiled, so a failed file leaves nothing behind.
+def compileOne(job):
+    source, output, optimize, memo, inline = job
+    size = os.path.getsize(source)
+    try:
+        with open(source, 'r') as inputFile:
+            result = compileSource(Lexer.fromStream(inputFile), CompileOptions(optimize=optimize, memo=memo, inline=inline))
+        if not result.ok:
+            return source, output, size, str(CompileError(result.diagnostics))
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, 'w') as outputFile:
+            outputFile.write(result.code)
+    except Exception as error:
+        return source, output, size, f"{type(error).__name__}: {error}"
+    return source, output, size, None
+
+# Compile all sources with a process pool. Returns the list of results from compileOne.
+# The outputs import hwruntime, so a copy of hwruntime.py goes into every directory that got one.
+def compileBatch(sources, outDir, jobs=None, optimize=False, memo=None, inline=None):
+    work = [(source, output, optimize, memo, inline) for source, output in zip(sources, outputPaths(sources, outDir))]
+    if not work:
+        return []
+    jobs = jobs or os.cpu_count() or 1
+    chunkSize = max(1, len(work) // (jobs * 8))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(compileOne, work, chunksize=chunkSize))
+    for directory in sorted({os.path.dirname(output) for source, output, size, error in results if error is None}):
+        copyRuntime(directory)
+    return results
+
+def main():
+    argParser = argparse.ArgumentParser(description="Compile many HelloWorld programs in parallel.")
+    argParser.add_argument("inputs", nargs="+", help="source files, directories or glob patterns")
+    argParser.add_argument("-o", dest="outDir", default="build", help="output directory (default: build)")
+    argParser.add_argument("-j", dest="jobs", type=int, default=None, help="number of worker processes (default: CPU count)")
+    argParser.add_argument("-O", dest="optimize", action="store_true", help="optimize like main.py -O")
+    argParser.add_argument("--memo", action="store_true", help="remember the results of pure functions, like main.py --memo")
+    argParser.add_argument("--memo-size", type=int, default=1024, metavar="SIZE", help="entries in the memo table of each function (default: 1024)")
+    argParser.add_argument("--inline", action="store_true", help="replace calls of small functions by their RETURN expression, like main.py --inline")
+    argParser.add_argument("--inline-size", type=int, default=24, metavar="SIZE", help="largest expression in nodes to put in place of a call (default: 24)")
+    arguments = argParser.parse_args()
+    if arguments.memo_size < 1:
+        argParser.error("--memo-size must be at least 1")
+    if arguments.inline_size < 1:
+        argParser.error("--inline-size must be at least 1")
+
+    sources = findSources(arguments.inputs)
+    start = time.perf_counter()
+    results = compileBatch(sources, arguments.outDir, arguments.jobs, arguments.optimize,
+                           arguments.memo_size if arguments.memo else None, arguments.inline_size if arguments.inline else None)
+    elapsed = time.perf_counter() - start
+
+    failed = [(source, error) for source, output, size, error in results if error is not None]
+    for source, error in failed:
+        for line in error.splitlines():
+            print(f"[error] {source}: {line}")
+    totalBytes = sum(size for source, output, size, error in results)
+    rate = elapsed if elapsed > 0 else float('inf')
+    print(f"[info] - Compiled {len(results) - len(failed)} of {len(results)} files into {arguments.outDir} "
+          f"in {elapsed:.2f} s ({len(results) / rate:.1f} files/sec, {totalBytes / (1024 * 1024) / rate:.2f} MB/sec)")
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Compilations per second through compileSource in one process, against launching main.py for each program.
+#
+#   python3 benchmark/api.py [rounds] [file.hw ...]
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from compiler import *
+
+
+def throughput(sources, options, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for source in sources:
+            result = compileSource(source, options)
+            if not result.ok:
+                raise RuntimeError(str(result.diagnostics[0]))
+    return rounds * len(sources) / (time.perf_counter() - start)
+
+
+# Launch main.py for a few programs, in a scratch directory so out.py lands there.
+def processThroughput(paths, count=10):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        for index in range(count):
+            path = os.path.abspath(paths[index % len(paths)])
+            subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), path], cwd=directory,
+                           stdout=subprocess.DEVNULL, check=True)
+        return count / (time.perf_counter() - start)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    paths = sys.argv[2:] or sorted(glob.glob(os.path.join(ROOT, "example", "*.hw")))
+    sources = []
+    for path in paths:
+        with open(path, 'r') as inputFile:
+            sources.append(inputFile.read())
+
+    print(f"{len(sources)} programs, {rounds} rounds")
+    print(f"compileSource:             {throughput(sources, CompileOptions(), rounds):8.0f} compilations/sec")
+    print(f"compileSource, optimize:   {throughput(sources, CompileOptions(optimize=True), rounds):8.0f} compilations/sec")
+    print(f"compileSource, codeObject: {throughput(sources, CompileOptions(codeObject=True), rounds):8.0f} compilations/sec")
+    print(f"python3 main.py per file:  {processThroughput(paths):8.0f} compilations/sec")
+
+
+if __name__ == '__main__':
+    main()
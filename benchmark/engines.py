@@ -0,0 +1,112 @@
+# Time loop-heavy programs on the two execution engines: the generated Python (what out.py and --run do)
+# and the register VM in vm.py (--vm), each with and without the -O passes.
+#
+#   python3 benchmark/engines.py [iterations] [file.hw ...]
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+from emit import *
+from treeparse import *
+from codegen import *
+from optimize import *
+from typeinfer import *
+from vm import *
+import hwruntime
+from loops import loopProgram
+
+
+def nestedProgram(iterations):
+    side = max(int(iterations ** 0.5), 1)
+    return f"""LET i = 0
+LET total = 0
+WHILE i < {side} REPEAT
+    LET j = 0
+    WHILE j < {side} REPEAT
+        IF j < i THEN
+            LET total = total + i - j
+        ELSE
+            LET total = total + 1
+        ENDIF
+        LET j = j + 1
+    ENDWHILE
+    LET i = i + 1
+ENDWHILE
+PRINT total
+"""
+
+
+def callProgram(iterations):
+    return f"""LET x = 0
+FUNC square(x)
+    RETURN x * x
+ENDFUNC
+LET n = 0
+LET s = 0
+WHILE n <= {iterations} REPEAT
+    LET s = s + square(n) / 2
+    LET n = n + 1
+ENDWHILE
+PRINT s
+"""
+
+
+def parse(source, optimize):
+    treeParser = TreeParser(Lexer(source))
+    tree = treeParser.program()
+    if optimize:
+        ConstantFolder().program(tree)
+        LoopOptimizer(treeParser.symbols).program(tree)
+        TypeInference(treeParser.symbols).program(tree)
+    return tree
+
+
+def transpiled(tree):
+    emitter = Emitter()
+    CodeGenerator(emitter).program(tree)
+    code = compile(emitter.getCode(), "out.py", "exec")
+    return lambda: hwruntime.execute(code)
+
+
+def virtualMachine(tree):
+    main = VMCompiler().program(tree)
+    return lambda: VirtualMachine().execute(main)
+
+
+def best(run, repeat=3):
+    result = None
+    for _ in range(repeat):
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            run()
+        elapsed = time.perf_counter() - start
+        result = elapsed if result is None else min(result, elapsed)
+    return result, output.getvalue()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    sources = {"counting loop": loopProgram(iterations), "nested loops": nestedProgram(iterations),
+               "function calls": callProgram(iterations // 4)}
+    for path in sys.argv[2:]:
+        with open(path, 'r') as inputFile:
+            sources[path] = inputFile.read()
+
+    # WHILE loops nest one Python call deep per level in the tree passes.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    for name, source in sources.items():
+        for optimize in (False, True):
+            pythonTime, pythonOutput = best(transpiled(parse(source, optimize)))
+            vmTime, vmOutput = best(virtualMachine(parse(source, optimize)))
+            status = "same output" if pythonOutput == vmOutput else "OUTPUT DIFFERS"
+            print(f"{name}{' -O' if optimize else ''}: python {pythonTime * 1000:.1f} ms, vm {vmTime * 1000:.1f} ms, "
+                  f"vm/python {vmTime / pythonTime:.2f}x ({status})")
+
+
+if __name__ == '__main__':
+    main()
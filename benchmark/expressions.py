@@ -0,0 +1,60 @@
+# Parse time of the operator precedence engine against the recursive descent productions it replaced,
+# on long operator chains and on deeply nested conditions.
+#
+#   python3 benchmark/expressions.py [scale] [repeat]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+from emit import *
+from parse import *
+from treeparse import *
+from generate import expressionsProgram
+
+
+# count conditions, each depth NOTs and parentheses deep. BooleanFactor lets the parentheses stay open.
+def nestedConditions(count, depth):
+    lines = ["LET a = 1"]
+    for index in range(count):
+        lines.append("IF " + "NOT (" * depth + f"a > {index} THEN")
+        lines.append("PRINT a")
+        lines.append("ENDIF")
+    return '\n'.join(lines) + '\n'
+
+
+# Best time of repeat parses with the direct Parser or the TreeParser, or the error that stopped it.
+def best(tokens, tree, recursive, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            if tree:
+                TreeParser(tokens, recursive).program()
+            else:
+                Parser(tokens, Emitter(), recursive).program()
+        except RecursionError:
+            return "RecursionError"
+        times.append(time.perf_counter() - start)
+    return f"{min(times) * 1000:8.1f} ms"
+
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    workloads = [
+        ("long chains", expressionsProgram(int(500 * scale), 200)),
+        ("nesting 100", nestedConditions(int(200 * scale), 100)),
+        ("nesting 2000", nestedConditions(int(10 * scale) or 1, 2000)),
+    ]
+    print(f"{'':14} {'Parser':>26} {'TreeParser':>30}")
+    print(f"{'':14} {'recursive':>12} {'engine':>12}   {'recursive':>14} {'engine':>14}")
+    for name, source in workloads:
+        tokens = TokenArray(Lexer(source))
+        results = [best(tokens, tree, recursive, repeat) for tree in (False, True) for recursive in (True, False)]
+        print(f"{name:14} {results[0]:>12} {results[1]:>12}   {results[2]:>14} {results[3]:>14}")
+
+
+if __name__ == '__main__':
+    main()
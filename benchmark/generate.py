@@ -0,0 +1,99 @@
+# Generate large HelloWorld programs for benchmarking. Every program is valid, needs no INPUT and terminates.
+#
+#   python3 benchmark/generate.py nested|functions|expressions|prints|mixed [scale] > program.hw
+import sys
+
+# Python allows at most 100 levels of indentation and 20 nested loops, so the generated code has to stay below.
+MAX_DEPTH = 90
+MAX_LOOPS = 15
+
+
+# count blocks of IF/WHILE nested depth deep. Each WHILE runs its body once.
+def nestedProgram(count=200, depth=60):
+    depth = min(depth, MAX_DEPTH)
+    lines = ["LET total = 0"]
+    for level in range(depth):
+        lines.append(f"LET w{level} = 0")
+    for block in range(count):
+        closers = []
+        for level in range(depth):
+            indent = "    " * level
+            if level % 2 == 0 and closers.count("ENDWHILE") < MAX_LOOPS:
+                lines.append(f"{indent}LET w{level} = 0")
+                lines.append(f"{indent}WHILE w{level} < 1 REPEAT")
+                lines.append(f"{indent}    LET w{level} = w{level} + 1")
+                closers.append("ENDWHILE")
+            else:
+                lines.append(f"{indent}IF total >= {block} THEN")
+                closers.append("ENDIF")
+        lines.append("    " * depth + "LET total = total + 1")
+        for level in reversed(range(depth)):
+            lines.append("    " * level + closers[level])
+    lines.append("PRINT total")
+    return '\n'.join(lines) + '\n'
+
+
+# count FUNCs with bodySize statements each, each called once. The parser only knows names declared with
+# LET, so the parameters a and b are declared as globals first.
+def functionsProgram(count=2000, bodySize=8):
+    lines = ["LET a = 1", "LET b = 2", "LET total = 0"]
+    for index in range(count):
+        lines.append(f"FUNC f{index}(a, b)")
+        for statement in range(bodySize):
+            lines.append(f"    LET v{statement} = a * {statement + 1} + b - {index % 7}")
+            lines.append(f"    IF v{statement} > {index} THEN")
+            lines.append(f"        LET a = a + 1")
+            lines.append(f"    ENDIF")
+        lines.append(f"    RETURN a + b")
+        lines.append("ENDFUNC")
+        lines.append(f"LET total = total + f{index}({index % 10}, 3)")
+    lines.append("PRINT total")
+    return '\n'.join(lines) + '\n'
+
+
+# count assignments of expressions with terms terms each. The values stay small so execution time is
+# dominated by evaluating the expressions, not by big-number arithmetic.
+def expressionsProgram(count=2000, terms=40):
+    operators = [" + ", " - ", " * ", " + ", "/"]
+    lines = ["LET x = 3", "LET y = 5", "LET z = 0"]
+    for index in range(count):
+        parts = ["x"]
+        for term in range(1, terms):
+            operand = ["x", "y", str(term % 9 + 1), "2.5"][term % 4]
+            parts.append(operators[term % len(operators)] + operand)
+        lines.append(f"LET e{index} = " + ''.join(parts))
+        lines.append(f"LET z = z + e{index} - e{index}")
+    lines.append("PRINT z")
+    return '\n'.join(lines) + '\n'
+
+
+# count string PRINTs in a row.
+def printsProgram(count=50000):
+    return ''.join(f'PRINT "line {index} of the generated output"\n' for index in range(count))
+
+
+# A bit of everything, in proportion to scale.
+def mixedProgram(scale=1):
+    return (functionsProgram(int(300 * scale), 4) + expressionsProgram(int(300 * scale), 20)
+            + nestedProgram(int(20 * scale), 30) + printsProgram(int(5000 * scale)))
+
+
+# name -> function of a scale factor returning the program source.
+WORKLOADS = {
+    "nested": lambda scale: nestedProgram(int(200 * scale)),
+    "functions": lambda scale: functionsProgram(int(2000 * scale)),
+    "expressions": lambda scale: expressionsProgram(int(2000 * scale)),
+    "prints": lambda scale: printsProgram(int(50000 * scale)),
+    "mixed": mixedProgram,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in WORKLOADS:
+        sys.exit(f"Syntax: {sys.argv[0]} {'|'.join(WORKLOADS)} [scale]")
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    sys.stdout.write(WORKLOADS[sys.argv[1]](scale))
+
+
+if __name__ == '__main__':
+    main()
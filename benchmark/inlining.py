@@ -0,0 +1,83 @@
+# Time call-heavy programs with and without the Inliner (main.py --inline), on the generated Python and on
+# the register VM, and list the calls it inlined in each.
+#
+#   python3 benchmark/inlining.py [iterations] [size] [file.hw ...]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+from treeparse import *
+from optimize import *
+from typeinfer import *
+from inline import *
+from engines import callProgram, transpiled, virtualMachine, best
+from generate import functionsProgram
+
+
+# Small helpers called from a counting loop, the case inlining is for: each call does less work than
+# setting up its frame.
+def helpersProgram(iterations):
+    return f"""LET a = 0
+LET b = 0
+LET n = 0
+LET total = 0
+FUNC add(a, b)
+    LET c = a + b
+    RETURN c
+ENDFUNC
+FUNC scale(a)
+    RETURN add(a, a) * 3
+ENDFUNC
+WHILE n < {iterations} REPEAT
+    LET total = add(total, scale(n)) - n
+    LET n = n + 1
+ENDWHILE
+PRINT total
+"""
+
+
+def parse(source, optimize, size):
+    treeParser = TreeParser(Lexer(source))
+    tree = treeParser.program()
+    inliner = Inliner(size)
+    if size:
+        inliner.program(tree)
+    if optimize:
+        ConstantFolder().program(tree)
+        LoopOptimizer(treeParser.symbols).program(tree)
+        TypeInference(treeParser.symbols).program(tree)
+    return tree, inliner.report
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'example')
+    with open(os.path.join(examples, 'Example3.hw'), 'r') as inputFile:
+        sources = {"Example3.hw": inputFile.read()}
+    sources.update({"helpers": helpersProgram(iterations), "function calls": callProgram(iterations),
+                    "functions workload": functionsProgram(200)})
+    for path in sys.argv[3:]:
+        with open(path, 'r') as inputFile:
+            sources[path] = inputFile.read()
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    for name, source in sources.items():
+        report = parse(source, False, size)[1]
+        print(f"{name}: {len(report)} call(s) inlined")
+        for line in report[:5]:
+            print("    " + line)
+        if len(report) > 5:
+            print(f"    ... and {len(report) - 5} more")
+        for optimize in (False, True):
+            for engine, build in (("python", transpiled), ("vm", virtualMachine)):
+                calledTime, calledOutput = best(build(parse(source, optimize, 0)[0]))
+                inlinedTime, inlinedOutput = best(build(parse(source, optimize, size)[0]))
+                status = "same output" if calledOutput == inlinedOutput else "OUTPUT DIFFERS"
+                print(f"    {engine}{' -O' if optimize else ''}: calls {calledTime * 1000:.2f} ms, inlined {inlinedTime * 1000:.2f} ms, "
+                      f"speedup {calledTime / inlinedTime:.2f}x ({status})")
+
+
+if __name__ == '__main__':
+    main()
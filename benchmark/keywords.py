@@ -0,0 +1,86 @@
+# Count and time keyword lookups for identifier-heavy sources.
+# Compares the original linear scan over TokenType with the KEYWORDS index used by the lexer.
+#
+#   python3 benchmark/keywords.py [file.hw ...]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+
+
+# The lookup Token.checkIfKeyword used to do, instrumented to count the enum members it visits.
+class LinearLookup:
+    def __init__(self):
+        self.lookups = 0
+        self.visited = 0
+
+    def __call__(self, tokenText):
+        self.lookups += 1
+        for kind in TokenType:
+            self.visited += 1
+            if kind.name == tokenText and kind.value >= 100 and kind.value < 200:
+                return kind
+        return None
+
+
+# The lookup Token.checkIfKeyword does now: one probe into the prebuilt index.
+class IndexedLookup:
+    def __init__(self):
+        self.lookups = 0
+        self.visited = 0
+
+    def __call__(self, tokenText):
+        self.lookups += 1
+        self.visited += 1
+        return KEYWORDS.get(tokenText)
+
+
+# Identifier-heavy program: many LETs and variable references.
+def generateSource(count):
+    lines = ["LET v0 = 0"]
+    for i in range(1, count):
+        lines.append(f"LET v{i} = v{i - 1} + v{i // 2} * v{i // 3}")
+    lines.append(f"PRINT v{count - 1}")
+    return '\n'.join(lines)
+
+
+def words(source):
+    lexer = Lexer(source)
+    texts = []
+    token = lexer.getToken()
+    while token.kind != TokenType.EOF:
+        if token.kind == TokenType.IDENT or Token.checkIfKeyword(token.text) is not None:
+            texts.append(token.text)
+        token = lexer.getToken()
+    return texts
+
+
+def measure(lookup, texts):
+    start = time.perf_counter()
+    for text in texts:
+        lookup(text)
+    return time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) > 1:
+        sources = {}
+        for path in sys.argv[1:]:
+            with open(path, 'r') as inputFile:
+                sources[path] = inputFile.read()
+    else:
+        sources = {"generated (20000 LETs)": generateSource(20000)}
+
+    for name, source in sources.items():
+        texts = words(source)
+        print(f"{name}: {len(texts)} identifier/keyword tokens")
+        for label, lookup in (("before (linear scan)", LinearLookup()), ("after (keyword index)", IndexedLookup())):
+            elapsed = measure(lookup, texts)
+            print(f"  {label:22} lookups={lookup.lookups} members visited={lookup.visited} "
+                  f"({lookup.visited / max(lookup.lookups, 1):.1f}/lookup) time={elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
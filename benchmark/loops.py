@@ -0,0 +1,73 @@
+# Time generated code for tight numeric WHILE loops with and without LoopOptimizer.
+#
+#   python3 benchmark/loops.py [iterations] [file.hw ...]
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+from emit import *
+from treeparse import *
+from codegen import *
+import hwruntime
+from optimize import *
+
+
+def loopProgram(iterations):
+    return f"""LET n = 0
+LET k = 3
+LET m = 7
+LET s = 0
+WHILE n < {iterations} REPEAT
+    LET t = k * m + k * 2 - m
+    LET scratch = n * k * m
+    LET s = s + t * n + k * m * 2
+    LET n = n + 1
+ENDWHILE
+PRINT s
+"""
+
+
+def compileProgram(source, loops):
+    treeParser = TreeParser(Lexer(source))
+    tree = treeParser.program()
+    if loops:
+        LoopOptimizer(treeParser.symbols).program(tree)
+    emitter = Emitter()
+    CodeGenerator(emitter).program(tree)
+    return emitter.getCode()
+
+
+def run(code, repeat=3):
+    compiled = compile(code, "out.py", "exec")
+    best = None
+    for _ in range(repeat):
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            hwruntime.execute(compiled)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output.getvalue()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    sources = {f"generated loop ({iterations} iterations)": loopProgram(iterations)}
+    for path in sys.argv[2:]:
+        with open(path, 'r') as inputFile:
+            sources[path] = inputFile.read()
+
+    for name, source in sources.items():
+        plainTime, plainOutput = run(compileProgram(source, False))
+        optimizedTime, optimizedOutput = run(compileProgram(source, True))
+        status = "same output" if plainOutput == optimizedOutput else "OUTPUT DIFFERS"
+        print(f"{name}: plain {plainTime * 1000:.1f} ms, loop-optimized {optimizedTime * 1000:.1f} ms, "
+              f"speedup {plainTime / optimizedTime:.2f}x ({status})")
+
+
+if __name__ == '__main__':
+    main()
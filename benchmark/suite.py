@@ -0,0 +1,156 @@
+# Benchmark suite: time every compiler phase on the generated programs from generate.py.
+# Results go to stdout (or -o FILE) as JSON; a readable table goes to stderr.
+#
+#   python3 benchmark/suite.py [--scale 1.0] [--repeat 5] [--only nested,prints] [-o results.json]
+#   python3 benchmark/suite.py --compare old.json new.json [--threshold 0.10]
+#
+# Phases:
+#   lex        Lexer into a TokenArray.
+#   parse      TreeParser over the lexed tokens.
+#   emit       CodeGenerator from the tree.
+#   direct     Parser over the lexed tokens, parsing and emitting in one pass (the default main.py path).
+#   pycompile  Python's compile() of the generated code.
+#   execute    Running the generated code, with its output discarded.
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lex import *
+from emit import *
+from parse import *
+from treeparse import *
+from codegen import *
+import hwruntime
+from generate import WORKLOADS
+
+PHASES = ["lex", "parse", "emit", "direct", "pycompile", "execute"]
+
+
+def timePhases(source):
+    times = {}
+    start = time.perf_counter()
+    tokens = TokenArray(Lexer(source))
+    times["lex"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tree = TreeParser(tokens).program()
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    emitter = Emitter()
+    CodeGenerator(emitter).program(tree)
+    code = emitter.getCode()
+    times["emit"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Parser(tokens, Emitter()).program()
+    times["direct"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = compile(code, "out.py", "exec")
+    times["pycompile"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        hwruntime.execute(compiled)
+    times["execute"] = time.perf_counter() - start
+    return times, len(tokens)
+
+
+def runSuite(names, scale, repeat):
+    results = {"python": platform.python_version(), "implementation": platform.python_implementation(),
+               "machine": platform.machine(), "scale": scale, "repeat": repeat, "workloads": {}}
+    for name in names:
+        source = WORKLOADS[name](scale)
+        samples = {phase: [] for phase in PHASES}
+        for _ in range(repeat):
+            gc.collect()
+            times, tokenCount = timePhases(source)
+            for phase in PHASES:
+                samples[phase].append(times[phase])
+        results["workloads"][name] = {
+            "bytes": len(source),
+            "lines": source.count('\n'),
+            "tokens": tokenCount,
+            "phases": {phase: {"min": min(values), "median": statistics.median(values)} for phase, values in samples.items()},
+        }
+        printWorkload(name, results["workloads"][name])
+    return results
+
+
+def printWorkload(name, workload):
+    phases = "  ".join(f"{phase} {workload['phases'][phase]['min'] * 1000:8.1f}" for phase in PHASES)
+    print(f"{name:12} {workload['bytes'] / 1024:8.0f} KB  {phases}  (ms, best of run)", file=sys.stderr)
+
+
+# Compare the best times of two runs. A phase counts as a regression when it got slower by more than
+# threshold and by more than floor seconds, so phases that take next to no time do not flap.
+# Returns the number of regressions.
+def compare(oldPath, newPath, threshold, floor=0.001):
+    with open(oldPath, 'r') as oldFile:
+        old = json.load(oldFile)
+    with open(newPath, 'r') as newFile:
+        new = json.load(newFile)
+    if old.get("scale") != new.get("scale"):
+        print(f"warning: runs use different scales ({old.get('scale')} and {new.get('scale')})")
+
+    regressions = 0
+    for name, workload in new["workloads"].items():
+        if name not in old["workloads"]:
+            continue
+        for phase, times in workload["phases"].items():
+            before = old["workloads"][name]["phases"].get(phase)
+            if before is None:
+                continue
+            oldTime = before["min"]
+            newTime = times["min"]
+            ratio = newTime / oldTime if oldTime else float('inf')
+            status = ""
+            if ratio > 1 + threshold and newTime - oldTime > floor:
+                status = "REGRESSION"
+                regressions += 1
+            elif ratio < 1 - threshold and oldTime - newTime > floor:
+                status = "improved"
+            print(f"{name:12} {phase:10} {oldTime * 1000:10.1f} ms {newTime * 1000:10.1f} ms {ratio:6.2f}x  {status}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the compiler phases on generated programs.")
+    argParser.add_argument("--scale", type=float, default=1.0, help="size of the generated programs (default: 1.0)")
+    argParser.add_argument("--repeat", type=int, default=5, help="runs per workload; the best and median are kept")
+    argParser.add_argument("--only", help="comma separated workloads to run: " + ", ".join(WORKLOADS))
+    argParser.add_argument("-o", dest="output", help="write the JSON results to this file instead of stdout")
+    argParser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    argParser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression (default: 0.10)")
+    arguments = argParser.parse_args()
+
+    if arguments.compare:
+        sys.exit(1 if compare(*arguments.compare, arguments.threshold) else 0)
+
+    names = arguments.only.split(",") if arguments.only else list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            argParser.error(f"unknown workload {name}")
+    # Block statements recurse once per nesting level, and the tree passes once per operator too.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    results = runSuite(names, arguments.scale, arguments.repeat)
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            json.dump(results, outputFile, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,22 @@ if [ ! -f "$FILE" ]; then
     exit 1
 fi
 
-# Executing
-python3 main.py "$FILE"
+# Executing. Use the compile server (python3 server.py) when one is running, it skips loading the compiler.
+# client.py exits with 3 when the socket is stale, then compile without the server.
+if [ -S .hwserver.sock ]; then
+    python3 client.py "$FILE"
+    STATUS=$?
+    if [ "$STATUS" -eq 3 ]; then
+        python3 main.py "$FILE"
+        STATUS=$?
+    fi
+else
+    python3 main.py "$FILE"
+    STATUS=$?
+fi
+
+# Only run out.py if it was compiled from this file.
+if [ "$STATUS" -ne 0 ]; then
+    exit "$STATUS"
+fi
 python3 out.py
\ No newline at end of file
@@ -0,0 +1,128 @@
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+
+# Modules whose source makes up the compiler. Their contents are hashed into COMPILER_VERSION,
+# so editing any of them invalidates every cache entry.
+COMPILER_MODULES = ["lex", "diagnostics", "parse", "emit", "nodes", "treeparse", "codegen", "optimize", "typeinfer", "purity", "inline",
+                    "backend", "compiler", "main"]
+
+def compilerVersion():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in COMPILER_MODULES:
+        with open(os.path.join(directory, module + ".py"), 'rb') as moduleFile:
+            digest.update(moduleFile.read())
+    # Marshalled code objects are only valid for the interpreter that wrote them.
+    digest.update(importlib.util.MAGIC_NUMBER)
+    return digest.hexdigest()
+
+COMPILER_VERSION = compilerVersion()
+
+
+# CompileCache keeps compiled programs on disk, one file per entry, keyed by a hash of the source,
+# the compiler version and the compile options. Reading an entry refreshes its modification time,
+# and storing one evicts the least recently used entries until the cache fits in maxBytes.
+# Hit, miss and eviction counts are kept in stats.json in the cache directory.
+class CompileCache:
+    def __init__(self, directory, maxBytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.statsPath = os.path.join(directory, "stats.json")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # Hash a source file in chunks together with the compiler version and options.
+    def keyForFile(self, path, options):
+        digest = hashlib.sha256()
+        digest.update(COMPILER_VERSION.encode())
+        digest.update(repr(sorted(options.items())).encode())
+        with open(path, 'rb') as sourceFile:
+            for chunk in iter(lambda: sourceFile.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def keyForSource(self, source, options):
+        digest = hashlib.sha256()
+        digest.update(COMPILER_VERSION.encode())
+        digest.update(repr(sorted(options.items())).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def entryPath(self, key, kind):
+        return os.path.join(self.directory, key + "." + kind)
+
+    # Return the path of a cached entry, or None. Counts a hit or a miss.
+    def lookup(self, key, kind):
+        path = self.entryPath(key, kind)
+        try:
+            os.utime(path)  # Mark as recently used.
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def get(self, key, kind):
+        path = self.lookup(key, kind)
+        if path is None:
+            return None
+        with open(path, 'rb') as entryFile:
+            return entryFile.read()
+
+    def put(self, key, kind, data):
+        path = self.entryPath(key, kind)
+        temporaryPath = f"{path}.{os.getpid()}.tmp"
+        with open(temporaryPath, 'wb') as entryFile:
+            entryFile.write(data)
+        os.replace(temporaryPath, path)
+        self.evict()
+
+    # Store a file that was already written somewhere else, e.g. out.py.
+    def putFile(self, key, kind, sourcePath):
+        with open(sourcePath, 'rb') as sourceFile:
+            self.put(key, kind, sourceFile.read())
+
+    # Delete least recently used entries until the cache fits.
+    def evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name == "stats.json" or entry.name.endswith(".tmp"):
+                    continue
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+                total += info.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    # Add this run's counts to the totals in stats.json and return the totals.
+    def saveStats(self):
+        totals = {"hits": 0, "misses": 0, "evictions": 0}
+        try:
+            with open(self.statsPath, 'r') as statsFile:
+                totals.update(json.load(statsFile))
+        except (FileNotFoundError, ValueError):
+            pass
+        totals["hits"] += self.hits
+        totals["misses"] += self.misses
+        totals["evictions"] += self.evictions
+        temporaryPath = f"{self.statsPath}.{os.getpid()}.tmp"
+        with open(temporaryPath, 'w') as statsFile:
+            json.dump(totals, statsFile)
+        os.replace(temporaryPath, self.statsPath)
+        self.hits = self.misses = self.evictions = 0
+        return totals
@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Thin client for server.py. Sends one request over the server's Unix socket and prints the result
+# the way main.py does, so build.sh can use it in place of `python3 main.py` while a server is running.
+# It only imports the standard library, so it starts faster than loading the compiler.
+
+DEFAULT_SOCKET = ".hwserver.sock"
+NO_SERVER = 3   # Exit status when no server answers on the socket, so build.sh can fall back to main.py.
+
+def request(path, message):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # A socket file left behind by a server that did not shut down cleanly refuses connections.
+            print(f"Error! No compile server is listening on {path}.", file=sys.stderr)
+            sys.exit(NO_SERVER)
+        connection.sendall((json.dumps(message) + "\n").encode())
+        with connection.makefile('rb') as replies:
+            reply = replies.readline()
+    if not reply:
+        sys.exit("Error! The compile server closed the connection.")
+    return json.loads(reply)
+
+def main():
+    argParser = argparse.ArgumentParser(description="Compile a HelloWorld program to out.py using a running server.py.")
+    argParser.add_argument("source", nargs="?", help="HelloWorld source file")
+    argParser.add_argument("-o", dest="output", default="out.py", help="output file (default: out.py)")
+    argParser.add_argument("-O", dest="optimize", action="store_true", help="optimize like main.py -O")
+    argParser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"server socket (default: {DEFAULT_SOCKET})")
+    argParser.add_argument("--latency", action="store_true", help="print how long the server took")
+    argParser.add_argument("--stats", action="store_true", help="print the server's latency statistics")
+    argParser.add_argument("--shutdown", action="store_true", help="stop the server")
+    arguments = argParser.parse_args()
+
+    if arguments.stats or arguments.shutdown:
+        response = request(arguments.socket, {"command": "stats" if arguments.stats else "shutdown"})
+        print(json.dumps(response, indent=2))
+        return
+    if arguments.source is None:
+        argParser.error("the following arguments are required: source")
+
+    # The server may run in another directory, so send absolute paths.
+    response = request(arguments.socket, {"id": os.getpid(), "source": os.path.abspath(arguments.source),
+                                          "output": os.path.abspath(arguments.output), "optimize": arguments.optimize})
+    if not response["ok"]:
+        if "diagnostics" not in response:
+            sys.exit("Error! " + response["error"])
+        for diagnostic in response["diagnostics"]:
+            print(f"Error! line {diagnostic['line']}, column {diagnostic['column']}: {diagnostic['message']}", file=sys.stderr)
+        sys.exit(f"{len(response['diagnostics'])} error(s) found.")
+    print("[info] - Compiling completed.")
+    print("[Programming Laguage] - HelloWorld")
+    print("-------------------------------------")
+    if arguments.latency:
+        print(f"[server] {response['latencyMs']:.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+from emit import *
+from nodes import *
+
+# Binding strength of each expression node, matching Python's operator precedence.
+# Parentheses are only emitted where a child binds more loosely than its parent allows,
+# so trees straight from TreeParser produce the same text as Parser's direct emission.
+PRECEDENCE = {'or': 1, 'and': 2, '+': 5, '-': 5, '*': 6, '/': 6}
+NOT_PRECEDENCE = 3
+COMPARE_PRECEDENCE = 4
+UNARY_PRECEDENCE = 7
+ATOM_PRECEDENCE = 8
+
+def precedence(node):
+    kind = type(node)
+    if kind is BinOp or kind is BoolOp:
+        return PRECEDENCE[node.op]
+    if kind is Compare:
+        return COMPARE_PRECEDENCE
+    if kind is Not:
+        return NOT_PRECEDENCE
+    if kind is Unary or (kind is Number and node.text[0] == '-'):
+        return UNARY_PRECEDENCE
+    return ATOM_PRECEDENCE
+
+
+# CodeGenerator walks a syntax tree from TreeParser and drives an Emitter with the generated Python.
+class CodeGenerator:
+    def __init__(self, emitter):
+        self.emitter = emitter
+
+    def program(self, tree):
+        self.emitter.headerLine("import sys")
+        self.emitter.headerLine("from hwruntime import *")
+        for node in tree.body:
+            self.statement(node)
+            self.emitter.flush()    # Hand finished top-level statements to a streaming emitter.
+
+    def statement(self, node):
+        getattr(self, 'statement' + type(node).__name__)(node)
+
+    # An empty block is not valid Python, so it gets a "pass".
+    def block(self, body):
+        self.emitter.increaseIndent()
+        if not body:
+            self.emitter.emitLine("pass")
+        for node in body:
+            self.statement(node)
+        self.emitter.decreaseIndent()
+
+    def statementPrintString(self, node):
+        self.emitter.emitLine(f"hwPrint(\"{node.text}\")")
+
+    def statementPrint(self, node):
+        self.emitter.emit("hwPrint(")
+        self.expression(node.value)
+        self.emitter.emitLine(')')
+
+    def statementIf(self, node):
+        self.emitter.emit("if ")
+        self.expression(node.condition)
+        self.emitter.emitLine(":")
+        self.block(node.body)
+        if node.orelse is not None:
+            self.emitter.emitLine("else:")
+            self.block(node.orelse)
+
+    def statementWhile(self, node):
+        self.emitter.emit("while ")
+        self.expression(node.condition)
+        self.emitter.emitLine(":")
+        self.block(node.body)
+
+    # After the loop, name holds the value that ended the WHILE loop: stop, or its old value if that was not less.
+    def statementForRange(self, node):
+        self.emitter.emit(f"for {node.name} in range({node.name}, ")
+        self.expression(node.stop)
+        self.emitter.emitLine("):")
+        self.block(node.body)
+        self.emitter.emit(f"if {node.name}<")
+        self.expression(node.stop, COMPARE_PRECEDENCE + 1)
+        self.emitter.emitLine(":")
+        self.emitter.increaseIndent()
+        self.emitter.emit(node.name + " = ")
+        self.expression(node.stop)
+        self.emitter.emitLine("")
+        self.emitter.decreaseIndent()
+
+    def statementFunc(self, node):
+        if node.memo:
+            self.emitter.emitLine(f"@hwMemo({node.memo})")
+        self.emitter.emit("def ")
+        self.emitter.emit(node.name)
+        self.emitter.emit("(")
+        self.emitter.emit(", ".join(node.params))
+        self.emitter.emitLine("):")
+        self.block(node.body)
+
+    def statementLet(self, node):
+        self.emitter.emit(node.name + " = ")
+        self.expression(node.value)
+        self.emitter.emitLine("")
+
+    def statementInput(self, node):
+        self.emitter.emit(node.name + '=')
+        self.emitter.emitLine("hwInput()")
+
+    def statementReturn(self, node):
+        self.emitter.emit("return ")
+        self.expression(node.value)
+        self.emitter.emitLine("")
+
+    def statementCondition(self, node):
+        self.expression(node.condition)
+
+    # Emit an expression, wrapping it in parentheses if it binds more loosely than minimum.
+    def expression(self, node, minimum=0):
+        if precedence(node) < minimum:
+            self.emitter.emit('(')
+            self.expression(node)
+            self.emitter.emit(')')
+            return
+
+        kind = type(node)
+        if kind is Number:
+            self.emitter.emit(node.text)
+        elif kind is Name:
+            self.emitter.emit(node.name)
+        elif kind is Call:
+            self.emitter.emit(f"{node.name}(")
+            for index, arg in enumerate(node.args):
+                if index:
+                    self.emitter.emit(", ")
+                self.expression(arg)
+            self.emitter.emit(')')
+        elif kind is Unary:
+            self.emitter.emit(node.op)
+            self.expression(node.operand, UNARY_PRECEDENCE)
+        elif kind is BinOp:
+            level = PRECEDENCE[node.op]
+            self.expression(node.left, level)
+            self.emitter.emit(node.op)
+            self.expression(node.right, level + 1)
+        elif kind is Compare:
+            self.expression(node.left, COMPARE_PRECEDENCE + 1)
+            for op, comparator in zip(node.ops, node.comparators):
+                self.emitter.emit(op)
+                self.expression(comparator, COMPARE_PRECEDENCE + 1)
+        elif kind is BoolOp:
+            level = PRECEDENCE[node.op]
+            self.expression(node.left, level)
+            self.emitter.emit(f" {node.op} ")
+            self.expression(node.right, level + 1)
+        elif kind is Not:
+            self.emitter.emit("not ")
+            self.expression(node.operand, NOT_PRECEDENCE)
+
+
+# Return the Python text of an expression, e.g. for reports.
+def expressionText(node):
+    emitter = Emitter()
+    CodeGenerator(emitter).expression(node)
+    return emitter.getCode()
@@ -0,0 +1,172 @@
+from lex import *
+from emit import *
+from parse import *
+from treeparse import *
+from codegen import *
+from optimize import *
+from typeinfer import *
+from purity import *
+from inline import *
+from backend import *
+from vm import *
+from instrument import *
+import filecmp
+import os
+import shutil
+import threading
+import time
+
+# Library interface to the compiler: compile a program held in a string, or read by a lexer the caller set up,
+# without printing or exiting. Files are only written with CompileOptions.output. Safe to call many times in one process.
+#
+#   result = compileSource("LET a = 1\nPRINT a\n", CompileOptions(optimize=True))
+#   if result.ok:
+#       exec(result.code)
+
+# CompileOptions selects what compileSource does.
+#   optimize:   run ConstantFolder, LoopOptimizer and TypeInference, like main.py -O.
+#   inline:     largest expansion in nodes for Inliner to put in place of a call, like main.py --inline, or None.
+#   memo:       memo table size for pure functions, like main.py --memo, or None to call them as they are.
+#   codeObject: also build a Python code object with CodeObjectBuilder, like main.py --run.
+#   vm:         compile to a VMFunction for the register VM instead of to Python, like main.py --vm.
+#   output:     path to write the generated Python to instead of returning it, streamed as it is generated.
+#               The file is only replaced once the whole program compiled.
+#   filename:   name used for the code object, shown in tracebacks.
+#   legacyLexer: use the character-at-a-time lexer engine.
+#   instrumentation: an Instrumentation to attach to every part of the compile, or None.
+class CompileOptions:
+    def __init__(self, optimize=False, codeObject=False, filename="<hw>", legacyLexer=False, instrumentation=None, memo=None, inline=None,
+                 vm=False, output=None):
+        self.optimize = optimize
+        self.memo = memo
+        self.inline = inline
+        self.codeObject = codeObject
+        self.vm = vm
+        self.output = output
+        self.filename = filename
+        self.legacyLexer = legacyLexer
+        self.instrumentation = instrumentation
+
+
+# CompileResult holds what compileSource produced.
+#   code:        the generated Python source, or None if the program has errors, with vm, or with output.
+#   codeObject:  the compiled code object with CompileOptions.codeObject, otherwise None.
+#   vmFunction:  the VMFunction of the main program with CompileOptions.vm, otherwise None.
+#   diagnostics: the errors found, as Diagnostic objects in source order.
+#   reports:     the calls Inliner replaced, what the optimizer changed, and which functions the Memoizer picked.
+#   warnings:    what TypeInference found to depend on the path taken, with optimize.
+#   timings:     seconds spent in each phase, plus "total".
+class CompileResult:
+    def __init__(self):
+        self.code = None
+        self.codeObject = None
+        self.vmFunction = None
+        self.diagnostics = []
+        self.reports = []
+        self.warnings = []
+        self.timings = {}
+
+    @property
+    def ok(self):
+        return not self.diagnostics
+
+
+# text is the program, or a Lexer (e.g. Lexer.fromStream or MappedLexer.fromFile) reading it.
+def compileSource(text, options=None):
+    options = options or CompileOptions()
+    instrumentation = options.instrumentation
+    result = CompileResult()
+    start = time.perf_counter()
+    lexer = text if isinstance(text, Lexer) else Lexer(text, options.legacyLexer)
+    if instrumentation is not None:
+        instrumentation.attachLexer(lexer)
+    emitter = Emitter(options.output, stream=options.output is not None)
+    try:
+        if options.optimize or options.memo or options.inline or options.codeObject or options.vm:
+            treeParser = TreeParser(lexer)
+            if instrumentation is not None:
+                instrumentation.attachParser(treeParser)
+            tree = treeParser.program()
+            phase = time.perf_counter()
+            result.timings["parse"] = phase - start
+            if options.inline:
+                inliner = Inliner(options.inline)
+                if instrumentation is not None:
+                    instrumentation.attachPass(inliner)
+                inliner.program(tree)
+                result.reports = inliner.report
+                result.timings["inline"] = time.perf_counter() - phase
+                phase = time.perf_counter()
+            if options.optimize:
+                folder = ConstantFolder()
+                loopOptimizer = LoopOptimizer(treeParser.symbols)
+                typeInference = TypeInference(treeParser.symbols)
+                if instrumentation is not None:
+                    instrumentation.attachPass(folder)
+                    instrumentation.attachPass(loopOptimizer)
+                    instrumentation.attachPass(typeInference)
+                folder.program(tree)
+                loopOptimizer.program(tree)
+                typeInference.program(tree)
+                result.reports = result.reports + folder.report + loopOptimizer.report + typeInference.report
+                result.warnings = typeInference.warnings
+                result.timings["optimize"] = time.perf_counter() - phase
+                phase = time.perf_counter()
+            if options.memo:
+                memoizer = Memoizer(options.memo)
+                if instrumentation is not None:
+                    instrumentation.attachPass(memoizer)
+                memoizer.program(tree)
+                result.reports = result.reports + memoizer.report
+                result.timings["memo"] = time.perf_counter() - phase
+                phase = time.perf_counter()
+            if options.vm:
+                compiler = VMCompiler()
+                if instrumentation is not None:
+                    instrumentation.attachPass(compiler)
+                result.vmFunction = compiler.program(tree)
+                result.timings["vm"] = time.perf_counter() - phase
+            else:
+                generator = CodeGenerator(emitter)
+                if instrumentation is not None:
+                    instrumentation.attachEmitter(emitter)
+                    instrumentation.attachPass(generator)
+                generator.program(tree)
+                result.timings["emit"] = time.perf_counter() - phase
+            if options.codeObject:
+                phase = time.perf_counter()
+                builder = CodeObjectBuilder(options.filename)
+                if instrumentation is not None:
+                    instrumentation.attachPass(builder)
+                result.codeObject = builder.build(tree)
+                result.timings["codeObject"] = time.perf_counter() - phase
+        else:
+            # The direct parser emits while it parses, so both are one phase.
+            parser = Parser(lexer, emitter)
+            if instrumentation is not None:
+                instrumentation.attachEmitter(emitter)
+                instrumentation.attachParser(parser)
+            parser.program()
+            result.timings["parse"] = time.perf_counter() - start
+        if not options.vm:
+            if options.output is not None:
+                emitter.writeFile()
+            else:
+                result.code = emitter.getCode()
+    except CompileError as error:
+        result.diagnostics = error.diagnostics
+        emitter.discard()
+    result.timings["total"] = time.perf_counter() - start
+    return result
+
+
+# The generated Python imports hwruntime, so every directory the compiler writes it to needs a copy of hwruntime.py.
+# An identical copy is left alone; a new one is written under another name first, so a program starting meanwhile never sees half of it.
+def copyRuntime(directory):
+    runtime = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hwruntime.py")
+    target = os.path.join(directory or ".", "hwruntime.py")
+    if os.path.exists(target) and filecmp.cmp(runtime, target):
+        return
+    temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(runtime, temporary)
+    os.replace(temporary, target)
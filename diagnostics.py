@@ -0,0 +1,19 @@
+# Diagnostic is one error found in a program, with the 1-based line and column it was found at.
+# The lexer and the parser raise it to abandon the current token or statement, then record it and carry on.
+class Diagnostic(Exception):
+    def __init__(self, message, line=0, column=0):
+        super().__init__(message)
+        self.message = message
+        self.line = line
+        self.column = column
+
+    def __str__(self):
+        message = self.message.replace('\n', '\\n')  # Some messages quote a newline token.
+        return f"line {self.line}, column {self.column}: {message}"
+
+
+# CompileError is raised at the end of a compile that found errors. It carries all of them, in source order.
+class CompileError(Exception):
+    def __init__(self, diagnostics):
+        self.diagnostics = sorted(diagnostics, key=lambda diagnostic: (diagnostic.line, diagnostic.column))
+        super().__init__('\n'.join(str(diagnostic) for diagnostic in self.diagnostics))
@@ -1,35 +1,76 @@
+import os
+
 # Emitter object keeps track of the generated code and outputs it.
+# Code is collected as a list of fragments and joined once at the end, so emitting stays linear.
+# With stream=True, finished top-level statements are written to a temporary file next to fullPath as soon as flush() is called,
+# and writeFile() moves it into place, so a compile that fails half way leaves the previous output alone.
+# With fullPath=None, nothing touches the disk and getCode() returns the generated source.
 class Emitter:
-    def __init__(self, fullPath):
+    def __init__(self, fullPath=None, stream=False):
         self.fullPath = fullPath
-        self.header = ""
-        self.code = ""
+        self.header = []
+        self.code = []
         self.indentLevel = 0
         self.indentPending = True
-        
+        self.stream = stream
+        self.outputFile = None  # Open temporary file once streaming has started.
+        self.tempPath = None if fullPath is None else fullPath + ".tmp"
+
     def emit(self, code):
         if self.indentPending:
-            self.code += "    " * self.indentLevel  # append indent
+            if self.indentLevel:
+                self.code.append("    " * self.indentLevel)  # append indent
             self.indentPending = False  # reset indentation
-        self.code += code
+        self.code.append(code)
 
     def emitLine(self, code):
         # deal indentation
-        if self.indentPending:
-            self.code += "    " * self.indentLevel  # append indent
-        self.code += code + '\n'
+        if self.indentPending and self.indentLevel:
+            self.code.append("    " * self.indentLevel)  # append indent
+        self.code.append(code)
+        self.code.append('\n')
         self.indentPending = True
-        
+
+    # Header lines go before all code, so they must be added before the first flush() in streaming mode.
     def headerLine(self, code):
-        self.header += code + '\n'
+        self.header.append(code + '\n')
 
     def increaseIndent(self):
         self.indentLevel += 1
-        
+
     def decreaseIndent(self):
         if self.indentLevel > 0:
             self.indentLevel -= 1
-            
+
+    # Write the code collected so far to the output file. Only does something in streaming mode.
+    def flush(self):
+        if not self.stream:
+            return
+        if self.outputFile is None:
+            self.outputFile = open(self.tempPath, 'w')
+            self.outputFile.writelines(self.header)
+        self.outputFile.writelines(self.code)
+        self.code.clear()
+
+    # Return the generated source without touching the disk.
+    def getCode(self):
+        return ''.join(self.header) + ''.join(self.code)
+
     def writeFile(self):
+        if self.stream:
+            self.flush()
+            self.outputFile.close()
+            self.outputFile = None
+            os.replace(self.tempPath, self.fullPath)
+            return
         with open(self.fullPath, 'w') as outputFile:
-            outputFile.write(self.header + self.code)
\ No newline at end of file
+            outputFile.writelines(self.header)
+            outputFile.writelines(self.code)
+
+    # Throw away what was streamed so far, for a compile that failed. The output file is not touched.
+    def discard(self):
+        if self.outputFile is not None:
+            self.outputFile.close()
+            self.outputFile = None
+            os.remove(self.tempPath)
+        self.code.clear()
@@ -0,0 +1,196 @@
+import atexit
+import collections
+import functools
+import os
+import sys
+
+# Runtime support for generated programs. The emitter's header imports it ("from hwruntime import *"), and
+# PRINT and INPUT call it instead of print() and int(input()):
+#
+#   hwPrint(value)  adds the line to an output buffer, written out once it holds OUTPUT_LIMIT characters,
+#                   before INPUT waits for a line, and at exit.
+#   hwInput()       returns the next whitespace separated integer on stdin. All of stdin is read at once
+#                   through sys.stdin.buffer the first time INPUT runs, and split into tokens.
+#
+# Interactive programs need to show a prompt before they wait for the answer, so the runtime is line
+# buffered when stdin or stdout is a terminal, or when HW_LINE_BUFFERED is set to anything but 0: every
+# PRINT is written and flushed at once, and INPUT reads one line at a time.
+#
+# Functions compiled with --memo are wrapped in hwMemo(size), which keeps their results in a MemoTable.
+# With HW_MEMO_STATS set to anything but 0, the hits and misses of every table are written to stderr when
+# the program ends.
+__all__ = ["hwPrint", "hwInput", "hwMemo"]
+
+OUTPUT_LIMIT = 1 << 16
+
+output = []             # Lines printed but not written yet.
+outputSize = 0          # Characters in output.
+nextToken = iter(()).__next__
+stdinDone = False       # Stdin has been read to the end.
+lineBuffered = False
+memoTables = []         # MemoTables of the program running now, for the statistics.
+recursionRaised = False # The recursion limit was raised for the frames hwMemo adds.
+
+
+def isTerminal(stream):
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+# Forget pending input and choose the buffering mode for the streams in use now.
+def reset():
+    global nextToken, stdinDone, lineBuffered
+    flushOutput()
+    nextToken = iter(()).__next__
+    stdinDone = False
+    memoTables.clear()
+    lineBuffered = (os.environ.get("HW_LINE_BUFFERED", "0") != "0"
+                    or isTerminal(sys.stdin) or isTerminal(sys.stdout))
+
+
+def flushOutput():
+    global outputSize
+    if output:
+        text = ''.join(output)
+        output.clear()
+        outputSize = 0
+        sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def hwPrint(value):
+    global outputSize
+    text = f"{value}\n"
+    if lineBuffered:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    output.append(text)
+    outputSize += len(text)
+    if outputSize >= OUTPUT_LIMIT:
+        flushOutput()
+
+
+def hwInput():
+    try:
+        return int(nextToken())
+    except StopIteration:
+        pass
+    return int(readTokens())
+
+
+# Read more of stdin: all of it, or the next line that has a token when line buffered. Returns the first
+# new token and leaves the rest to nextToken. Raises EOFError at the end of the input, as input() does.
+def readTokens():
+    global nextToken, stdinDone
+    flushOutput()
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    while not stdinDone:
+        if lineBuffered:
+            line = stdin.readline()
+            stdinDone = not line
+        else:
+            line = stdin.read()
+            stdinDone = True
+        tokens = iter(line.split())
+        for token in tokens:
+            nextToken = tokens.__next__
+            return token
+    raise EOFError("EOF when reading a line")
+
+
+# The results of one memoized function, by argument, dropping the least recently used once it holds size.
+# Arguments that compare equal but print differently (3 and 3.0, 0.0 and -0.0) are kept apart, since the
+# function could print differently for them too.
+class MemoTable:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        memoTables.append(self)
+
+    @staticmethod
+    def key(args):
+        key = args + tuple(map(type, args))
+        if 0 in args:
+            key += tuple(map(repr, args))
+        return key
+
+    # The stored result, or MemoTable from a miss, since any value could be a result.
+    def lookup(self, key):
+        entries = self.entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        return MemoTable
+
+    def store(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+
+    def stats(self):
+        return f"{self.name}: {self.hits} hits, {self.misses} misses, {len(self.entries)} of {self.size} entries"
+
+
+# Decorator for a pure function: calls with arguments seen before return the stored result. A failing call
+# stores nothing, so it fails again the next time.
+def hwMemo(size):
+    global recursionRaised
+    if not recursionRaised:
+        # Every call runs in two frames, the wrapper's and the function's, so give recursion the same depth.
+        sys.setrecursionlimit(sys.getrecursionlimit() * 2)
+        recursionRaised = True
+
+    def decorate(function):
+        table = MemoTable(function.__name__, size)
+        lookup = table.lookup
+        key = table.key
+
+        @functools.wraps(function)
+        def memoized(*args):
+            argsKey = key(args)
+            value = lookup(argsKey)
+            if value is MemoTable:
+                value = function(*args)
+                table.store(argsKey, value)
+            return value
+
+        memoized.memoTable = table
+        return memoized
+
+    return decorate
+
+
+# Write the statistics of the memo tables to stderr if HW_MEMO_STATS asks for them, and forget the tables.
+def reportMemo():
+    if memoTables and os.environ.get("HW_MEMO_STATS", "0") != "0":
+        for table in memoTables:
+            sys.stderr.write(f"memo {table.stats()}\n")
+    memoTables.clear()
+
+
+def finish():
+    flushOutput()
+    reportMemo()
+
+
+# Run a compiled program in a fresh namespace, as if it were executed as a script, and write out what it
+# printed before returning. The exit hook only helps programs that run in a process of their own.
+def execute(code):
+    reset()
+    try:
+        exec(code, {'__name__': '__main__'})
+    finally:
+        finish()
+
+
+reset()
+atexit.register(finish)
@@ -0,0 +1,139 @@
+from lex import *
+from emit import *
+from parse import *
+from cache import COMPILER_VERSION
+import hashlib
+import io
+import json
+import os
+import re
+
+OPENERS = {"IF", "WHILE", "FUNC"}
+CLOSERS = {"ENDIF", "ENDWHILE", "ENDFUNC"}
+FIRST_WORD = re.compile(r'[ \t\r]*([A-Za-z]+)')
+
+# Split a program into top-level units: every FUNC ... ENDFUNC block, and every run of top-level statements
+# between them. Statements always start on a new line, so the first word of each line is enough to follow
+# the nesting. Blank and comment lines stay with the unit before them.
+# Returns a list of (kind, first line, text) where kind is "func" or "statements".
+def splitUnits(source):
+    units = []
+    lines = []
+    kind = None
+    firstLine = 1
+    depth = 0
+    for number, line in enumerate(io.StringIO(source), 1):
+        match = FIRST_WORD.match(line)
+        word = match.group(1) if match else None
+        if depth == 0 and word is not None:
+            newKind = "func" if word == "FUNC" else "statements"
+            if lines and kind is not None and (newKind == "func" or kind == "func"):
+                units.append((kind, firstLine, ''.join(lines)))
+                lines = []
+                firstLine = number
+            kind = newKind
+        lines.append(line)
+        if word in OPENERS:
+            depth += 1
+        elif word in CLOSERS and depth > 0:
+            depth -= 1
+    if lines:
+        units.append((kind or "statements", firstLine, ''.join(lines)))
+    return units
+
+
+# Symbol table for compiling one unit. Names from earlier units are looked up in inherited (without copying
+# it), and the ones this unit actually needed are remembered in uses.
+class TrackedSymbols(set):
+    def __init__(self, inherited):
+        super().__init__()
+        self.inherited = inherited
+        self.uses = set()
+
+    def __contains__(self, name):
+        if set.__contains__(self, name):
+            return True
+        if name in self.inherited:
+            self.uses.add(name)
+            return True
+        return False
+
+
+# IncrementalCompiler rebuilds a program unit by unit, keeping the generated code of every unit in a manifest.
+# A unit from the previous build is spliced back in unchanged when its source text is the same and every name
+# it used from earlier units is still defined before it. Otherwise only that unit is lexed, parsed and emitted
+# again, with the symbols of the units before it. Each unit is emitted with no indentation and outside any
+# function, so its code does not depend on where it sits in the program.
+class IncrementalCompiler:
+    def __init__(self, manifestPath):
+        self.manifestPath = manifestPath
+        self.reused = 0
+        self.compiled = 0
+        self.report = []
+
+    def loadManifest(self):
+        try:
+            with open(self.manifestPath, 'r') as manifestFile:
+                manifest = json.load(manifestFile)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("version") != COMPILER_VERSION:
+            return None
+        return manifest
+
+    def saveManifest(self, header, units):
+        manifest = {"version": COMPILER_VERSION, "header": header, "units": units}
+        temporaryPath = f"{self.manifestPath}.{os.getpid()}.tmp"
+        with open(temporaryPath, 'w') as manifestFile:
+            json.dump(manifest, manifestFile)
+        os.replace(temporaryPath, self.manifestPath)
+
+    # Compile the whole program and return the generated Python source.
+    def compile(self, source):
+        manifest = self.loadManifest()
+        header = manifest["header"] if manifest else None
+        previous = {}   # Unit hash -> entries of the previous build with that source.
+        for entry in manifest["units"] if manifest else []:
+            previous.setdefault(entry["hash"], []).append(entry)
+
+        symbols = set()
+        units = []
+        diagnostics = []
+        for kind, line, text in splitUnits(source):
+            key = hashlib.sha256(text.encode()).hexdigest()
+            candidates = previous.get(key)
+            if candidates and symbols.issuperset(candidates[-1]["uses"]):
+                entry = candidates.pop()
+                self.reused += 1
+            else:
+                entry, header, errors = self.compileUnit(kind, text, key, symbols)
+                diagnostics.extend(errors)
+                self.compiled += 1
+                name = f"FUNC {entry['functions'][0]}" if entry["functions"] else "statements"
+                self.report.append(f"line {line}: recompiled {name}")
+            symbols.update(entry["defines"])
+            units.append(entry)
+
+        if diagnostics:
+            # Units split by line can cut a broken program in odd places, so let a full compile report the errors.
+            Parser(Lexer(source), Emitter()).program()
+            raise CompileError(diagnostics)
+        if header is None:  # Nothing compiled and no manifest: an empty program.
+            header = self.compileUnit("statements", "", "", symbols)[1]
+        self.saveManifest(header, units)
+        return header + ''.join(entry["code"] for entry in units)
+
+    # Lex, parse and emit one unit. Returns its manifest entry, the program header and the errors in the unit.
+    def compileUnit(self, kind, text, key, symbols):
+        emitter = Emitter()
+        parser = Parser(Lexer(text), emitter)
+        parser.symbols = TrackedSymbols(symbols)
+        errors = []
+        try:
+            parser.program()
+        except CompileError as error:
+            errors = error.diagnostics
+        entry = {"hash": key, "kind": kind, "code": ''.join(emitter.code),
+                 "uses": sorted(parser.symbols.uses), "defines": sorted(parser.symbols),
+                 "functions": sorted(parser.functions)}
+        return entry, ''.join(emitter.header), errors
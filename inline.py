@@ -0,0 +1,231 @@
+from nodes import *
+from optimize import NOT_CONSTANT, constantValue, isSafe, assignedNames, readNames, numericNames
+from purity import reboundNames, expressionCalls
+from codegen import expressionText
+
+# A copy of an expression tree, so every call site gets nodes of its own.
+def copyExpression(node):
+    kind = type(node)
+    if kind is Call:
+        return Call(node.name, [copyExpression(arg) for arg in node.args])
+    if kind is BinOp or kind is BoolOp:
+        return kind(node.op, copyExpression(node.left), copyExpression(node.right))
+    if kind is Compare:
+        return Compare(copyExpression(node.left), list(node.ops), [copyExpression(comparator) for comparator in node.comparators])
+    if kind is Unary:
+        return Unary(node.op, copyExpression(node.operand))
+    if kind is Not:
+        return Not(copyExpression(node.operand))
+    return kind(*[getattr(node, name) for name in kind.__slots__])
+
+# The expression with the names in env replaced by their expressions. The result shares the nodes of env.
+def substitute(node, env):
+    kind = type(node)
+    if kind is Name:
+        return env.get(node.name, node)
+    if kind is Call:
+        return Call(node.name, [substitute(arg, env) for arg in node.args])
+    if kind is BinOp or kind is BoolOp:
+        return kind(node.op, substitute(node.left, env), substitute(node.right, env))
+    if kind is Compare:
+        return Compare(substitute(node.left, env), node.ops, [substitute(comparator, env) for comparator in node.comparators])
+    if kind is Unary:
+        return Unary(node.op, substitute(node.operand, env))
+    if kind is Not:
+        return Not(substitute(node.operand, env))
+    return node
+
+# The operands of an expression node.
+def children(node):
+    kind = type(node)
+    if kind is Call:
+        return node.args
+    if kind is BinOp or kind is BoolOp:
+        return (node.left, node.right)
+    if kind is Compare:
+        return [node.left] + node.comparators
+    if kind is Unary or kind is Not:
+        return (node.operand,)
+    return ()
+
+# True for a node that can fail or have an effect by itself: a call, or a division by something that may be zero.
+def canFail(node):
+    if type(node) is Call:
+        return True
+    if type(node) is BinOp and node.op == '/':
+        divisor = constantValue(node.right)
+        return divisor is NOT_CONSTANT or divisor == 0
+    return False
+
+# Nodes in an expression, and how many of them canFail(), counting shared subtrees once for every place they
+# are used in. counts caches the result for each shared node.
+def measure(node, counts):
+    result = counts.get(id(node))
+    if result is None:
+        size, failing = 1, int(canFail(node))
+        for child in children(node):
+            childSize, childFailing = measure(child, counts)
+            size += childSize
+            failing += childFailing
+        result = counts[id(node)] = (size, failing)
+    return result
+
+
+# Inliner replaces calls of small functions by the expression they return, in place. A function can be
+# inlined when its body is a run of LET statements followed by RETURN, reading only its parameters and the
+# variables it has already assigned, and calling no functions that are left after inlining into it. The
+# call f(a, b) is then the RETURN expression with every parameter replaced by its argument and every local
+# by the expression it was assigned, so none of the function's own names survive to capture or be captured
+# by a name at the call site.
+#
+# A call is inlined only where it surely reaches the function: the function is defined once, at the top
+# level, before the statement the call is in, and no LET, INPUT or local variable takes its name. The result
+# has to behave as the call did, so the arguments cannot call or divide (they can be used twice), and of the
+# operations in the body that can fail, like a division, the result must hold exactly one or none,
+# evaluated once. Arguments can only be dropped, along with any local the result does not use, when they
+# cannot fail either: they read only names that are surely assigned and can only hold numbers. Function bodies only get calls of functions defined before them, so a function is
+# never inlined into itself. A call is not inlined when its expansion has more than size nodes.
+# Every inlined call is recorded in self.report.
+class Inliner:
+    def __init__(self, size=24):
+        self.size = size
+        self.report = []
+        self.inlined = 0
+
+    def program(self, tree):
+        definitions = {}
+        self.countDefinitions(tree.body, definitions)
+        rebound = reboundNames(tree.body)
+        self.numeric = numericNames(tree.body)
+        self.templates = {}     # Function name -> (params, [(local, value)], RETURN expression, line).
+        defined = set()
+        for node in tree.body:
+            self.statement(node, frozenset(), defined)
+            if type(node) is Func and definitions[node.name] == 1 and node.name not in rebound:
+                template = self.template(node)
+                if template is not None:
+                    self.templates[node.name] = template
+        return tree
+
+    def countDefinitions(self, body, definitions):
+        for node in body:
+            kind = type(node)
+            if kind is Func:
+                definitions[node.name] = definitions.get(node.name, 0) + 1
+                self.countDefinitions(node.body, definitions)
+            elif kind is If:
+                self.countDefinitions(node.body, definitions)
+                if node.orelse is not None:
+                    self.countDefinitions(node.orelse, definitions)
+            elif kind is While or kind is ForRange:
+                self.countDefinitions(node.body, definitions)
+
+    # The parts of a function that calls expand to, or None if it cannot be inlined.
+    def template(self, node):
+        body = node.body
+        if not body or type(body[-1]) is not Return or len(set(node.params)) != len(node.params):
+            return None
+        lets = []
+        known = set(node.params)
+        for statement in body[:-1]:
+            if type(statement) is not Let or not self.closed(statement.value, known):
+                return None
+            lets.append((statement.name, statement.value))
+            known.add(statement.name)
+        if not self.closed(body[-1].value, known):
+            return None
+        return node.params, lets, body[-1].value, node.line
+
+    # True if an expression calls nothing and only reads the names in known.
+    def closed(self, node, known):
+        calls = set()
+        expressionCalls(node, calls)
+        return not calls and readNames(node) <= known
+
+    # Inline the calls in a statement. shadowed holds the local names of the functions it is in, and defined
+    # the names definitely assigned before it, which the statement adds its own to.
+    def statement(self, node, shadowed, defined):
+        kind = type(node)
+        line = node.line
+        if kind is Let or kind is Print or kind is Return:
+            node.value = self.expression(node.value, shadowed, defined, line)
+        elif kind is If:
+            node.condition = self.expression(node.condition, shadowed, defined, line)
+            self.block(node.body, shadowed, set(defined))
+            if node.orelse is not None:
+                self.block(node.orelse, shadowed, set(defined))
+                defined |= assignedNames(node.body) & assignedNames(node.orelse)
+        elif kind is While:
+            node.condition = self.expression(node.condition, shadowed, defined, line)
+            self.block(node.body, shadowed, set(defined))
+        elif kind is ForRange:
+            node.stop = self.expression(node.stop, shadowed, defined, line)
+            self.block(node.body, shadowed, set(defined))
+        elif kind is Condition:
+            node.condition = self.expression(node.condition, shadowed, defined, line)
+        elif kind is Func:
+            # Names assigned before FUNC stay assigned when the function runs, unless a local hides them.
+            local = set(node.params) | assignedNames(node.body)
+            self.block(node.body, shadowed | local, (defined - local) | set(node.params))
+        if kind is Let or kind is Input or kind is Func:
+            defined.add(node.name)
+
+    def block(self, body, shadowed, defined):
+        for node in body:
+            self.statement(node, shadowed, defined)
+
+    # The expression with the calls that can be inlined replaced, innermost first.
+    def expression(self, node, shadowed, defined, line):
+        kind = type(node)
+        if kind is Call:
+            node.args = [self.expression(arg, shadowed, defined, line) for arg in node.args]
+            template = self.templates.get(node.name)
+            if template is not None and node.name not in shadowed:
+                expansion = self.expand(node, template, defined)
+                if expansion is not None:
+                    self.inlined += 1
+                    self.report.append(f"line {line}: {expressionText(node)} inlined from line {template[3]} as {expressionText(expansion)}")
+                    return expansion
+        elif kind is BinOp or kind is BoolOp:
+            node.left = self.expression(node.left, shadowed, defined, line)
+            node.right = self.expression(node.right, shadowed, defined, line)
+        elif kind is Compare:
+            node.left = self.expression(node.left, shadowed, defined, line)
+            node.comparators = [self.expression(comparator, shadowed, defined, line) for comparator in node.comparators]
+        elif kind is Unary or kind is Not:
+            node.operand = self.expression(node.operand, shadowed, defined, line)
+        return node
+
+    # The expression a call stands for, or None if it would not behave the same or is too big.
+    def expand(self, call, template, defined):
+        params, lets, result, _ = template
+        if len(call.args) != len(params) or not all(isSafe(arg) for arg in call.args):
+            return None
+        # The parameters the result reads, and whether it leaves out any local, going back from RETURN.
+        needed = readNames(result)
+        dropsLocal = False
+        for name, value in reversed(lets):
+            if name in needed:
+                needed.discard(name)
+                readNames(value, needed)
+            else:
+                dropsLocal = True
+        # An argument that can fail, like r * 2 with r None or a name that may not be assigned, has to be
+        # evaluated as the call would: used by the result, with nothing computed from it left out.
+        for param, arg in zip(params, call.args):
+            if not readNames(arg) <= defined & self.numeric and (dropsLocal or param not in needed):
+                return None
+        arguments = dict(zip(params, call.args))
+        env = dict(arguments)
+        # Operations that can fail as the body is written, each evaluated once by the call.
+        failing = 0
+        for name, value in lets + [(None, result)]:
+            failing += measure(substitute(value, arguments), {})[1]
+            if name is not None:
+                env[name] = substitute(value, env)
+                arguments.pop(name, None)
+        expansion = substitute(result, env)
+        size, used = measure(expansion, {})
+        if size > self.size or used != failing or failing > 1:
+            return None
+        return copyExpression(expansion)
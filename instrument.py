@@ -0,0 +1,142 @@
+import json
+import time
+
+# Methods worth timing on each part of the compiler. Instrumentation wraps the ones an object has.
+# boolean, comparison and expression are the entry points of the operator precedence engine, which parses the
+# whole expression in operatorExpression.
+PARSER_PRODUCTIONS = ["program", "statement", "blockStatement", "condition", "boolean", "comparison", "expression",
+                      "operatorExpression", "nl"]
+LEXER_METHODS = ["getToken"]
+EMITTER_METHODS = ["emit", "emitLine", "headerLine"]
+PASS_METHODS = ["program", "statement", "block", "expression", "build"]
+
+
+# Instrumentation records where a compile spends its time. It is opt-in: attach() replaces methods on the given
+# objects with timing wrappers, and objects it is never attached to run exactly as before, at no cost.
+#
+# For every wrapped method it counts calls, time including callees (outermost activation only, so recursive
+# productions are not counted twice) and self time. It also tracks the deepest nesting of wrapped calls,
+# the tokens the lexer produced and the bytes the emitter generated. toJson() exports the totals and
+# foldedStacks() the self time per call stack, in the format flamegraph.pl and speedscope read.
+class Instrumentation:
+    def __init__(self):
+        self.stats = {}         # Frame name -> [calls, total seconds, self seconds].
+        self.active = {}        # Frame name -> activations currently on the stack.
+        self.pathIds = {}       # (parent path id, frame name) -> path id. Path 0 is the root.
+        self.paths = [None]     # Path id -> (parent path id, frame name).
+        self.selfTimes = [0.0]  # Path id -> self seconds.
+        self.pathStack = [0]
+        self.childTimes = [0.0] # Time spent in callees of each active frame.
+        self.maxDepth = 0
+        self.emitters = []
+        self.flushedBytes = 0
+        self.startTime = time.perf_counter()
+        self.endTime = None
+
+    # Wrap the methods in names that obj has, naming the frames prefix + method name.
+    def attach(self, obj, names, prefix=""):
+        for name in names:
+            if hasattr(obj, name):
+                setattr(obj, name, self.wrap(getattr(obj, name), prefix + name))
+
+    def attachLexer(self, lexer):
+        self.attach(lexer, LEXER_METHODS, "Lexer.")
+
+    def attachParser(self, parser):
+        self.attach(parser, PARSER_PRODUCTIONS)
+
+    def attachEmitter(self, emitter):
+        self.attach(emitter, EMITTER_METHODS, "Emitter.")
+        self.emitters.append(emitter)
+        # A streaming emitter forgets its code once it is written, so count it on the way out.
+        flush = emitter.flush
+        def countingFlush():
+            if emitter.stream:
+                if emitter.outputFile is None:
+                    self.flushedBytes += sum(map(len, emitter.header))
+                self.flushedBytes += sum(map(len, emitter.code))
+            flush()
+        emitter.flush = countingFlush
+
+    # Optimizer passes and code generators.
+    def attachPass(self, compilerPass):
+        self.attach(compilerPass, PASS_METHODS, type(compilerPass).__name__ + ".")
+
+    def wrap(self, method, name):
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        active = self.active
+        active.setdefault(name, 0)
+        pathIds = self.pathIds
+        pathStack = self.pathStack
+        childTimes = self.childTimes
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            key = (pathStack[-1], name)
+            path = pathIds.get(key)
+            if path is None:
+                path = pathIds[key] = len(self.paths)
+                self.paths.append(key)
+                self.selfTimes.append(0.0)
+            pathStack.append(path)
+            childTimes.append(0.0)
+            active[name] += 1
+            if len(pathStack) - 1 > self.maxDepth:
+                self.maxDepth = len(pathStack) - 1
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                own = elapsed - childTimes.pop()
+                pathStack.pop()
+                childTimes[-1] += elapsed
+                active[name] -= 1
+                stats[0] += 1
+                stats[2] += own
+                if not active[name]:
+                    stats[1] += elapsed
+                self.selfTimes[path] += own
+        return wrapper
+
+    def finish(self):
+        self.endTime = time.perf_counter()
+
+    def emittedBytes(self):
+        total = self.flushedBytes
+        for emitter in self.emitters:
+            if not emitter.stream:
+                total += sum(map(len, emitter.header)) + sum(map(len, emitter.code))
+        return total
+
+    def summary(self):
+        elapsed = (self.endTime or time.perf_counter()) - self.startTime
+        tokens, lexSeconds = self.stats.get("Lexer.getToken", [0, 0.0, 0.0])[:2]
+        return {
+            "seconds": elapsed,
+            "tokens": tokens,
+            "tokensPerSecond": tokens / elapsed if elapsed else 0.0,
+            "lexerTokensPerSecond": tokens / lexSeconds if lexSeconds else 0.0,
+            "maxDepth": self.maxDepth,
+            "emittedBytes": self.emittedBytes(),
+            "calls": {name: {"calls": calls, "seconds": total, "selfSeconds": own}
+                      for name, (calls, total, own) in sorted(self.stats.items(), key=lambda item: -item[1][2]) if calls},
+        }
+
+    def toJson(self):
+        return json.dumps(self.summary(), indent=2)
+
+    # One line per call stack: frame names from the outermost call, separated by ';', then the self time
+    # in microseconds.
+    def foldedStacks(self):
+        lines = []
+        for path in range(1, len(self.paths)):
+            micros = round(self.selfTimes[path] * 1000000)
+            if micros <= 0:
+                continue
+            names = []
+            while path:
+                path, name = self.paths[path]
+                names.append(name)
+            lines.append(';'.join(reversed(names)) + f" {micros}")
+        return '\n'.join(lines) + '\n'
@@ -1,13 +1,96 @@
+import os
 import sys
 import enum
+import re
+import bisect
+import codecs
+import mmap
+from array import array
+from diagnostics import *
 
 # Lexer object keeps track of current position in the source code and produces each token.
 class Lexer:
-    def __init__(self, source):
+    def __init__(self, source, legacy=False):
         self.source = source + '\n' # Source code to lex as a string. Append a newline to simplify lexing/parsing the last token/statement.
         self.curChar = ''   # Current character in the string.
         self.curPos = -1    # Current position in the string.
+        self.lineStarts = None # Offsets where each line begins, built on first use by lineColumn().
+        self.firstLine = 0      # Number of lines dropped from the front of lineStarts.
+        self.reader = None  # File object the source is read from in streaming mode, see fromStream().
+        self.base = 0       # Offset of self.source[0] in the whole input. Only moves in streaming mode.
+        self.diagnostics = []   # Lexing errors found so far.
+        self.annotations = {}   # Offset of a newline -> the comment before it, for comments with an @annotation.
         self.nextChar()
+        # The table-driven engine is the default; the character-at-a-time engine is kept for A/B comparisons.
+        if legacy:
+            self.getToken = self.legacyGetToken
+
+    # Create a lexer that reads its source from a file object in chunks of chunkSize instead of needing
+    # the whole program as one string. Binary files and mmap objects are decoded as UTF-8.
+    # Only the current line and the unread rest of the chunk are held in self.source.
+    @classmethod
+    def fromStream(cls, stream, chunkSize=65536, legacy=False):
+        lexer = cls('', legacy)
+        lexer.source = ''
+        lexer.curPos = 0
+        lexer.reader = stream
+        lexer.chunkSize = chunkSize
+        lexer.decoder = codecs.getincrementaldecoder('utf-8')()
+        lexer.lastNewline = -1      # Position of the last newline in self.source.
+        lexer.lineStarts = array('q', [0])
+        return lexer
+
+    # Generate the token stream. After the end of the source, EOF tokens are produced forever.
+    def tokens(self):
+        if self.reader is None:
+            while True:
+                yield self.nextToken()
+
+        while True:
+            # A token never continues past a newline, so once the window has a newline at or after the
+            # current position the next token is complete in the window.
+            if self.curPos > self.lastNewline:
+                self.refill()
+            token = self.nextToken()
+            # The window moves on, so take the text now and make the offsets absolute.
+            token._text = token.text
+            token.start += self.base
+            token.end += self.base
+            yield token
+
+    # Drop the consumed part of the window and read chunks until it holds a newline or the input ends.
+    def refill(self):
+        rest = self.source[self.curPos:]
+        self.base += self.curPos
+        self.curPos = 0
+        # Forget line starts before the last token handed out, so the line index stays bounded too.
+        keep = bisect.bisect_right(self.lineStarts, self.base - 1) - 1
+        if keep > 0:
+            del self.lineStarts[:keep]
+            self.firstLine += keep
+        chunks = [rest]
+        length = len(rest)
+        while True:
+            chunk = self.reader.read(self.chunkSize)
+            atEnd = not chunk
+            if not isinstance(chunk, str):
+                chunk = self.decoder.decode(chunk, atEnd)
+            if atEnd:
+                # Append a newline to simplify lexing/parsing the last token/statement, as __init__ does.
+                chunks.append('\n')
+                self.lineStarts.append(self.base + length + 1)
+                self.lastNewline = sys.maxsize
+                break
+            for match in NEWLINE_PATTERN.finditer(chunk):
+                self.lineStarts.append(self.base + length + match.end())
+            chunks.append(chunk)
+            length += len(chunk)
+            if '\n' in chunk:
+                break
+        self.source = ''.join(chunks)
+        if self.lastNewline != sys.maxsize:
+            self.lastNewline = self.source.rfind('\n')
+        self.curChar = self.source[0] if self.source else '\0'
 
     # Process the next character.
     def nextChar(self):
@@ -23,15 +106,104 @@ class Lexer:
             return '\0'
         return self.source[self.curPos+1]
 
-    # Invalid token found, print error message and exit.
+    # Invalid token found. Record the error and raise it; nextToken() recovers from it.
     def abort(self, message):
-        sys.exit("Lexing error. " + message)
+        line, column = self.lineColumn(self.base + self.curPos)
+        diagnostic = Diagnostic(message, line, column)
+        self.diagnostics.append(diagnostic)
+        raise diagnostic
+
+    # Return the next token. After a lexing error the rest of the line becomes one ERROR token,
+    # so the parser can skip it and carry on at the next line.
+    def nextToken(self):
+        start = self.curPos
+        try:
+            return self.getToken()
+        except Diagnostic:
+            source = self.source
+            start = SKIP_PATTERN.match(source, start).end()
+            end = source.find('\n', max(start, self.curPos))
+            if end < 0:
+                end = len(source)
+            self.curPos = end
+            self.curChar = source[end] if end < len(source) else '\0'
+            return Token(None, TokenType.ERROR, start, end, self)
 
     # Return the next token.
+    # Table-driven engine: the first character of the token selects a handler from a precomputed table,
+    # and multi-character tokens are matched with compiled patterns instead of one nextChar() per character.
     def getToken(self):
+        source = self.source
+        start = self.curPos
+        pos = SKIP_PATTERN.match(source, start).end()
+        if pos >= len(source):
+            # EOF. Keep advancing like nextChar() does so repeated calls behave the same.
+            self.curPos = pos + 1
+            return Token('', TokenType.EOF, pos, pos, self)
+
+        char = source[pos]
+        kind = SINGLE_CHAR_TOKENS.get(char)
+        if kind is not None:
+            self.curPos = pos + 1
+            if kind is TokenType.NEWLINE and pos != start:
+                self.noteComment(source[start:pos], self.base + pos)
+            return Token(char, kind, pos, pos + 1, self)
+
+        handler = FIRST_CHAR_HANDLERS.get(char)
+        if handler is not None:
+            token = handler(self, source, pos)
+            if token is not None:
+                return token
+
+        # Anything the table does not cover (non-ASCII letters and digits, unknown characters) goes through
+        # the original engine so the tokens and error messages stay identical.
+        self.curPos = pos
+        self.curChar = char
+        return self.legacyGetToken()
+
+    # Handle '=', '>', '<' and '!', which may be followed by '=' to form a two character operator.
+    def scanOperator(self, source, pos):
+        char = source[pos]
+        if source[pos + 1] == '=':
+            self.curPos = pos + 2
+            return Token(char + '=', DOUBLE_CHAR_TOKENS[char], pos, pos + 2, self)
+        if char == '!':
+            return None
+        self.curPos = pos + 1
+        return Token(char, SINGLE_OR_DOUBLE_TOKENS[char], pos, pos + 1, self)
+
+    def scanString(self, source, pos):
+        match = STRING_PATTERN.match(source, pos)
+        if match is None:
+            return None
+        self.curPos = match.end()
+        return Token(None, TokenType.STRING, pos + 1, self.curPos - 1, self)
+
+    def scanNumber(self, source, pos):
+        end = NUMBER_PATTERN.match(source, pos).end()
+        nextChar = source[end]
+        if nextChar == '.' or nextChar >= '\x80':
+            return None
+        self.curPos = end
+        return Token(None, TokenType.NUMBER, pos, end, self)
+
+    def scanWord(self, source, pos):
+        end = WORD_PATTERN.match(source, pos).end()
+        if source[end] >= '\x80':
+            return None
+        self.curPos = end
+        keyword = KEYWORDS.get(source[pos : end])
+        if keyword == None: # Identifier. The text is sliced (and interned) only when someone asks for it.
+            return Token(None, TokenType.IDENT, pos, end, self)
+        # Keyword texts share the interned enum member name instead of a fresh slice.
+        return Token(keyword.name, keyword, pos, end, self)
+
+    # Return the next token, examining the source one character at a time.
+    def legacyGetToken(self):
         self.skipWhitespace()
         self.skipComment()
         token = None
+        tokenStart = self.curPos
 
         # Check the first character of this token to see if we can decide what it is.
         # If it is a multiple character operator (e.g., !=), number, identifier, or keyword, then we will process the rest.
@@ -120,9 +292,9 @@ class Lexer:
             keyword = Token.checkIfKeyword(tokText)
  
             if keyword == None: # Identifier
-                token = Token(tokText, TokenType.IDENT)
+                token = Token(sys.intern(tokText), TokenType.IDENT)
             else:   # Keyword
-                token = Token(tokText, keyword)
+                token = Token(keyword.name, keyword)
                 
         elif self.curChar == '\n':
             # Newline.
@@ -143,9 +315,22 @@ class Lexer:
             # Unknown token!
             self.abort("Unknown token: " + self.curChar)
 
+        if token is not None:
+            # Record where the token's text sits in the source.
+            token.lexer = self
+            token.start = tokenStart + 1 if token.kind == TokenType.STRING else tokenStart
+            token.end = token.start + len(token.text)
         self.nextChar()
         return token
 
+    # Return the 1-based (line, column) of an offset into the source, using an index of line start offsets.
+    def lineColumn(self, offset):
+        if self.lineStarts is None:
+            self.lineStarts = array('q', [0])
+            self.lineStarts.extend(match.end() for match in NEWLINE_PATTERN.finditer(self.source))
+        line = bisect.bisect_right(self.lineStarts, offset)
+        return self.firstLine + line, offset - self.lineStarts[line - 1] + 1
+
     # Skip whitespace except newlines, which we will use to indicate the end of a statement.
     def skipWhitespace(self):
         while self.curChar == ' ' or self.curChar == '\t' or self.curChar == '\r':
@@ -153,27 +338,249 @@ class Lexer:
 
     def skipComment(self):
         if self.curChar == '#':
+            start = self.curPos
             while self.curChar != '\n':
                 self.nextChar()
+            self.noteComment(self.source[start:self.curPos], self.base + self.curPos)
+
+    # Keep a comment that carries an annotation, like "# @nomemo" after a FUNC, under the offset of the
+    # newline that ends it. The parser looks it up with that newline token.
+    def noteComment(self, text, newline):
+        if not isinstance(text, str):   # Bytes from a MappedLexer.
+            text = text.decode('utf-8', 'replace')
+        if '@' in text:
+            self.annotations[newline] = text
+
+
+# MappedLexer scans a bytes-like source, usually an mmap of the program file from fromFile(), without decoding
+# or copying it. Tokens hold byte offsets, and their text is decoded the first time it is asked for.
+# The newline Lexer appends to the source is virtual: the end of the data reads as one more '\n'.
+# Tokens the byte tables do not cover (non-ASCII letters and digits, and errors) are lexed by Lexer's engine
+# from the decoded rest of their line, so the tokens and error messages stay identical.
+class MappedLexer(Lexer):
+    def __init__(self, data):
+        super().__init__('')
+        self.source = data
+        self.size = len(data)
+        self.curPos = 0
+        self.lines = 0          # Newline tokens produced so far.
+        self.lineStarts = array('q', [0])   # Start of line 1, 1 + LINE_INDEX_STEP, 1 + 2 * LINE_INDEX_STEP ...
+        self.released = 0       # Pages of an mmap before this offset have been handed back to the OS.
+
+    # Map the file object's file read-only. The mapping stays valid after the file is closed.
+    @classmethod
+    def fromFile(cls, inputFile):
+        if os.fstat(inputFile.fileno()).st_size == 0:
+            return cls(b'')     # mmap cannot map an empty file.
+        data = mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(data, 'madvise'):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+        return cls(data)
+
+    def nextToken(self):
+        start = self.curPos
+        if start - self.released >= RELEASE_STEP:
+            self.release(start)
+        try:
+            return self.getToken()
+        except Diagnostic:
+            source = self.source
+            start = SKIP_BYTES_PATTERN.match(source, start).end()
+            end = source.find(b'\n', max(start, self.curPos))
+            if end < 0:
+                end = self.size
+            self.curPos = end
+            return Token(None, TokenType.ERROR, start, end, self)
+
+    # Tell the OS it may drop the mapped pages before offset. Touching them again reads them back from the
+    # file, so the resident size stays at about RELEASE_STEP however large the file is.
+    def release(self, offset):
+        offset -= offset % mmap.PAGESIZE
+        if hasattr(self.source, 'madvise') and hasattr(mmap, 'MADV_DONTNEED') and offset > self.released:
+            self.source.madvise(mmap.MADV_DONTNEED, self.released, offset - self.released)
+        self.released = offset
+
+    # The table-driven engine of Lexer.getToken, on bytes.
+    def getToken(self):
+        source = self.source
+        start = pos = self.curPos
+        if pos < self.size:
+            pos = SKIP_BYTES_PATTERN.match(source, pos).end()
+        if pos >= self.size:
+            self.curPos = pos + 1
+            if pos == self.size:
+                if pos > start:
+                    self.noteComment(source[start:pos], pos)
+                return Token('\n', TokenType.NEWLINE, pos, pos + 1, self)
+            return Token('', TokenType.EOF, self.size + 1, self.size + 1, self)
+
+        char = chr(source[pos])
+        kind = SINGLE_CHAR_TOKENS.get(char)
+        if kind is not None:
+            self.curPos = pos + 1
+            if kind is TokenType.NEWLINE:
+                self.lines += 1
+                if self.lines % LINE_INDEX_STEP == 0:
+                    self.lineStarts.append(pos + 1)
+                if pos != start:
+                    self.noteComment(source[start:pos], pos)
+            return Token(char, kind, pos, pos + 1, self)
+
+        handler = FIRST_BYTE_HANDLERS.get(char)
+        if handler is not None:
+            token = handler(self, source, pos)
+            if token is not None:
+                return token
+        return self.decodedToken(pos)
+
+    def scanOperator(self, source, pos):
+        char = chr(source[pos])
+        if pos + 1 < self.size and source[pos + 1] == EQUALS_BYTE:
+            self.curPos = pos + 2
+            return Token(char + '=', DOUBLE_CHAR_TOKENS[char], pos, pos + 2, self)
+        if char == '!':
+            return None
+        self.curPos = pos + 1
+        return Token(char, SINGLE_OR_DOUBLE_TOKENS[char], pos, pos + 1, self)
+
+    def scanString(self, source, pos):
+        match = STRING_BYTES_PATTERN.match(source, pos)
+        if match is None:
+            return None
+        self.curPos = match.end()
+        return Token(None, TokenType.STRING, pos + 1, self.curPos - 1, self)
 
+    def scanNumber(self, source, pos):
+        end = NUMBER_BYTES_PATTERN.match(source, pos).end()
+        if end < self.size and (source[end] == DOT_BYTE or source[end] >= 0x80):
+            return None
+        self.curPos = end
+        return Token(None, TokenType.NUMBER, pos, end, self)
 
-# Token contains the original text and the type of token.
-class Token:   
-    def __init__(self, tokenText, tokenKind):
-        self.text = tokenText   # The token's actual text. Used for identifiers, strings, and numbers.
+    def scanWord(self, source, pos):
+        end = WORD_BYTES_PATTERN.match(source, pos).end()
+        if end < self.size and source[end] >= 0x80:
+            return None
+        self.curPos = end
+        keyword = BYTE_KEYWORDS.get(source[pos : end])
+        if keyword == None: # Identifier. The text is decoded (and interned) only when someone asks for it.
+            return Token(None, TokenType.IDENT, pos, end, self)
+        return Token(keyword.name, keyword, pos, end, self)
+
+    # Lex the token at pos with Lexer's engine, from the decoded rest of its line, and translate its
+    # character offsets back to byte offsets.
+    def decodedToken(self, pos):
+        end = self.source.find(b'\n', pos)
+        if end < 0:
+            end = self.size
+        text = self.source[pos : end].decode('utf-8')
+        lexer = Lexer(text)
+        try:
+            token = lexer.getToken()
+        except Diagnostic as diagnostic:
+            self.curPos = pos + len(text[:lexer.curPos].encode('utf-8'))
+            self.abort(diagnostic.message)
+        self.curPos = pos + len(text[:lexer.curPos].encode('utf-8'))
+        start = pos + len(text[:token.start].encode('utf-8'))
+        return Token(token.text, token.kind, start, pos + len(text[:token.end].encode('utf-8')), self)
+
+    # Lines are counted from the nearest indexed line start before offset. Columns count characters, not bytes.
+    def lineColumn(self, offset):
+        if offset > self.size:     # Past the virtual newline.
+            return self.lineColumn(self.size)[0] + 1, 1
+        index = bisect.bisect_right(self.lineStarts, offset) - 1
+        before = self.source[self.lineStarts[index] : offset]
+        lineStart = self.lineStarts[index] + before.rfind(b'\n') + 1
+        column = len(self.source[lineStart : offset].decode('utf-8', 'replace')) + 1
+        return index * LINE_INDEX_STEP + before.count(b'\n') + 1, column
+
+
+# Token contains the type of token and where its text sits in the source.
+# The text is only sliced out of the source the first time it is asked for.
+class Token:
+    __slots__ = ('kind', 'start', 'end', 'lexer', '_text')
+
+    def __init__(self, tokenText, tokenKind, start=0, end=0, lexer=None):
+        self._text = tokenText  # The token's actual text, or None until it is first needed.
         self.kind = tokenKind   # The TokenType that this token is classified as.
+        self.start = start      # Offset of the token's text in the source.
+        self.end = end          # Offset just past the token's text.
+        self.lexer = lexer      # Lexer that produced the token and owns the source.
+
+    # The token's actual text. Used for identifiers, strings, and numbers.
+    @property
+    def text(self):
+        text = self._text
+        if text is None:
+            text = self.lexer.source[self.start : self.end]
+            if not isinstance(text, str):   # Bytes from a MappedLexer.
+                text = text.decode('utf-8')
+            if self.kind == TokenType.IDENT:
+                text = sys.intern(text)
+            self._text = text
+        return text
+
+    @property
+    def line(self):
+        return self.lexer.lineColumn(self.start)[0]
+
+    @property
+    def column(self):
+        return self.lexer.lineColumn(self.start)[1]
 
     @staticmethod
     def checkIfKeyword(tokenText):
-        for kind in TokenType:
-            # Relies on all keyword enum values being 1XX.
-            if kind.name == tokenText and kind.value >= 100 and kind.value < 200:
-                return kind
-        return None
+        return KEYWORDS.get(tokenText)
+
+
+# TokenArray lexes a whole source up front and keeps the token stream in parallel arrays:
+# one byte for the kind, plus the start offset and length of the text. Token objects are only
+# built when an entry is indexed, so holding on to millions of tokens costs a few bytes each.
+# A parser can take a TokenArray in place of its lexer, to parse without lexing at the same time.
+class TokenArray:
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.diagnostics = lexer.diagnostics
+        self.annotations = lexer.annotations
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.lengths = array('L')
+
+        codes = KIND_CODES
+        token = lexer.nextToken()
+        while True:
+            self.kinds.append(codes[token.kind])
+            self.starts.append(token.start)
+            self.lengths.append(token.end - token.start)
+            if token.kind == TokenType.EOF:
+                break
+            token = lexer.nextToken()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        return Token(None, KINDS[self.kinds[index]], start, start + self.lengths[index], self.lexer)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    # Same stream as Lexer.tokens(): after the end, the EOF token is repeated forever.
+    def tokens(self):
+        yield from self
+        eof = self[len(self) - 1]
+        while True:
+            yield eof
+
+    def lineColumn(self, offset):
+        return self.lexer.lineColumn(offset)
 
 
 # TokenType is our enum for all the types of tokens.
 class TokenType(enum.Enum):
+    ERROR = -2  # The rest of a line after a lexing error.
     EOF = -1
     NEWLINE = 0
     NUMBER = 1
@@ -211,3 +618,59 @@ class TokenType(enum.Enum):
     LTEQ = 209
     GT = 210
     GTEQ = 211
+
+
+# Keyword index built once at import time. Relies on all keyword enum values being 1XX.
+KEYWORDS = {kind.name: kind for kind in TokenType if kind.value >= 100 and kind.value < 200}
+
+
+# Compact kind codes used by TokenArray.
+KINDS = list(TokenType)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Precomputed tables for the table-driven engine in Lexer.getToken.
+NEWLINE_PATTERN = re.compile(r'\n')
+SKIP_PATTERN = re.compile(r'[ \t\r]*(?:#[^\n]*)?')
+STRING_PATTERN = re.compile(r'"[^"\r\n\t\\%]*"')
+NUMBER_PATTERN = re.compile(r'[0-9]+(?:\.[0-9]+)?')
+WORD_PATTERN = re.compile(r'[A-Za-z][A-Za-z0-9]*')
+
+SINGLE_CHAR_TOKENS = {
+    '+': TokenType.PLUS,
+    '-': TokenType.MINUS,
+    '*': TokenType.ASTERISK,
+    '/': TokenType.SLASH,
+    '\n': TokenType.NEWLINE,
+    ',': TokenType.COMMA,
+    '(': TokenType.LPARE,
+    ')': TokenType.RPARE,
+}
+SINGLE_OR_DOUBLE_TOKENS = {'=': TokenType.EQ, '>': TokenType.GT, '<': TokenType.LT}
+DOUBLE_CHAR_TOKENS = {'=': TokenType.EQEQ, '>': TokenType.GTEQ, '<': TokenType.LTEQ, '!': TokenType.NOTEQ}
+
+FIRST_CHAR_HANDLERS = {'"': Lexer.scanString}
+for char in '=><!':
+    FIRST_CHAR_HANDLERS[char] = Lexer.scanOperator
+for char in '0123456789':
+    FIRST_CHAR_HANDLERS[char] = Lexer.scanNumber
+for char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ':
+    FIRST_CHAR_HANDLERS[char] = Lexer.scanWord
+
+# Tables for MappedLexer, which scans bytes.
+SKIP_BYTES_PATTERN = re.compile(rb'[ \t\r]*(?:#[^\n]*)?')
+STRING_BYTES_PATTERN = re.compile(rb'"[^"\r\n\t\\%]*"')
+NUMBER_BYTES_PATTERN = re.compile(rb'[0-9]+(?:\.[0-9]+)?')
+WORD_BYTES_PATTERN = re.compile(rb'[A-Za-z][A-Za-z0-9]*')
+BYTE_KEYWORDS = {name.encode(): kind for name, kind in KEYWORDS.items()}
+EQUALS_BYTE = ord('=')
+DOT_BYTE = ord('.')
+LINE_INDEX_STEP = 64                # Lines between the line starts MappedLexer indexes.
+RELEASE_STEP = 4 * 1024 * 1024      # Bytes MappedLexer scans between handing pages back.
+
+FIRST_BYTE_HANDLERS = {'"': MappedLexer.scanString}
+for char in '=><!':
+    FIRST_BYTE_HANDLERS[char] = MappedLexer.scanOperator
+for char in '0123456789':
+    FIRST_BYTE_HANDLERS[char] = MappedLexer.scanNumber
+for char in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ':
+    FIRST_BYTE_HANDLERS[char] = MappedLexer.scanWord
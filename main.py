@@ -1,22 +1,142 @@
 from lex import *
-from emit import *
-from parse import *
+from compiler import *
+from vm import *
+from cache import *
+from incremental import *
+from instrument import *
+import argparse
+import hwruntime
+import marshal
 import sys
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Error: Compiler needs source file as argument.")
-    with open(sys.argv[1], 'r') as inputFile:
-        source = inputFile.read()
+    argParser = argparse.ArgumentParser(description="Compile a HelloWorld program to out.py.")
+    argParser.add_argument("source", help="HelloWorld source file")
+    argParser.add_argument("-O", dest="optimize", action="store_true", help="fold constants, remove constant IF branches, and optimize WHILE loops")
+    argParser.add_argument("--memo", action="store_true", help="remember the results of pure functions")
+    argParser.add_argument("--memo-size", type=int, default=1024, metavar="SIZE", help="entries in the memo table of each function (default: 1024)")
+    argParser.add_argument("--inline", action="store_true", help="replace calls of small functions by their RETURN expression")
+    argParser.add_argument("--inline-size", type=int, default=24, metavar="SIZE", help="largest expression in nodes to put in place of a call (default: 24)")
+    argParser.add_argument("--report", action="store_true", help="print what the optimizer changed")
+    argParser.add_argument("--run", action="store_true", help="compile to a code object and run it in this process instead of writing out.py")
+    argParser.add_argument("--vm", action="store_true", help="compile to instructions for the register VM in vm.py and run them in this process instead of writing out.py")
+    argParser.add_argument("--cache", action="store_true", help="reuse compiled output for unchanged sources")
+    argParser.add_argument("--cache-dir", default=".hwcache", metavar="DIR", help="directory of the compilation cache (default: .hwcache)")
+    argParser.add_argument("--cache-size", type=int, default=64, metavar="MB", help="size limit of the compilation cache")
+    argParser.add_argument("--incremental", nargs="?", const="out.py.units", metavar="MANIFEST", help="only recompile the top-level units that changed since the last build (default manifest: out.py.units)")
+    argParser.add_argument("--mmap", action="store_true", help="lex the source straight from a memory map of the file, for very large programs")
+    argParser.add_argument("--profile", metavar="FILE", help="time the compiler phases and productions and write the numbers to FILE as JSON")
+    argParser.add_argument("--flamegraph", metavar="FILE", help="write the profiled call stacks to FILE in folded format for flame graph tools")
+    arguments = argParser.parse_args()
+    if arguments.incremental and (arguments.optimize or arguments.run or arguments.vm or arguments.memo or arguments.inline):
+        argParser.error("--incremental cannot be combined with -O, --inline, --memo, --run or --vm")
+    if arguments.memo_size < 1:
+        argParser.error("--memo-size must be at least 1")
+    if arguments.inline_size < 1:
+        argParser.error("--inline-size must be at least 1")
+    if arguments.vm and (arguments.run or arguments.cache):
+        argParser.error("--vm cannot be combined with --run or --cache")
+    if arguments.incremental and arguments.mmap:
+        argParser.error("--incremental cannot be combined with --mmap")
+    if arguments.incremental and (arguments.profile or arguments.flamegraph):
+        argParser.error("--incremental cannot be combined with --profile or --flamegraph")
+    if arguments.cache and (arguments.profile or arguments.flamegraph):
+        argParser.error("--cache cannot be combined with --profile or --flamegraph")
 
-    # Initialize the lexer, emitter, and parser.
-    lexer = Lexer(source)
-    emitter = Emitter("out.py")
-    parser = Parser(lexer, emitter)
+    # Look the program up in the compilation cache first; a hit skips lexing, parsing and emitting.
+    cache = None
+    cached = None
+    kind = "code" if arguments.run else "py"
+    if arguments.cache:
+        cache = CompileCache(arguments.cache_dir, arguments.cache_size * 1024 * 1024)
+        key = cache.keyForFile(arguments.source, {"optimize": arguments.optimize, "memo": arguments.memo and arguments.memo_size, "inline": arguments.inline and arguments.inline_size})
+        cached = cache.lookup(key, kind)
 
-    parser.program() # Start the parser.
-    emitter.writeFile() # Write the output to file.
+    reports = []
+    warnings = []
+    incremental = None
+    instrumentation = Instrumentation() if arguments.profile or arguments.flamegraph else None
+    if cached is not None:
+        # An entry holds the code object or the text of out.py, with the report and warnings of the compile.
+        with open(cached, 'rb') as cachedFile:
+            output, reports, warnings = marshal.load(cachedFile)
+        if arguments.run:
+            code = output
+        else:
+            with open("out.py", 'w') as outputFile:
+                outputFile.write(output)
+    else:
+        try:
+            code, reports, warnings, incremental = compileFile(arguments, instrumentation)
+        except CompileError as error:
+            for diagnostic in error.diagnostics:
+                print("Error! " + str(diagnostic), file=sys.stderr)
+            sys.exit(f"{len(error.diagnostics)} error(s) found.")
+        if cache is not None:
+            if arguments.run:
+                output = code
+            else:
+                with open("out.py", 'r') as outputFile:
+                    output = outputFile.read()
+            cache.put(key, kind, marshal.dumps((output, reports, warnings)))
+
+    if not (arguments.run or arguments.vm):
+        copyRuntime(".")  # So out.py runs from this directory too.
     print("[info] - Compiling completed.")
     print("[Programming Laguage] - HelloWorld")
     print("-------------------------------------")
-main()
\ No newline at end of file
+    for warning in warnings:
+        print("Warning! " + warning, file=sys.stderr)
+    if arguments.report:
+        for line in reports:
+            print("[optimize] " + line)
+    if incremental is not None:
+        print(f"[incremental] reused {incremental.reused} of {incremental.reused + incremental.compiled} units")
+        if arguments.report:
+            for line in incremental.report:
+                print("[incremental] " + line)
+    if instrumentation is not None:
+        instrumentation.finish()
+        summary = instrumentation.summary()
+        print(f"[profile] {summary['tokens']} tokens in {summary['seconds'] * 1000:.1f} ms "
+              f"({summary['tokensPerSecond']:.0f} tokens/sec), max depth {summary['maxDepth']}, {summary['emittedBytes']} bytes emitted")
+        if arguments.profile:
+            with open(arguments.profile, 'w') as profileFile:
+                profileFile.write(instrumentation.toJson())
+        if arguments.flamegraph:
+            with open(arguments.flamegraph, 'w') as stackFile:
+                stackFile.write(instrumentation.foldedStacks())
+    if cache is not None:
+        totals = cache.saveStats()
+        print(f"[cache] {'hit' if cached is not None else 'miss'} "
+              f"(total hits {totals['hits']}, misses {totals['misses']}, evictions {totals['evictions']})")
+    if arguments.run:
+        hwruntime.execute(code)
+    elif arguments.vm:
+        VirtualMachine(arguments.source).execute(code)
+
+# Compile the source file. Writes out.py, or returns a code object with --run or the main VMFunction with --vm, along with the optimizer report,
+# the type warnings and the IncrementalCompiler used with --incremental. Attaches instrumentation, if given, to every part.
+def compileFile(arguments, instrumentation=None):
+    if arguments.incremental:
+        with open(arguments.source, 'r') as inputFile:
+            source = inputFile.read()
+        incremental = IncrementalCompiler(arguments.incremental)
+        with open("out.py", 'w') as outputFile:
+            outputFile.write(incremental.compile(source))
+        return None, [], [], incremental
+
+    options = CompileOptions(optimize=arguments.optimize, codeObject=arguments.run, filename=arguments.source,
+                             instrumentation=instrumentation, memo=arguments.memo_size if arguments.memo else None,
+                             inline=arguments.inline_size if arguments.inline else None, vm=arguments.vm,
+                             output=None if arguments.run or arguments.vm else "out.py")
+    with open(arguments.source, 'rb' if arguments.mmap else 'r') as inputFile:
+        # The lexer reads the file in chunks as the parser asks for tokens, or with --mmap scans the mapped file without decoding it.
+        lexer = MappedLexer.fromFile(inputFile) if arguments.mmap else Lexer.fromStream(inputFile)
+        result = compileSource(lexer, options)
+    if not result.ok:
+        raise CompileError(result.diagnostics)
+    return result.vmFunction if arguments.vm else result.codeObject, result.reports, result.warnings, None
+
+if __name__ == '__main__':
+    main()
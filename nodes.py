@@ -0,0 +1,95 @@
+# Syntax tree nodes built by TreeParser and walked by CodeGenerator.
+# Each node class lists its fields in __slots__; the constructor takes them positionally, in that order.
+# Statement nodes also record the source line they start on.
+class Node:
+    __slots__ = ('line',)
+
+    def __init__(self, *values, line=0):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        self.line = line
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+# program ::= {statement}
+class Program(Node):
+    __slots__ = ('body',)
+
+
+# Statements.
+
+# "PRINT" string
+class PrintString(Node):
+    __slots__ = ('text',)
+
+# "PRINT" expression
+class Print(Node):
+    __slots__ = ('value',)
+
+# "IF" condition "THEN" nl {statement} ["ELSE" nl {statement}] "ENDIF". orelse is None without an ELSE.
+class If(Node):
+    __slots__ = ('condition', 'body', 'orelse')
+
+# "WHILE" condition "REPEAT" {statement} "ENDWHILE"
+class While(Node):
+    __slots__ = ('condition', 'body')
+
+# "FUNC" ident "(" [ident {"," ident}] ")" nl {statement} "ENDFUNC". memo is False when a "# @nomemo"
+# comment ends the FUNC line, None otherwise, and the memo table size once the Memoizer picks the function.
+class Func(Node):
+    __slots__ = ('name', 'params', 'body', 'memo')
+
+# A counting WHILE loop over integers, run as a Python for loop: for name in range(name, stop). Built by
+# TypeInference from WHILE name < stop REPEAT body LET name = name + 1 ENDWHILE; body leaves out the LET.
+class ForRange(Node):
+    __slots__ = ('name', 'stop', 'body')
+
+# "LET" ident "=" expression
+class Let(Node):
+    __slots__ = ('name', 'value')
+
+# "INPUT" ident
+class Input(Node):
+    __slots__ = ('name',)
+
+# "RETURN" expression
+class Return(Node):
+    __slots__ = ('value',)
+
+# A bare boolean used as a statement ("NOT" ...).
+class Condition(Node):
+    __slots__ = ('condition',)
+
+
+# Expressions.
+
+class Number(Node):
+    __slots__ = ('text',)
+
+class Name(Node):
+    __slots__ = ('name',)
+
+class Call(Node):
+    __slots__ = ('name', 'args')
+
+# ("+" | "-") primary
+class Unary(Node):
+    __slots__ = ('op', 'operand')
+
+# Arithmetic: "+", "-", "*", "/".
+class BinOp(Node):
+    __slots__ = ('op', 'left', 'right')
+
+# Chained comparison: left ops[0] comparators[0] ops[1] comparators[1] ...
+class Compare(Node):
+    __slots__ = ('left', 'ops', 'comparators')
+
+# "and" / "or".
+class BoolOp(Node):
+    __slots__ = ('op', 'left', 'right')
+
+class Not(Node):
+    __slots__ = ('operand',)
@@ -0,0 +1,515 @@
+import math
+import operator
+from nodes import *
+from codegen import expressionText
+
+# Returned by constantValue() for expressions that are not known at compile time.
+NOT_CONSTANT = object()
+
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv}
+COMPARISONS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Return the value of a Number node, or NOT_CONSTANT.
+def constantValue(node):
+    if type(node) is not Number:
+        return NOT_CONSTANT
+    text = node.text
+    if text == 'True' or text == 'False':
+        return text == 'True'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+# Build a Number node for a folded value.
+def numberNode(value):
+    return Number(repr(value))
+
+# True if evaluating the expression cannot call a function or divide by something that may be zero. It
+# can still fail on a name that is not assigned, or that holds something other than a number, so dropping
+# it or evaluating it early also needs its names to be definitely assigned and in numericNames().
+def isSafe(node):
+    kind = type(node)
+    if kind is Call:
+        return False
+    if kind is BinOp:
+        if node.op == '/':
+            divisor = constantValue(node.right)
+            if divisor is NOT_CONSTANT or divisor == 0:
+                return False
+        return isSafe(node.left) and isSafe(node.right)
+    if kind is BoolOp:
+        return isSafe(node.left) and isSafe(node.right)
+    if kind is Compare:
+        return isSafe(node.left) and all(isSafe(comparator) for comparator in node.comparators)
+    if kind is Unary or kind is Not:
+        return isSafe(node.operand)
+    return True
+
+# Names a list of statements assigns to, including nested blocks and function definitions.
+def assignedNames(body, names=None):
+    if names is None:
+        names = set()
+    for node in body:
+        kind = type(node)
+        if kind is Let or kind is Input:
+            names.add(node.name)
+        elif kind is Func:
+            names.add(node.name)
+        elif kind is If:
+            assignedNames(node.body, names)
+            if node.orelse is not None:
+                assignedNames(node.orelse, names)
+        elif kind is While:
+            assignedNames(node.body, names)
+        elif kind is ForRange:
+            names.add(node.name)
+            assignedNames(node.body, names)
+    return names
+
+# Names that can only ever hold a number: every LET of the name, in any scope, assigns numbers and such
+# names, and INPUT reads an integer. Function names, parameters, which can be passed anything, and names
+# assigned from a call, which may return None or a function, are left out.
+def numericNames(body):
+    values = {}     # Name -> the expressions LET assigns to it.
+    others = set()
+    assignedValues(body, values, others)
+    names = set(values) - others
+    changed = True
+    while changed:
+        changed = False
+        for name in sorted(names):
+            if not all(isNumeric(value, names) for value in values[name]):
+                names.discard(name)
+                changed = True
+    return names
+
+# Collect the values assigned to each name in a list of statements, and the function names and parameters.
+def assignedValues(body, values, others):
+    for node in body:
+        kind = type(node)
+        if kind is Let:
+            values.setdefault(node.name, []).append(node.value)
+        elif kind is Input or kind is ForRange:
+            values.setdefault(node.name, [])
+        elif kind is Func:
+            others.add(node.name)
+            others.update(node.params)
+        if kind is If:
+            assignedValues(node.body, values, others)
+            if node.orelse is not None:
+                assignedValues(node.orelse, values, others)
+        elif kind is While or kind is ForRange or kind is Func:
+            assignedValues(node.body, values, others)
+
+# True if an expression gives a number whenever the names it reads are in names.
+def isNumeric(node, names):
+    kind = type(node)
+    if kind is Name:
+        return node.name in names
+    if kind is Call:
+        return False
+    if kind is BinOp or kind is BoolOp:
+        return isNumeric(node.left, names) and isNumeric(node.right, names)
+    if kind is Unary:
+        return isNumeric(node.operand, names)
+    return True     # A number, or the bool of a comparison or NOT.
+
+# Names an expression reads, including the names of called functions.
+def readNames(node, names=None):
+    if names is None:
+        names = set()
+    kind = type(node)
+    if kind is Name:
+        names.add(node.name)
+    elif kind is Call:
+        names.add(node.name)
+        for arg in node.args:
+            readNames(arg, names)
+    elif kind is BinOp or kind is BoolOp:
+        readNames(node.left, names)
+        readNames(node.right, names)
+    elif kind is Compare:
+        readNames(node.left, names)
+        for comparator in node.comparators:
+            readNames(comparator, names)
+    elif kind is Unary or kind is Not:
+        readNames(node.operand, names)
+    return names
+
+# Names read anywhere in a list of statements, not counting nested function definitions.
+def statementReadNames(body, names=None):
+    if names is None:
+        names = set()
+    for node in body:
+        kind = type(node)
+        if kind is Let or kind is Print or kind is Return:
+            readNames(node.value, names)
+        elif kind is If:
+            readNames(node.condition, names)
+            statementReadNames(node.body, names)
+            if node.orelse is not None:
+                statementReadNames(node.orelse, names)
+        elif kind is While:
+            readNames(node.condition, names)
+            statementReadNames(node.body, names)
+        elif kind is ForRange:
+            names.add(node.name)
+            readNames(node.stop, names)
+            statementReadNames(node.body, names)
+        elif kind is Condition:
+            readNames(node.condition, names)
+    return names
+
+# True for the integer constant value. Float constants are left alone since they change the result type.
+def isInteger(node, value):
+    constant = constantValue(node)
+    return type(constant) is int and constant == value
+
+
+# ConstantFolder rewrites a syntax tree in place: constant arithmetic and comparisons are computed at
+# compile time, and IF/WHILE statements whose condition is constant are replaced by the branch that would
+# run. Every change is recorded in self.report. Identities like x*1 are left to TypeInference, since they
+# only hold when x is a number: x could be None from a function that ended without RETURN.
+class ConstantFolder:
+    def __init__(self):
+        self.report = []
+        self.inFunction = False
+
+    # Drop statements that can never run. Inside a function, assignments decide which names are local,
+    # so dead code that assigns is kept under "if False:", which Python compiles away but still scans.
+    def removeDead(self, body, result, line):
+        if self.inFunction and assignedNames(body):
+            result.append(If(numberNode(False), self.block(body), None, line=line))
+
+    def program(self, tree):
+        tree.body = self.block(tree.body)
+        return tree
+
+    # Fold a list of statements, returning the new list.
+    def block(self, body):
+        result = []
+        for node in body:
+            kind = type(node)
+            if kind is If:
+                node.condition = self.fold(node.condition, node.line, True)
+                value = constantValue(node.condition)
+                if value is NOT_CONSTANT:
+                    node.body = self.block(node.body)
+                    if node.orelse is not None:
+                        node.orelse = self.block(node.orelse)
+                    result.append(node)
+                elif value:
+                    self.report.append(f"line {node.line}: IF condition is always true, kept the THEN branch")
+                    result.extend(self.block(node.body))
+                    if node.orelse is not None:
+                        self.removeDead(node.orelse, result, node.line)
+                else:
+                    self.removeDead(node.body, result, node.line)
+                    if node.orelse is None:
+                        self.report.append(f"line {node.line}: IF condition is always false, removed the IF")
+                    else:
+                        self.report.append(f"line {node.line}: IF condition is always false, kept the ELSE branch")
+                        result.extend(self.block(node.orelse))
+            elif kind is While:
+                node.condition = self.fold(node.condition, node.line, True)
+                value = constantValue(node.condition)
+                if value is not NOT_CONSTANT and not value:
+                    self.report.append(f"line {node.line}: WHILE condition is always false, removed the loop")
+                    self.removeDead(node.body, result, node.line)
+                    continue
+                node.body = self.block(node.body)
+                result.append(node)
+            elif kind is Func:
+                inFunction = self.inFunction
+                self.inFunction = True
+                node.body = self.block(node.body)
+                self.inFunction = inFunction
+                result.append(node)
+            elif kind is Let or kind is Print or kind is Return:
+                node.value = self.fold(node.value, node.line)
+                result.append(node)
+            elif kind is Condition:
+                node.condition = self.fold(node.condition, node.line)
+                result.append(node)
+            else:
+                result.append(node)
+        return result
+
+    # Fold an expression that is the direct child of a statement, reporting it if it changed. condition is
+    # True for the condition of an IF or WHILE, where only the truth of the value matters.
+    def fold(self, node, line, condition=False):
+        before = expressionText(node)
+        node = self.expression(node, condition)
+        after = expressionText(node)
+        if after != before:
+            self.report.append(f"line {line}: {before} -> {after}")
+        return node
+
+    def expression(self, node, condition=False):
+        kind = type(node)
+        if kind is BinOp:
+            node.left = left = self.expression(node.left)
+            node.right = right = self.expression(node.right)
+            leftValue = constantValue(left)
+            rightValue = constantValue(right)
+            if leftValue is not NOT_CONSTANT and rightValue is not NOT_CONSTANT:
+                try:
+                    value = ARITHMETIC[node.op](leftValue, rightValue)
+                except (ZeroDivisionError, OverflowError):
+                    return node     # Leave the error to run time.
+                if type(value) is int or math.isfinite(value):
+                    return numberNode(value)
+            return node
+
+        elif kind is Unary:
+            node.operand = self.expression(node.operand)
+            value = constantValue(node.operand)
+            if value is not NOT_CONSTANT:
+                return numberNode(-value if node.op == '-' else +value)
+            return node
+
+        elif kind is Compare:
+            node.left = self.expression(node.left)
+            node.comparators = [self.expression(comparator) for comparator in node.comparators]
+            values = [constantValue(node.left)] + [constantValue(comparator) for comparator in node.comparators]
+            if NOT_CONSTANT in values:
+                return node
+            result = True
+            for op, left, right in zip(node.ops, values, values[1:]):
+                if not COMPARISONS[op](left, right):
+                    result = False
+                    break
+            return numberNode(result)
+
+        elif kind is BoolOp:
+            # The operands of a condition are conditions too. Elsewhere, as in (a AND 2) == 2, the value is
+            # one of the operands, as in Python: x and y is y when x is true.
+            node.left = left = self.expression(node.left, condition)
+            node.right = right = self.expression(node.right, condition)
+            leftValue = constantValue(left)
+            rightValue = constantValue(right)
+            if leftValue is not NOT_CONSTANT:
+                if (node.op == 'and') == bool(leftValue):
+                    return right
+                return numberNode(bool(leftValue)) if condition else left
+            if rightValue is not NOT_CONSTANT and condition:
+                if (node.op == 'and') == bool(rightValue):
+                    return left
+                if isSafe(left):
+                    return numberNode(bool(rightValue))
+            return node
+
+        elif kind is Not:
+            node.operand = self.expression(node.operand, True)
+            value = constantValue(node.operand)
+            if value is not NOT_CONSTANT:
+                return numberNode(not value)
+            return node
+
+        elif kind is Call:
+            node.args = [self.expression(arg) for arg in node.args]
+            return node
+
+        return node
+
+
+# LoopOptimizer works on WHILE loops in a syntax tree, in place:
+# - Loop-invariant code motion: subexpressions of the loop condition and body that only read variables
+#   the loop never assigns are computed once, into a temporary, before the loop. Only expressions that
+#   cannot fail are moved (no calls, no division by a possibly-zero value, every variable definitely
+#   assigned before the loop and only ever holding a number), so running them when the loop body, or the
+#   IF around them, never runs is harmless.
+# - Dead-store elimination: LET statements inside a loop whose value is never read afterwards are dropped,
+#   if their value cannot fail in the same way.
+# Every change is recorded in self.report.
+class LoopOptimizer:
+    def __init__(self, symbols=()):
+        self.symbols = set(symbols)    # Program variables (Parser.symbols), which temporaries must not collide with.
+        self.report = []
+        self.tempCount = 0
+
+    def program(self, tree):
+        functions = [node for node in self.functions(tree.body)]
+        # Arithmetic on anything but numbers fails, so only arithmetic on these names is moved or dropped.
+        self.numeric = numericNames(tree.body)
+        self.definedAt = {}     # While node -> names definitely assigned when the loop starts.
+        # Globals read inside functions may be read by any call, so they are always live at the top level.
+        self.globalReads = set()
+        for function in functions:
+            self.globalReads |= statementReadNames(function.body) - set(function.params) - assignedNames(function.body)
+
+        tree.body = self.hoistBlock(tree.body, set())
+        self.eliminateDeadStores(tree.body, self.globalReads, False)
+        for function in functions:
+            function.body = self.hoistBlock(function.body, set(function.params))
+            self.eliminateDeadStores(function.body, set(), True)
+        return tree
+
+    # All function definitions, including ones nested in blocks.
+    def functions(self, body):
+        for node in body:
+            kind = type(node)
+            if kind is Func:
+                yield node
+                yield from self.functions(node.body)
+            elif kind is If:
+                yield from self.functions(node.body)
+                if node.orelse is not None:
+                    yield from self.functions(node.orelse)
+            elif kind is While:
+                yield from self.functions(node.body)
+
+    def newTemp(self):
+        while True:
+            name = f"_inv{self.tempCount}"
+            self.tempCount += 1
+            if name not in self.symbols:
+                self.symbols.add(name)
+                return name
+
+    # Loop-invariant code motion.
+
+    # Walk a block, tracking the names definitely assigned so far, and hoist out of each loop in it.
+    # Returns the new list of statements.
+    def hoistBlock(self, body, defined):
+        result = []
+        for node in body:
+            kind = type(node)
+            if kind is While:
+                self.definedAt[node] = set(defined)
+                hoisted = {}
+                assigned = assignedNames(node.body)
+                node.condition = self.hoist(node.condition, assigned, defined, hoisted, node.line)
+                self.hoistStatements(node.body, assigned, defined, hoisted)
+                for expression, name in hoisted.values():
+                    result.append(Let(name, expression, line=node.line))
+                    defined.add(name)
+                node.body = self.hoistBlock(node.body, set(defined))
+            elif kind is If:
+                node.body = self.hoistBlock(node.body, set(defined))
+                if node.orelse is not None:
+                    node.orelse = self.hoistBlock(node.orelse, set(defined))
+                    defined |= assignedNames(node.body) & assignedNames(node.orelse)
+            elif kind is Let or kind is Input or kind is Func:
+                defined.add(node.name)
+            result.append(node)
+        return result
+
+    # Hoist invariant expressions out of every statement in a loop body, including nested blocks.
+    def hoistStatements(self, body, assigned, defined, hoisted):
+        for node in body:
+            kind = type(node)
+            if kind is Let or kind is Print or kind is Return:
+                node.value = self.hoist(node.value, assigned, defined, hoisted, node.line)
+            elif kind is If:
+                node.condition = self.hoist(node.condition, assigned, defined, hoisted, node.line)
+                self.hoistStatements(node.body, assigned, defined, hoisted)
+                if node.orelse is not None:
+                    self.hoistStatements(node.orelse, assigned, defined, hoisted)
+            elif kind is While:
+                node.condition = self.hoist(node.condition, assigned, defined, hoisted, node.line)
+                self.hoistStatements(node.body, assigned, defined, hoisted)
+            elif kind is Condition:
+                node.condition = self.hoist(node.condition, assigned, defined, hoisted, node.line)
+
+    # Replace the largest invariant subexpressions of node with temporaries. Identical expressions share one.
+    def hoist(self, node, assigned, defined, hoisted, line):
+        kind = type(node)
+        if kind is Number or kind is Name:
+            return node
+        names = readNames(node)
+        if kind is not Call and names and not (names & assigned) and names <= defined and isSafe(node) \
+                and names <= self.numeric:
+            text = expressionText(node)
+            if text not in hoisted:
+                name = self.newTemp()
+                self.numeric.add(name)
+                hoisted[text] = (node, name)
+                self.report.append(f"line {line}: hoisted {text} out of the WHILE loop as {name}")
+            return Name(hoisted[text][1])
+
+        if kind is BinOp or kind is BoolOp:
+            node.left = self.hoist(node.left, assigned, defined, hoisted, line)
+            node.right = self.hoist(node.right, assigned, defined, hoisted, line)
+        elif kind is Compare:
+            node.left = self.hoist(node.left, assigned, defined, hoisted, line)
+            node.comparators = [self.hoist(comparator, assigned, defined, hoisted, line) for comparator in node.comparators]
+        elif kind is Unary or kind is Not:
+            node.operand = self.hoist(node.operand, assigned, defined, hoisted, line)
+        elif kind is Call:
+            node.args = [self.hoist(arg, assigned, defined, hoisted, line) for arg in node.args]
+        return node
+
+    # Dead-store elimination.
+
+    def eliminateDeadStores(self, body, liveAtEnd, inFunction):
+        self.dead = set()
+        self.inFunction = inFunction
+        # Inside a function a name stays local only while some assignment to it remains, so only names
+        # the function never reads are candidates there.
+        self.readInScope = statementReadNames(body) if inFunction else set()
+        self.live(body, set(liveAtEnd), None, True)
+        if self.dead:
+            self.removeDead(body)
+
+    # Backward liveness over a block: return the names live before it, given the names live after it.
+    # With mark set, LET statements inside a loop whose target is not live afterwards are recorded as dead.
+    # defined is None outside loops, and the names definitely assigned when the innermost loop starts inside.
+    def live(self, body, liveAfter, defined, mark):
+        live = liveAfter
+        for node in reversed(body):
+            kind = type(node)
+            if kind is Let:
+                if mark and defined is not None and node.name not in live and node.name not in self.readInScope \
+                        and isSafe(node.value) and readNames(node.value) <= defined & self.numeric:
+                    self.dead.add(node)
+                    continue
+                live = (live - {node.name}) | readNames(node.value)
+            elif kind is Input or kind is Func:
+                live = live - {node.name}
+            elif kind is Print:
+                live = live | readNames(node.value)
+            elif kind is Return:
+                live = readNames(node.value)
+            elif kind is Condition:
+                live = live | readNames(node.condition)
+            elif kind is If:
+                afterIf = live
+                live = self.live(node.body, afterIf, defined, mark)
+                if node.orelse is not None:
+                    live = live | self.live(node.orelse, afterIf, defined, mark)
+                else:
+                    live = live | afterIf
+                live = live | readNames(node.condition)
+            elif kind is While:
+                # Iterate to a fixed point: whatever is live at the top of the loop is live after the body.
+                afterLoop = live | readNames(node.condition)
+                top = afterLoop
+                while True:
+                    newTop = afterLoop | self.live(node.body, top, self.definedAt[node], False)
+                    if newTop == top:
+                        break
+                    top = newTop
+                if mark:
+                    self.live(node.body, top, self.definedAt[node], True)
+                live = top
+            if not self.inFunction:
+                live = live | self.globalReads
+        return live
+
+    def removeDead(self, body):
+        kept = []
+        for node in body:
+            if node in self.dead:
+                self.report.append(f"line {node.line}: removed dead store to {node.name}")
+                continue
+            kind = type(node)
+            if kind is If:
+                self.removeDead(node.body)
+                if node.orelse is not None:
+                    self.removeDead(node.orelse)
+            elif kind is While:
+                self.removeDead(node.body)
+            kept.append(node)
+        body[:] = kept
@@ -3,12 +3,14 @@ from lex import *
 
 # Parser object keeps track of current token, checks if the code matches the grammar, and emits code along the way.
 class Parser:
-    def __init__(self, lexer, emitter):
+    def __init__(self, lexer, emitter, recursive=False):
         self.lexer = lexer
         self.emitter = emitter
+        self.tokens = lexer.tokens()    # Token stream, pulled one token at a time.
 
         self.symbols = set()    # All variables we have declared so far.
         self.functions = set()
+        self.diagnostics = []   # Errors found so far; reported together at the end of program().
         
         self.curToken = None
         self.peekToken = None
@@ -16,6 +18,13 @@ class Parser:
         self.nextToken()    # Call this twice to initialize current and peek.
         self.inFunction = False
 
+        # Expressions go through the operator precedence engine unless recursive is set. The recursive descent
+        # productions below stay available for comparison, the same way the lexer keeps its legacy engine.
+        if not recursive:
+            self.boolean = self.booleanExpression
+            self.comparison = self.comparisonExpression
+            self.expression = self.arithmeticExpression
+
     # Return true if the current token matches.
     def checkToken(self, kind):
         return kind == self.curToken.kind
@@ -33,21 +42,55 @@ class Parser:
     # Advances the current token.
     def nextToken(self):
         self.curToken = self.peekToken
-        self.peekToken = self.lexer.getToken()
+        self.peekToken = next(self.tokens)
         # No need to worry about passing the EOF, lexer handles that.
 
     # Return true if the current token is a comparison operator.
     def isComparisonOperator(self):
         return self.checkToken(TokenType.GT) or self.checkToken(TokenType.GTEQ) or self.checkToken(TokenType.LT) or self.checkToken(TokenType.LTEQ) or self.checkToken(TokenType.EQEQ) or self.checkToken(TokenType.NOTEQ)
 
+    # Abandon the current statement with an error at the current token.
     def abort(self, message):
-        sys.exit("Error! " + message)
+        offset = self.curToken.start
+        if self.checkToken(TokenType.EOF):
+            offset = max(0, offset - 2)     # The end of the last line, not past the newline the lexer appends.
+        line, column = self.lexer.lineColumn(offset)
+        raise Diagnostic(message, line, column)
+
+    # Parse one statement. If it has an error, record the error, skip to where the next statement can start,
+    # and return None.
+    def statementWithRecovery(self):
+        start = self.curToken
+        inFunction = self.inFunction
+        try:
+            return self.statement()
+        except Diagnostic as diagnostic:
+            if not self.checkToken(TokenType.ERROR):   # Otherwise the lexer has reported it already.
+                self.diagnostics.append(diagnostic)
+            self.inFunction = inFunction
+            self.synchronize(start)
+            return None
+
+    # Panic mode: skip to the end of the statement or to a keyword that ends a block.
+    def synchronize(self, start):
+        if self.curToken is start and not self.checkToken(TokenType.EOF):
+            self.nextToken()    # Always move on, or a stray ENDIF would be reported again and again.
+        while self.curToken.kind not in SYNC_TOKENS:
+            self.nextToken()
+        while self.checkToken(TokenType.NEWLINE):
+            self.nextToken()
+
+    # Raise all errors found in the program, the lexer's included.
+    def checkDiagnostics(self):
+        if self.diagnostics or self.lexer.diagnostics:
+            raise CompileError(self.lexer.diagnostics + self.diagnostics)
 
 
     # Production rules.
     # program ::= {statement}
     def program(self):
         self.emitter.headerLine("import sys")
+        self.emitter.headerLine("from hwruntime import *")
         
         # Since some newlines are required in our grammar, need to skip the excess.
         while self.checkToken(TokenType.NEWLINE):
@@ -55,7 +98,10 @@ class Parser:
 
         # Parse all the statements in the program.
         while not self.checkToken(TokenType.EOF):
-            self.statement()
+            self.statementWithRecovery()
+            if not (self.diagnostics or self.lexer.diagnostics):
+                self.emitter.flush()    # Hand finished top-level statements to a streaming emitter.
+        self.checkDiagnostics()
 
     # One of the following statements...
     def statement(self):
@@ -67,11 +113,11 @@ class Parser:
 
             if self.checkToken(TokenType.STRING):
                 # Simple string, so print it.
-                self.emitter.emitLine(f"print(\"{self.curToken.text}\")")
+                self.emitter.emitLine(f"hwPrint(\"{self.curToken.text}\")")
                 self.nextToken()
 
             else:
-                self.emitter.emit("print(")
+                self.emitter.emit("hwPrint(")
                 self.expression()
                 self.emitter.emitLine(')')
 
@@ -90,8 +136,8 @@ class Parser:
             self.nl()
 
             # Zero or more statements in the "if" body.
-            while not (self.checkToken(TokenType.ELSE) or self.checkToken(TokenType.ENDIF)):
-                self.statement()
+            while not (self.checkToken(TokenType.ELSE) or self.checkToken(TokenType.ENDIF) or self.checkToken(TokenType.EOF)):
+                self.statementWithRecovery()
 
             # Handle optional "else" block.
             if self.checkToken(TokenType.ELSE):
@@ -103,8 +149,8 @@ class Parser:
                 self.nl()
 
                 # Zero or more statements in the "else" body.
-                while not self.checkToken(TokenType.ENDIF):
-                    self.statement()
+                while not (self.checkToken(TokenType.ENDIF) or self.checkToken(TokenType.EOF)):
+                    self.statementWithRecovery()
 
             self.emitter.decreaseIndent()
 
@@ -125,8 +171,8 @@ class Parser:
             self.match(TokenType.REPEAT)
             self.nl()
             # Zero or more statements in the loop body.
-            while not self.checkToken(TokenType.ENDWHILE):
-                self.statement()
+            while not (self.checkToken(TokenType.ENDWHILE) or self.checkToken(TokenType.EOF)):
+                self.statementWithRecovery()
 
             self.emitter.decreaseIndent()
             self.match(TokenType.ENDWHILE)
@@ -138,6 +184,7 @@ class Parser:
             functionName = self.curToken.text
             if functionName not in self.symbols:
                 self.symbols.add(functionName)
+            self.functions.add(functionName)
 
             self.emitter.emit("def ")
             self.emitter.emit(functionName)
@@ -162,8 +209,8 @@ class Parser:
             self.emitter.increaseIndent()
             
             # Parse function body, which can be zero or more statements.
-            while not self.checkToken(TokenType.ENDFUNC):
-                self.statement()
+            while not (self.checkToken(TokenType.ENDFUNC) or self.checkToken(TokenType.EOF)):
+                self.statementWithRecovery()
 
             # Decrease indent after the function body ends.
             self.emitter.decreaseIndent()
@@ -192,9 +239,9 @@ class Parser:
             if self.curToken.text not in self.symbols:
                 self.symbols.add(self.curToken.text)
 
-            # Emit scanf but also validate the input. If invalid, set the variable to 0 and clear the input.
+            # Read the next integer through the runtime (hwruntime.py).
             self.emitter.emit(self.curToken.text + '=')
-            self.emitter.emitLine("int(input())")
+            self.emitter.emitLine("hwInput()")
             self.match(TokenType.IDENT)
             
         # "RETURN" expression
@@ -204,18 +251,11 @@ class Parser:
                 self.emitter.emit("return ")
                 self.expression()
             else: # error handling
-                raise SyntaxError("Return statement not in function")
+                self.abort("Return statement not in function")
             self.emitter.emitLine("")
             
-        elif self.checkToken(TokenType.AND):
+        elif self.checkToken(TokenType.AND) or self.checkToken(TokenType.OR) or self.checkToken(TokenType.NOT):
             self.boolean()
-            print("AND")
-        elif self.checkToken(TokenType.OR):
-            self.boolean()
-            print("OR")
-        elif self.checkToken(TokenType.NOT):
-            self.boolean()
-            print("NOT")
         # This is not a valid statement. Error!
         else:
             self.abort("Invalid statement at " + self.curToken.text + " (" + self.curToken.kind.name + ")")
@@ -331,10 +371,120 @@ class Parser:
             # Error!
             self.abort("Unexpected token at " + self.curToken.text)
 
+    # Operator precedence engine. One loop with an explicit stack of open parentheses and calls replaces the
+    # recursive productions boolean ... primary, so deep nesting and long operator chains cost no Python
+    # recursion. It accepts the same language, plus parentheses around any operand, and reports the same errors.
+    #   level BOOLEAN:    "OR", "AND", "NOT", comparisons and arithmetic (boolean).
+    #   level COMPARISON: comparisons and arithmetic (comparison).
+    #   level ARITHMETIC: arithmetic only (expression). Call arguments are always at this level.
+    # A parenthesis that starts a boolean factor keeps the boolean level, and like BooleanFactor's may be left
+    # open; the end of the expression closes it. Any other parenthesis is at the arithmetic level and must close.
+    def booleanExpression(self):
+        return self.operatorExpression(BOOLEAN_LEVEL)
+
+    def comparisonExpression(self):
+        return self.operatorExpression(COMPARISON_LEVEL)
+
+    def arithmeticExpression(self):
+        return self.operatorExpression(ARITHMETIC_LEVEL)
+
+    # Python keeps the operators' precedence, so the tokens are emitted in order, in one piece at the end.
+    def operatorExpression(self, level):
+        groups = []     # Open parentheses and calls, innermost last: (is call, level outside it).
+        pieces = []
+        allowNot = level == BOOLEAN_LEVEL
+        while True:
+            # An operand: {"NOT"} ["+" | "-"] (number | ident | function_call | "(" ...).
+            token = self.curToken
+            if allowNot:
+                while token.kind is TokenType.NOT:
+                    pieces.append("not ")
+                    self.nextToken()
+                    token = self.curToken
+            signed = token.kind is TokenType.PLUS or token.kind is TokenType.MINUS
+            if signed:
+                pieces.append(token.text)
+                self.nextToken()
+                token = self.curToken
+            if token.kind is TokenType.NUMBER:
+                pieces.append(token.text)
+                self.nextToken()
+            elif token.kind is TokenType.IDENT:
+                # Ensure the variable already exists and check the identifier is var or functionName
+                identName = token.text
+                if identName not in self.symbols:
+                    self.abort("Referencing variable before assignment: " + identName)
+                self.nextToken()
+                if self.checkToken(TokenType.LPARE):
+                    self.nextToken()
+                    pieces.append(f"{identName}(")
+                    if self.checkToken(TokenType.IDENT) or self.checkToken(TokenType.NUMBER):
+                        groups.append((True, level))
+                        level = ARITHMETIC_LEVEL
+                        allowNot = False
+                        continue
+                    self.match(TokenType.RPARE)
+                    pieces.append(')')
+                else:
+                    pieces.append(identName)
+            elif token.kind is TokenType.LPARE:
+                self.nextToken()
+                pieces.append('(')
+                groups.append((False, level))
+                # Only a parenthesis that starts a boolean factor is at the boolean level. After an operator or
+                # a sign it is primary's "(" expression ")".
+                if not allowNot or signed:
+                    level = ARITHMETIC_LEVEL
+                allowNot = level == BOOLEAN_LEVEL
+                continue
+            else:
+                # Error!
+                self.abort("Unexpected token at " + token.text)
+
+            # After an operand: an operator, the end of a group or call, or the end of the expression.
+            while True:
+                token = self.curToken
+                kind = token.kind
+                if (kind is TokenType.PLUS or kind is TokenType.MINUS or kind is TokenType.ASTERISK or kind is TokenType.SLASH
+                        or level != ARITHMETIC_LEVEL and kind in COMPARISON_OPERATORS):
+                    pieces.append(token.text)
+                    allowNot = False
+                elif (kind is TokenType.AND or kind is TokenType.OR) and level == BOOLEAN_LEVEL:
+                    pieces.append(" and " if kind is TokenType.AND else " or ")
+                    allowNot = True
+                elif kind is TokenType.RPARE and groups:
+                    self.nextToken()
+                    level = groups.pop()[1]
+                    pieces.append(')')
+                    continue
+                elif kind is TokenType.COMMA and groups and groups[-1][0]:
+                    pieces.append(", ")
+                    allowNot = False
+                elif groups and level != BOOLEAN_LEVEL:
+                    self.match(TokenType.RPARE)     # An unclosed call or parenthesis: error.
+                else:
+                    # The end of the expression. Levels only narrow inwards, so whatever is still open is
+                    # parentheses at the boolean level, which may be left open.
+                    pieces.append(')' * len(groups))
+                    self.emitter.emit(''.join(pieces))
+                    return
+                self.nextToken()
+                break
+
     # nl ::= '\n'+
     def nl(self):
         # Require at least one newline.
         self.match(TokenType.NEWLINE)
         # But we will allow extra newlines too, of course.
         while self.checkToken(TokenType.NEWLINE):
-            self.nextToken()
\ No newline at end of file
+            self.nextToken()
+
+
+# Tokens where panic mode recovery stops skipping: the end of a statement, or the end of a block.
+SYNC_TOKENS = {TokenType.NEWLINE, TokenType.ENDIF, TokenType.ENDWHILE, TokenType.ENDFUNC, TokenType.ELSE, TokenType.EOF}
+
+# Levels of the operator precedence engine, from the widest to the narrowest.
+BOOLEAN_LEVEL = 0
+COMPARISON_LEVEL = 1
+ARITHMETIC_LEVEL = 2
+COMPARISON_OPERATORS = {TokenType.EQEQ, TokenType.NOTEQ, TokenType.LT, TokenType.LTEQ, TokenType.GT, TokenType.GTEQ}
@@ -0,0 +1,167 @@
+from nodes import *
+from optimize import assignedNames, statementReadNames
+
+# Names assigned by LET, INPUT or a loop counter anywhere in a program, inside functions too, since a
+# function's local of the same name shadows a global function for the calls in that function.
+def reboundNames(body, names=None):
+    if names is None:
+        names = set()
+    for node in body:
+        kind = type(node)
+        if kind is Let or kind is Input or kind is ForRange:
+            names.add(node.name)
+        if kind is If:
+            reboundNames(node.body, names)
+            if node.orelse is not None:
+                reboundNames(node.orelse, names)
+        elif kind is While or kind is ForRange or kind is Func:
+            reboundNames(node.body, names)
+    return names
+
+# Names called in a list of statements, not counting nested function definitions.
+def calledNames(body, names=None):
+    if names is None:
+        names = set()
+    for node in body:
+        kind = type(node)
+        if kind is Let or kind is Print or kind is Return:
+            expressionCalls(node.value, names)
+        elif kind is If:
+            expressionCalls(node.condition, names)
+            calledNames(node.body, names)
+            if node.orelse is not None:
+                calledNames(node.orelse, names)
+        elif kind is While:
+            expressionCalls(node.condition, names)
+            calledNames(node.body, names)
+        elif kind is ForRange:
+            expressionCalls(node.stop, names)
+            calledNames(node.body, names)
+        elif kind is Condition:
+            expressionCalls(node.condition, names)
+    return names
+
+# Add the names called in an expression to names.
+def expressionCalls(node, names):
+    kind = type(node)
+    if kind is Call:
+        names.add(node.name)
+        for arg in node.args:
+            expressionCalls(arg, names)
+    elif kind is BinOp or kind is BoolOp:
+        expressionCalls(node.left, names)
+        expressionCalls(node.right, names)
+    elif kind is Compare:
+        expressionCalls(node.left, names)
+        for comparator in node.comparators:
+            expressionCalls(comparator, names)
+    elif kind is Unary or kind is Not:
+        expressionCalls(node.operand, names)
+
+# Memoizer marks the pure functions of a syntax tree for memoization (--memo), by setting Func.memo to the
+# size of the memo table their calls go through. A function is pure when its result depends only on its
+# arguments and calling it has no effect:
+# - it has no PRINT or INPUT, and defines no functions, which would be a new object on every call;
+# - every name it reads that is not its own is a pure function that is defined once and never assigned,
+#   so it reads no global variables and calls nothing that could change or have an effect;
+# - it calls no parameter or local variable, which could hold any function.
+# Functions cannot assign global variables, so writes need no check. Only functions whose FUNC runs at
+# most once, outside loops and other functions, get a table; and functions whose FUNC line ends in a
+# "# @nomemo" comment are left alone. Every decision is recorded in self.report.
+class Memoizer:
+    def __init__(self, size=1024):
+        self.size = size
+        self.report = []
+
+    def program(self, tree):
+        places = dict(self.functions(tree.body, None))
+        functions = list(places)
+        definitions = {}
+        for function in functions:
+            definitions[function.name] = definitions.get(function.name, 0) + 1
+        rebound = reboundNames(tree.body)
+        # Functions that every call by name is sure to reach.
+        stable = {name for name, count in definitions.items() if count == 1 and name not in rebound}
+
+        reasons = {}
+        reads = {}
+        for function in functions:
+            own = set(function.params) | assignedNames(function.body)
+            reads[function] = statementReadNames(function.body) - own
+            reason = self.effect(function.body)
+            if reason is None:
+                for name in sorted(calledNames(function.body) & own):
+                    reason = f"calls its local {name}"
+                    break
+            if reason is None:
+                for name in sorted(reads[function]):
+                    if name not in stable:
+                        reason = f"reads global {name}"
+                        break
+            if reason is not None:
+                reasons[function] = reason
+
+        # Called functions that are not pure make their callers impure too, until nothing changes.
+        impure = {function.name for function in reasons}
+        changed = True
+        while changed:
+            changed = False
+            for function in functions:
+                if function in reasons:
+                    continue
+                for name in sorted(reads[function]):
+                    if name in impure:
+                        reasons[function] = f"calls {name}"
+                        impure.add(function.name)
+                        changed = True
+                        break
+
+        for function in functions:
+            if function in reasons:
+                self.report.append(f"line {function.line}: {function.name} is not memoized, it {reasons[function]}")
+            elif places[function] is not None:
+                self.report.append(f"line {function.line}: {function.name} is pure but not memoized, it is defined {places[function]}")
+            elif function.memo is False:
+                self.report.append(f"line {function.line}: {function.name} is pure but marked @nomemo")
+            else:
+                function.memo = self.size
+                self.report.append(f"line {function.line}: {function.name} is pure, memoized in a table of {self.size}")
+        return tree
+
+    # All function definitions, including ones nested in blocks and other functions, each with where it is
+    # when its FUNC can run more than once, or None.
+    def functions(self, body, place):
+        for node in body:
+            kind = type(node)
+            if kind is Func:
+                yield node, place
+                yield from self.functions(node.body, "inside a function")
+            elif kind is If:
+                yield from self.functions(node.body, place)
+                if node.orelse is not None:
+                    yield from self.functions(node.orelse, place)
+            elif kind is While or kind is ForRange:
+                yield from self.functions(node.body, place or "inside a loop")
+
+    # Why a function body is not pure by itself, or None.
+    def effect(self, body):
+        for node in body:
+            kind = type(node)
+            if kind is Print or kind is PrintString:
+                return "prints"
+            if kind is Input:
+                return "reads input"
+            if kind is Func:
+                return f"defines {node.name}"
+            if kind is If:
+                reason = self.effect(node.body)
+                if reason is None and node.orelse is not None:
+                    reason = self.effect(node.orelse)
+                if reason is not None:
+                    return reason
+            elif kind is While or kind is ForRange:
+                reason = self.effect(node.body)
+                if reason is not None:
+                    return reason
+        return None
+
@@ -0,0 +1,182 @@
+from lex import *
+from compiler import *
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import signal
+import socket
+import statistics
+import sys
+import time
+
+DEFAULT_SOCKET = ".hwserver.sock"
+LINE_LIMIT = 64 * 1024 * 1024   # Longest request line; "text" requests carry a whole program.
+
+# CompileServer keeps the compiler loaded and answers compile requests, one JSON object per line.
+#
+#   {"id": 1, "source": "/abs/path/prog.hw", "output": "/abs/path/out.py", "optimize": false}
+#   {"id": 2, "text": "PRINT 1\n"}
+#   {"command": "stats"}    {"command": "shutdown"}
+#
+# Every response is one JSON line with "id", "ok", "latencyMs", and "output", "code" or "error".
+# Without "output" the generated code is returned in "code" instead of being written.
+# Clients connect over a Unix socket and are served concurrently; compiles run in a thread pool so
+# one long compile does not hold up the event loop. With --stdio a single client talks over stdin/stdout.
+class CompileServer:
+    def __init__(self, workers=None):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.stopping = None
+        self.requests = 0
+        self.failures = 0
+        self.totalMs = 0.0
+        self.recentMs = collections.deque(maxlen=1024)  # Latencies of the last requests, for percentiles.
+
+    # Compile one request. Runs in a worker thread.
+    def compile(self, request):
+        output = request.get("output")
+        options = CompileOptions(optimize=bool(request.get("optimize")), output=output or None)
+        try:
+            if "text" in request:
+                result = compileSource(request["text"], options)
+            elif "source" in request:
+                with open(request["source"], 'r') as inputFile:
+                    result = compileSource(Lexer.fromStream(inputFile), options)
+            else:
+                return {"ok": False, "error": "Request needs a \"source\" or a \"text\"."}
+            if output and result.ok:
+                copyRuntime(os.path.dirname(output))
+        except Exception as error:
+            return {"ok": False, "error": f"{type(error).__name__}: {error}"}
+        if not result.ok:
+            return {"ok": False, "error": str(CompileError(result.diagnostics)),
+                    "diagnostics": [{"line": diagnostic.line, "column": diagnostic.column, "message": diagnostic.message}
+                                    for diagnostic in result.diagnostics]}
+        if output:
+            return {"ok": True, "output": output}
+        return {"ok": True, "code": result.code}
+
+    async def handle(self, request):
+        start = time.perf_counter()
+        command = request.get("command", "compile")
+        if command == "compile":
+            response = await asyncio.get_running_loop().run_in_executor(self.executor, self.compile, request)
+        elif command == "stats":
+            response = self.stats()
+        elif command == "shutdown":
+            self.stopping.set()
+            response = {"ok": True}
+        else:
+            response = {"ok": False, "error": "Unknown command " + str(command)}
+        latency = (time.perf_counter() - start) * 1000
+        if command == "compile":
+            self.requests += 1
+            self.failures += not response["ok"]
+            self.totalMs += latency
+            self.recentMs.append(latency)
+            print(f"[server] {request.get('source', '<text>')}: {'ok' if response['ok'] else 'error'} in {latency:.2f} ms", file=sys.stderr)
+        response["id"] = request.get("id")
+        response["latencyMs"] = round(latency, 3)
+        return response
+
+    def stats(self):
+        result = {"ok": True, "requests": self.requests, "failures": self.failures,
+                  "meanMs": round(self.totalMs / self.requests, 3) if self.requests else 0.0}
+        if self.recentMs:
+            recent = sorted(self.recentMs)
+            result["p50Ms"] = round(statistics.median(recent), 3)
+            result["p95Ms"] = round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3)
+            result["maxMs"] = round(recent[-1], 3)
+        return result
+
+    # Answer the requests of one client in order until it disconnects or the server shuts down.
+    async def serveConnection(self, reader, write):
+        while not self.stopping.is_set():
+            try:
+                line = await reader.readline()
+            except ValueError:          # Line longer than LINE_LIMIT.
+                await write({"ok": False, "error": "Request too long."})
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as error:
+                response = {"ok": False, "error": "Bad request: " + str(error)}
+            else:
+                response = await self.handle(request)
+            await write(response)
+
+    async def clientConnected(self, reader, writer):
+        async def write(response):
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+        try:
+            await self.serveConnection(reader, write)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serveSocket(self, path):
+        self.stopping = asyncio.Event()
+        if os.path.exists(path):
+            if serverRunning(path):
+                sys.exit(f"A compile server is already listening on {path}.")
+            os.remove(path)     # Left behind by a server that did not shut down cleanly.
+        server = await asyncio.start_unix_server(self.clientConnected, path, limit=LINE_LIMIT)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.stopping.set)
+        print(f"[server] Listening on {path}", file=sys.stderr)
+        try:
+            async with server:
+                await self.stopping.wait()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def serveStdio(self):
+        self.stopping = asyncio.Event()
+        output = sys.stdout.buffer
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=LINE_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        async def write(response):
+            output.write((json.dumps(response) + "\n").encode())
+            output.flush()
+        await self.serveConnection(reader, write)
+
+# Check whether a server answers on the socket at path.
+def serverRunning(path):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(path)
+        return True
+    except OSError:
+        return False
+
+def main():
+    argParser = argparse.ArgumentParser(description="Keep the HelloWorld compiler loaded and serve compile requests.")
+    argParser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket to listen on (default: {DEFAULT_SOCKET})")
+    argParser.add_argument("--stdio", action="store_true", help="serve one client over stdin/stdout instead of a socket")
+    argParser.add_argument("-j", dest="workers", type=int, default=None, help="number of compile threads")
+    arguments = argParser.parse_args()
+
+    server = CompileServer(arguments.workers)
+    try:
+        if arguments.stdio:
+            asyncio.run(server.serveStdio())
+        else:
+            asyncio.run(server.serveSocket(arguments.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
+
+if __name__ == '__main__':
+    main()
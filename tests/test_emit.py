@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from compiler import *
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "out.py")
+        with open(self.path, 'w') as outputFile:
+            outputFile.write("previous\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compile(self, source, optimize=False):
+        return compileSource(source, CompileOptions(optimize=optimize, output=self.path))
+
+    def testWriteFileReplacesOutput(self):
+        for optimize in (False, True):
+            self.assertTrue(self.compile("PRINT 1\nPRINT 2\n", optimize).ok)
+            with open(self.path, 'r') as outputFile:
+                self.assertIn("hwPrint(2)", outputFile.read())
+            self.assertEqual(os.listdir(self.directory), ["out.py"])
+
+    # Statements before the error were already flushed; they must not reach out.py.
+    def testErrorKeepsPreviousOutput(self):
+        self.assertFalse(self.compile("PRINT 1\nPRINT 2\nPRINT 3\nPRINT @\n").ok)
+        with open(self.path, 'r') as outputFile:
+            self.assertEqual(outputFile.read(), "previous\n")
+        self.assertEqual(os.listdir(self.directory), ["out.py"])
+
+
+if __name__ == '__main__':
+    unittest.main()
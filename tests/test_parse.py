@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from compiler import *
+
+
+# Compile a program on the direct path and on the tree path (-O), returning both results.
+def compileBoth(source):
+    return compileSource(source), compileSource(source, CompileOptions(optimize=True))
+
+
+class ParenthesesTest(unittest.TestCase):
+    # After an operator a parenthesis is primary's "(" expression ")": it holds no AND and must be closed.
+    def testParenthesisAfterOperatorMustClose(self):
+        source = "LET a = 1\nLET b = 0\nIF a > b / ( 1 + a AND a > 0 THEN\nPRINT 1\nENDIF\n"
+        for result in compileBoth(source):
+            self.assertFalse(result.ok)
+            self.assertEqual(result.diagnostics[0].line, 3)
+
+    def testParenthesisAfterSignMustClose(self):
+        source = "LET a = 1\nIF -( a > 0 THEN\nPRINT 1\nENDIF\n"
+        for result in compileBoth(source):
+            self.assertFalse(result.ok)
+
+    # A parenthesis that starts a boolean factor may still be left open, as in BooleanFactor.
+    def testLeadingParenthesisMayStayOpen(self):
+        source = "LET a = 1\nLET b = 0\nIF (a > b AND (a > 0 THEN\nPRINT 1\nENDIF\n"
+        for result in compileBoth(source):
+            self.assertTrue(result.ok)
+
+    def testClosedParentheses(self):
+        source = "LET a = 1\nLET b = 0\nIF NOT (a AND 2) == 2 OR b > -(a + 1) * (2) THEN\nPRINT 1\nENDIF\n"
+        for result in compileBoth(source):
+            self.assertTrue(result.ok)
+
+
+if __name__ == '__main__':
+    unittest.main()
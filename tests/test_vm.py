@@ -0,0 +1,40 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from compiler import *
+
+
+# Run a program on the register VM and return what it printed.
+def runVM(source):
+    main = compileSource(source, CompileOptions(vm=True)).vmFunction
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        VirtualMachine().execute(main)
+    return output.getvalue()
+
+
+class ClosureTest(unittest.TestCase):
+    # A FUNC inside a FUNC reads the locals of the call it was created in, as the values are when it runs.
+    def testNestedFunctionReadsEnclosingLocal(self):
+        source = ("LET a = 0\nLET r = 0\nFUNC outer()\nLET a = 5\nFUNC inner()\nPRINT a\nENDFUNC\n"
+                  "LET r = inner()\nLET a = 6\nLET r = inner()\nENDFUNC\nLET r = outer()\n")
+        self.assertEqual(runVM(source), "5\n6\n")
+
+    def testClosureOverTwoLevels(self):
+        source = ("LET k = 0\nLET m = 0\nLET r = 0\nFUNC mk(k)\nFUNC mid()\nFUNC deep(m)\nRETURN m + k\nENDFUNC\n"
+                  "PRINT deep(1)\nENDFUNC\nLET r = mid()\nENDFUNC\nLET r = mk(4)\nLET r = mk(10)\n")
+        self.assertEqual(runVM(source), "5\n11\n")
+
+    def testFreeVariableReadBeforeAssignment(self):
+        source = ("LET b = 0\nLET r = 0\nFUNC early()\nFUNC peek()\nPRINT b\nENDFUNC\n"
+                  "LET r = peek()\nLET b = 1\nENDFUNC\nLET r = early()\n")
+        with self.assertRaisesRegex(NameError, "free variable 'b'"):
+            runVM(source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,415 @@
+from lex import *
+from parse import *
+from nodes import *
+from codegen import PRECEDENCE, NOT_PRECEDENCE, COMPARE_PRECEDENCE, UNARY_PRECEDENCE
+
+# TreeParser checks the program against the same grammar as Parser, but builds a syntax tree
+# instead of emitting code. CodeGenerator turns the tree into Python.
+class TreeParser(Parser):
+    def __init__(self, lexer, recursive=False):
+        super().__init__(lexer, None, recursive)
+
+    # Production rules.
+    # program ::= {statement}
+    def program(self):
+        body = []
+
+        # Since some newlines are required in our grammar, need to skip the excess.
+        while self.checkToken(TokenType.NEWLINE):
+            self.nextToken()
+
+        # Parse all the statements in the program.
+        while not self.checkToken(TokenType.EOF):
+            self.blockStatement(body)
+        self.checkDiagnostics()
+        return Program(body)
+
+    # Parse one statement into body. Statements with errors are recorded and left out.
+    def blockStatement(self, body):
+        node = self.statementWithRecovery()
+        if node is not None:
+            body.append(node)
+
+    # One of the following statements...
+    def statement(self):
+        line = self.curToken.line
+
+        # "PRINT" (expression | string)
+        if self.checkToken(TokenType.PRINT):
+            self.nextToken()
+
+            if self.checkToken(TokenType.STRING):
+                node = PrintString(self.curToken.text, line=line)
+                self.nextToken()
+            else:
+                node = Print(self.expression(), line=line)
+
+        # "IF" comparison {Boolean} "THEN" nl {statement} ["ELSE" nl {statement}] "ENDIF" nl
+        elif self.checkToken(TokenType.IF):
+            self.nextToken()
+            condition = self.condition()
+            self.match(TokenType.THEN)
+            self.nl()
+
+            # Zero or more statements in the "if" body.
+            body = []
+            while not (self.checkToken(TokenType.ELSE) or self.checkToken(TokenType.ENDIF) or self.checkToken(TokenType.EOF)):
+                self.blockStatement(body)
+
+            # Handle optional "else" block.
+            orelse = None
+            if self.checkToken(TokenType.ELSE):
+                self.nextToken()
+                self.nl()
+
+                # Zero or more statements in the "else" body.
+                orelse = []
+                while not (self.checkToken(TokenType.ENDIF) or self.checkToken(TokenType.EOF)):
+                    self.blockStatement(orelse)
+
+            self.match(TokenType.ENDIF)
+            node = If(condition, body, orelse, line=line)
+
+        # "WHILE" comparison {boolean} "REPEAT" {statement} "ENDWHILE"
+        elif self.checkToken(TokenType.WHILE):
+            self.nextToken()
+            condition = self.condition()
+            self.match(TokenType.REPEAT)
+            self.nl()
+
+            # Zero or more statements in the loop body.
+            body = []
+            while not (self.checkToken(TokenType.ENDWHILE) or self.checkToken(TokenType.EOF)):
+                self.blockStatement(body)
+
+            self.match(TokenType.ENDWHILE)
+            node = While(condition, body, line=line)
+
+        # "FUNC" ident "(" [ident {"," ident}] ")" nl {statement} "ENDFUNC"
+        elif self.checkToken(TokenType.FUNC):
+            self.inFunction = True
+            self.nextToken()
+            functionName = self.curToken.text
+            if functionName not in self.symbols:
+                self.symbols.add(functionName)
+            self.functions.add(functionName)
+
+            self.match(TokenType.IDENT)
+            self.match(TokenType.LPARE)
+            params = []
+            if self.checkToken(TokenType.IDENT):
+                params.append(self.curToken.text)
+                self.nextToken()
+
+                # Handle additional parameters.
+                while self.checkToken(TokenType.COMMA):
+                    self.nextToken()  # Skip the comma.
+                    params.append(self.curToken.text)
+                    self.match(TokenType.IDENT)
+
+            self.match(TokenType.RPARE)
+            # "# @nomemo" after the parameters keeps the function out of --memo.
+            memo = False if '@nomemo' in self.lexer.annotations.get(self.curToken.start, '') else None
+            self.nl()
+
+            # Parse function body, which can be zero or more statements.
+            body = []
+            while not (self.checkToken(TokenType.ENDFUNC) or self.checkToken(TokenType.EOF)):
+                self.blockStatement(body)
+
+            self.match(TokenType.ENDFUNC)
+            self.inFunction = False
+            node = Func(functionName, params, body, memo, line=line)
+
+        # "LET" ident = expression
+        elif self.checkToken(TokenType.LET):
+            self.nextToken()
+
+            #  Check if ident exists in symbol table. If not, declare it.
+            name = self.curToken.text
+            if name not in self.symbols:
+                self.symbols.add(name)
+
+            self.match(TokenType.IDENT)
+            self.match(TokenType.EQ)
+            node = Let(name, self.expression(), line=line)
+
+        # "INPUT" ident
+        elif self.checkToken(TokenType.INPUT):
+            self.nextToken()
+
+            # If variable doesn't already exist, declare it.
+            name = self.curToken.text
+            if name not in self.symbols:
+                self.symbols.add(name)
+
+            self.match(TokenType.IDENT)
+            node = Input(name, line=line)
+
+        # "RETURN" expression
+        elif self.checkToken(TokenType.RETURN):
+            if self.inFunction == True:
+                self.nextToken()
+                node = Return(self.expression(), line=line)
+            else: # error handling
+                self.abort("Return statement not in function")
+
+        elif self.checkToken(TokenType.AND) or self.checkToken(TokenType.OR) or self.checkToken(TokenType.NOT):
+            node = Condition(self.boolean(), line=line)
+
+        # This is not a valid statement. Error!
+        else:
+            self.abort("Invalid statement at " + self.curToken.text + " (" + self.curToken.kind.name + ")")
+
+        # Newline.
+        self.nl()
+        return node
+
+    # The condition of an IF or WHILE.
+    def condition(self):
+        if self.isComparisonOperator():
+            return self.comparison()
+        return self.boolean()
+
+    # Boolean ::= BooleanExpr
+    def boolean(self):
+        return self.BooleanExpr()
+
+    # BooleanExpr ::= BooleanTerm { "OR" BooleanTerm }
+    def BooleanExpr(self):
+        node = self.BooleanTerm()
+        while self.checkToken(TokenType.OR):
+            self.nextToken()
+            node = BoolOp("or", node, self.BooleanTerm())
+        return node
+
+    # BooleanTerm ::= BooleanFactor { "AND" BooleanFactor }
+    def BooleanTerm(self):
+        node = self.BooleanFactor()
+        while self.checkToken(TokenType.AND):
+            self.nextToken()
+            node = BoolOp("and", node, self.BooleanFactor())
+        return node
+
+    # BooleanFactor ::= "NOT" BooleanFactor | comparison | "(" BooleanExpr ")"
+    def BooleanFactor(self):
+        if self.checkToken(TokenType.NOT):
+            self.nextToken()
+            return Not(self.BooleanFactor())
+        elif self.checkToken(TokenType.LPARE):
+            self.nextToken()
+            node = self.BooleanExpr()
+            self.checkToken(TokenType.RPARE)
+            return node
+        else:
+            return self.comparison()
+
+    # comparison ::= expression (("==" | "!=" | ">" | ">=" | "<" | "<=") expression)+
+    def comparison(self):
+        node = self.expression()
+        ops = []
+        comparators = []
+        # Can have 0 or more comparison operator and expressions.
+        while self.isComparisonOperator():
+            ops.append(self.curToken.text)
+            self.nextToken()
+            comparators.append(self.expression())
+        if ops:
+            node = Compare(node, ops, comparators)
+        return node
+
+    # expression ::= term {( "-" | "+" ) term}
+    def expression(self):
+        node = self.term()
+        # Can have 0 or more +/- and expressions.
+        while self.checkToken(TokenType.PLUS) or self.checkToken(TokenType.MINUS):
+            op = self.curToken.text
+            self.nextToken()
+            node = BinOp(op, node, self.term())
+        return node
+
+    # term ::= unary {( "/" | "*" ) unary}
+    def term(self):
+        node = self.unary()
+        # Can have 0 or more *// and expressions.
+        while self.checkToken(TokenType.ASTERISK) or self.checkToken(TokenType.SLASH):
+            op = self.curToken.text
+            self.nextToken()
+            node = BinOp(op, node, self.unary())
+        return node
+
+    # unary ::= ["+" | "-"] primary
+    def unary(self):
+        # Optional unary +/-
+        if self.checkToken(TokenType.PLUS) or self.checkToken(TokenType.MINUS):
+            op = self.curToken.text
+            self.nextToken()
+            return Unary(op, self.primary())
+        return self.primary()
+
+    # primary ::= number | ident | function_call
+    def primary(self):
+        if self.checkToken(TokenType.NUMBER):
+            node = Number(self.curToken.text)
+            self.nextToken()
+            return node
+        elif self.checkToken(TokenType.IDENT):
+            # Ensure the variable already exists and check the identifier is var or functionName
+            identName = self.curToken.text
+            if identName not in self.symbols:
+                self.abort("Referencing variable before assignment: " + identName)
+            self.nextToken()
+
+            if self.checkToken(TokenType.LPARE):
+                self.nextToken()
+                args = []
+                if self.checkToken(TokenType.IDENT) or self.checkToken(TokenType.NUMBER):
+                    args.append(self.expression())
+                    while self.checkToken(TokenType.COMMA):
+                        self.nextToken()  # Skip comma
+                        args.append(self.expression())  # Parse the next argument
+
+                self.match(TokenType.RPARE)
+                return Call(identName, args)
+            return Name(identName)
+
+        else:
+            # Error!
+            self.abort("Unexpected token at " + self.curToken.text)
+
+    # The operator precedence engine of Parser, building the tree by shunting-yard: finished operands wait on
+    # one stack and operators on another until an operator that binds no tighter arrives. Open parentheses
+    # and calls put a marker that binds looser than everything on the operator stack, so nothing is reduced
+    # past them before they close.
+    def operatorExpression(self, level):
+        groups = []     # Open parentheses and calls, innermost last: (call name or None, level outside it, first operand).
+        operands = []
+        operators = []  # (precedence, node class, op). Compare collects the ops of a chain: a < b < c.
+        allowNot = level == BOOLEAN_LEVEL
+        while True:
+            # An operand: {"NOT"} ["+" | "-"] (number | ident | function_call | "(" ...).
+            token = self.curToken
+            if allowNot:
+                while token.kind is TokenType.NOT:
+                    operators.append(NOT_OPERATOR)
+                    self.nextToken()
+                    token = self.curToken
+            signed = token.kind is TokenType.PLUS or token.kind is TokenType.MINUS
+            if signed:
+                operators.append((UNARY_PRECEDENCE, Unary, token.text))
+                self.nextToken()
+                token = self.curToken
+            if token.kind is TokenType.NUMBER:
+                operands.append(Number(token.text))
+                self.nextToken()
+            elif token.kind is TokenType.IDENT:
+                # Ensure the variable already exists and check the identifier is var or functionName
+                identName = token.text
+                if identName not in self.symbols:
+                    self.abort("Referencing variable before assignment: " + identName)
+                self.nextToken()
+                if self.checkToken(TokenType.LPARE):
+                    self.nextToken()
+                    if self.checkToken(TokenType.IDENT) or self.checkToken(TokenType.NUMBER):
+                        groups.append((identName, level, len(operands)))
+                        operators.append(GROUP_MARKER)
+                        level = ARITHMETIC_LEVEL
+                        allowNot = False
+                        continue
+                    self.match(TokenType.RPARE)
+                    operands.append(Call(identName, []))
+                else:
+                    operands.append(Name(identName))
+            elif token.kind is TokenType.LPARE:
+                self.nextToken()
+                groups.append((None, level, len(operands)))
+                operators.append(GROUP_MARKER)
+                # Only a parenthesis that starts a boolean factor is at the boolean level, see Parser.
+                if not allowNot or signed:
+                    level = ARITHMETIC_LEVEL
+                allowNot = level == BOOLEAN_LEVEL
+                continue
+            else:
+                # Error!
+                self.abort("Unexpected token at " + token.text)
+
+            # After an operand: an operator, the end of a group or call, or the end of the expression.
+            while True:
+                token = self.curToken
+                kind = token.kind
+                if kind is TokenType.PLUS or kind is TokenType.MINUS or kind is TokenType.ASTERISK or kind is TokenType.SLASH:
+                    op = token.text
+                    precedence = PRECEDENCE[op]
+                    # Left associative: a - b + c is (a - b) + c. Arithmetic reduces inline, the rest in reduce().
+                    while operators and operators[-1][0] >= precedence:
+                        if operators[-1][1] is not BinOp:
+                            self.reduce(operands, operators, precedence)
+                            break
+                        right = operands.pop()
+                        operands[-1] = BinOp(operators.pop()[2], operands[-1], right)
+                    operators.append((precedence, BinOp, op))
+                    allowNot = False
+                elif level != ARITHMETIC_LEVEL and kind in COMPARISON_OPERATORS:
+                    if operators and operators[-1][0] > COMPARE_PRECEDENCE:
+                        self.reduce(operands, operators, COMPARE_PRECEDENCE + 1)
+                    if operators and operators[-1][1] is Compare:
+                        operators[-1][2].append(token.text)
+                    else:
+                        operators.append((COMPARE_PRECEDENCE, Compare, [token.text]))
+                    allowNot = False
+                elif (kind is TokenType.AND or kind is TokenType.OR) and level == BOOLEAN_LEVEL:
+                    op = "and" if kind is TokenType.AND else "or"
+                    self.reduce(operands, operators, PRECEDENCE[op])
+                    operators.append((PRECEDENCE[op], BoolOp, op))
+                    allowNot = True
+                elif kind is TokenType.RPARE and groups:
+                    self.nextToken()
+                    level = self.closeGroup(groups, operands, operators)
+                    continue
+                elif kind is TokenType.COMMA and groups and groups[-1][0] is not None:
+                    self.reduce(operands, operators, 0)
+                    allowNot = False
+                elif groups and level != BOOLEAN_LEVEL:
+                    self.match(TokenType.RPARE)     # An unclosed call or parenthesis: error.
+                else:
+                    # The end of the expression. Whatever is still open is parentheses at the boolean level,
+                    # so reducing past their markers closes them.
+                    self.reduce(operands, operators, GROUP_MARKER[0])
+                    return operands.pop()
+                self.nextToken()
+                break
+
+    # Finish the innermost parentheses or call and return the level outside it. The node inside parentheses
+    # stays on the operand stack; the parentheses leave no trace in the tree.
+    def closeGroup(self, groups, operands, operators):
+        name, level, start = groups.pop()
+        if operators[-1] is not GROUP_MARKER:
+            self.reduce(operands, operators, 0)
+        operators.pop()
+        if name is not None:
+            args = operands[start:]
+            del operands[start:]
+            operands.append(Call(name, args))
+        return level
+
+    # Apply the waiting operators that bind at least as tightly as minimum.
+    def reduce(self, operands, operators, minimum):
+        while operators and operators[-1][0] >= minimum:
+            _, kind, op = operators.pop()
+            if kind is BinOp or kind is BoolOp:
+                right = operands.pop()
+                operands[-1] = kind(op, operands[-1], right)
+            elif kind is Unary:
+                operands[-1] = Unary(op, operands[-1])
+            elif kind is Not:
+                operands[-1] = Not(operands[-1])
+            elif kind is Compare:
+                start = len(operands) - len(op) - 1
+                node = Compare(operands[start], op, operands[start + 1:])
+                del operands[start:]
+                operands.append(node)
+
+
+# Operator stack entries for an open parenthesis or call, and for "NOT".
+GROUP_MARKER = (-1, None, None)
+NOT_OPERATOR = (NOT_PRECEDENCE, Not, None)
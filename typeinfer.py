@@ -0,0 +1,381 @@
+from nodes import *
+from optimize import constantValue, isSafe, isInteger, assignedNames, readNames
+from codegen import expressionText
+
+# Types of values, from the most to the least specific. None is the bottom: nothing assigned yet.
+INT = "int"
+FLOAT = "float"
+NUMBER = "number"       # An int on some paths and a float on others.
+UNKNOWN = "unknown"     # Anything else: a function, or the None of a function that ended without RETURN.
+
+# Least upper bound of two types.
+def join(first, second):
+    if first is None or first == second:
+        return second
+    if second is None:
+        return first
+    if first == UNKNOWN or second == UNKNOWN:
+        return UNKNOWN
+    return NUMBER
+
+# Type of left op right. "/" is true division, so it always gives a float.
+def arithmeticType(op, left, right):
+    if left is None or right is None:
+        return None
+    if left == UNKNOWN or right == UNKNOWN:
+        return UNKNOWN
+    if op == '/' or left == FLOAT or right == FLOAT:
+        return FLOAT
+    if left == INT and right == INT:
+        return INT
+    return NUMBER
+
+# True if a function body ends in RETURN on every path.
+def alwaysReturns(body):
+    if not body:
+        return False
+    last = body[-1]
+    if type(last) is Return:
+        return True
+    if type(last) is If:
+        return last.orelse is not None and alwaysReturns(last.body) and alwaysReturns(last.orelse)
+    return False
+
+def isFloat(node, value):
+    constant = constantValue(node)
+    return type(constant) is float and constant == value
+
+
+# One Python scope: the program's globals, or the locals of one function.
+class Scope:
+    def __init__(self, body, parent=None, params=()):
+        self.parent = parent
+        self.names = assignedNames(body) | set(params)
+        self.types = {}         # Name -> type, joined over every assignment.
+        self.sources = {}       # Name -> {INT or FLOAT: line of the first assignment of that type}.
+        self.returns = None     # Type of the values the function returns.
+
+    # The scope a name read here refers to, as Python resolves it, or None.
+    def lookup(self, name):
+        scope = self
+        while scope is not None and name not in scope.names:
+            scope = scope.parent
+        return scope
+
+
+# TypeInference works out which variables, parameters and function results are always integers or always
+# floats. Types are joined over every assignment in a scope (LET, INPUT, the arguments of every call for
+# parameters, which are unknown once the function is read as a value) and iterated to a fixed point,
+# since calls make them depend on each other. It then:
+# - turns counting loops, WHILE i < n ... LET i = i + 1 ENDWHILE with i and n integers, into ForRange,
+#   a Python for loop over range(), which does the comparison and the increment in C;
+# - drops arithmetic that cannot change a value of the known type: x * 1 and x - 0 for numbers, x - 0.0,
+#   x * 1.0, x / 1 for floats, x + 0 for integers, and x * 0 for integers, which gives 0.
+# The rewrites are recorded in self.report. Values whose behavior depends on the path that ran, like a
+# variable holding an integer or a float (PRINT shows 3 or 3.0), or a function that can end without RETURN,
+# are recorded in self.warnings.
+class TypeInference:
+    def __init__(self, symbols=()):
+        self.symbols = set(symbols)     # Program variables and functions (Parser.symbols).
+        self.report = []
+        self.warnings = []
+
+    def program(self, tree):
+        self.globals = Scope(tree.body)
+        self.scopes = {}        # Func node -> Scope.
+        self.definitions = {}   # Function name -> [Func node, ...]; a name can be defined more than once.
+        self.collect(tree.body, self.globals)
+        while True:
+            self.changed = False
+            self.infer(tree.body, self.globals)
+            if not self.changed:
+                break
+        self.warn(tree)
+        tree.body = self.specialize(tree.body, self.globals, set())
+        return tree
+
+    # Create the scope of every function, nested ones included.
+    def collect(self, body, scope):
+        for node in body:
+            kind = type(node)
+            if kind is Func:
+                self.scopes[node] = Scope(node.body, scope, node.params)
+                self.definitions.setdefault(node.name, []).append(node)
+                self.collect(node.body, self.scopes[node])
+            elif kind is If:
+                self.collect(node.body, scope)
+                if node.orelse is not None:
+                    self.collect(node.orelse, scope)
+            elif kind is While:
+                self.collect(node.body, scope)
+
+    def assign(self, scope, name, valueType, line):
+        old = scope.types.get(name)
+        new = join(old, valueType)
+        if new != old:
+            scope.types[name] = new
+            self.changed = True
+        if valueType == INT or valueType == FLOAT:
+            scope.sources.setdefault(name, {}).setdefault(valueType, line)
+
+    # One pass over a block, joining the types of what it assigns.
+    def infer(self, body, scope):
+        for node in body:
+            kind = type(node)
+            if kind is Let:
+                self.assign(scope, node.name, self.typeOf(node.value, scope, node.line), node.line)
+            elif kind is Input:
+                self.assign(scope, node.name, INT, node.line)
+            elif kind is Print:
+                self.typeOf(node.value, scope, node.line)
+            elif kind is Return:
+                returns = join(scope.returns, self.typeOf(node.value, scope, node.line))
+                if returns != scope.returns:
+                    scope.returns = returns
+                    self.changed = True
+            elif kind is If:
+                self.typeOf(node.condition, scope, node.line)
+                self.infer(node.body, scope)
+                if node.orelse is not None:
+                    self.infer(node.orelse, scope)
+            elif kind is While:
+                self.typeOf(node.condition, scope, node.line)
+                self.infer(node.body, scope)
+            elif kind is Condition:
+                self.typeOf(node.condition, scope, node.line)
+            elif kind is Func:
+                self.assign(scope, node.name, UNKNOWN, node.line)
+                functionScope = self.scopes[node]
+                self.infer(node.body, functionScope)
+                if not alwaysReturns(node.body) and functionScope.returns != UNKNOWN:
+                    functionScope.returns = UNKNOWN
+                    self.changed = True
+
+    # The type of an expression. Calls also pass their argument types on to the parameters.
+    def typeOf(self, node, scope, line):
+        kind = type(node)
+        if kind is Number:
+            return FLOAT if type(constantValue(node)) is float else INT
+        if kind is Name:
+            # A function read as a value can be called under any other name, with arguments of any type.
+            for function in self.definitions.get(node.name, ()):
+                functionScope = self.scopes[function]
+                for param in function.params:
+                    self.assign(functionScope, param, UNKNOWN, line)
+            owner = scope.lookup(node.name)
+            return owner.types.get(node.name) if owner is not None else None
+        if kind is Call:
+            argTypes = [self.typeOf(arg, scope, line) for arg in node.args]
+            if node.name not in self.definitions:
+                return UNKNOWN
+            returns = None
+            for function in self.definitions[node.name]:
+                functionScope = self.scopes[function]
+                for param, argType in zip(function.params, argTypes):
+                    self.assign(functionScope, param, argType, line)
+                returns = join(returns, functionScope.returns)
+            return returns
+        if kind is BinOp:
+            return arithmeticType(node.op, self.typeOf(node.left, scope, line), self.typeOf(node.right, scope, line))
+        if kind is Unary:
+            return self.typeOf(node.operand, scope, line)
+        # x and y is one of its operands, not a bool, so it is only an integer if both are.
+        if kind is BoolOp:
+            left = self.typeOf(node.left, scope, line)
+            right = self.typeOf(node.right, scope, line)
+            if left is None or right is None:
+                return None
+            return INT if left == INT and right == INT else UNKNOWN
+        # Comparisons and NOT give a bool, which is an integer.
+        if kind is Compare:
+            self.typeOf(node.left, scope, line)
+            for comparator in node.comparators:
+                self.typeOf(comparator, scope, line)
+        elif kind is Not:
+            self.typeOf(node.operand, scope, line)
+        return INT
+
+    # Warnings.
+
+    def warn(self, tree):
+        warnings = []
+        for scope in [self.globals] + list(self.scopes.values()):
+            for name, sources in sorted(scope.sources.items()):
+                if INT in sources and FLOAT in sources:
+                    intLine, floatLine = sources[INT], sources[FLOAT]
+                    warnings.append((max(intLine, floatLine), f"{name} gets an integer at line {intLine} and a float "
+                                     f"at line {floatLine}, so whether it prints as 3 or 3.0 depends on which ran"))
+        for name, functions in sorted(self.definitions.items()):
+            for function in functions:
+                if not alwaysReturns(function.body) and self.isCalled(name, tree.body):
+                    warnings.append((function.line, f"{name} can end without RETURN; a call then gives None, "
+                                     f"and arithmetic on it fails at run time"))
+        for line, message in sorted(warnings):
+            self.warnings.append(f"line {line}: {message}")
+
+    def isCalled(self, name, body):
+        for node in body:
+            kind = type(node)
+            if kind is Let or kind is Print or kind is Return:
+                if self.calls(name, node.value):
+                    return True
+            elif kind is If or kind is While or kind is Condition:
+                if self.calls(name, node.condition):
+                    return True
+            if kind is If or kind is While or kind is Func:
+                if self.isCalled(name, node.body):
+                    return True
+            if kind is If and node.orelse is not None and self.isCalled(name, node.orelse):
+                return True
+        return False
+
+    def calls(self, name, node):
+        kind = type(node)
+        if kind is Call:
+            return node.name == name or any(self.calls(name, arg) for arg in node.args)
+        if kind is BinOp or kind is BoolOp:
+            return self.calls(name, node.left) or self.calls(name, node.right)
+        if kind is Compare:
+            return self.calls(name, node.left) or any(self.calls(name, comparator) for comparator in node.comparators)
+        if kind is Unary or kind is Not:
+            return self.calls(name, node.operand)
+        return False
+
+    # Rewrites.
+
+    # Specialize a block, tracking the names definitely assigned so far, as LoopOptimizer does. Returns the
+    # new list of statements.
+    def specialize(self, body, scope, defined):
+        result = []
+        for node in body:
+            kind = type(node)
+            if kind is Let or kind is Print or kind is Return:
+                node.value = self.simplify(node.value, scope, node.line, defined)
+            elif kind is If:
+                node.condition = self.simplify(node.condition, scope, node.line, defined)
+                node.body = self.specialize(node.body, scope, set(defined))
+                if node.orelse is not None:
+                    node.orelse = self.specialize(node.orelse, scope, set(defined))
+                    defined |= assignedNames(node.body) & assignedNames(node.orelse)
+            elif kind is While:
+                node.condition = self.simplify(node.condition, scope, node.line, defined)
+                loop = self.countingLoop(node, scope)
+                if loop is not None:
+                    node = loop
+                node.body = self.specialize(node.body, scope, set(defined))
+            elif kind is Condition:
+                node.condition = self.simplify(node.condition, scope, node.line, defined)
+            elif kind is Func:
+                # Names of the enclosing scopes assigned before FUNC stay assigned whenever the function runs,
+                # unless a local of the same name hides them.
+                functionScope = self.scopes[node]
+                node.body = self.specialize(node.body, functionScope, (defined - functionScope.names) | set(node.params))
+            if kind is Let or kind is Input or kind is Func:
+                defined.add(node.name)
+            result.append(node)
+        return result
+
+    # WHILE i < n REPEAT ... LET i = i + 1 ENDWHILE becomes ForRange(i, n) when i and n are integers, nothing
+    # else in the loop assigns i or what n reads, and n cannot fail or call anything, so reading it once gives
+    # the same value as reading it every time. i <= n counts up to n + 1; n > i and n >= i work the same.
+    def countingLoop(self, node, scope):
+        condition = node.condition
+        if type(condition) is not Compare or len(condition.ops) != 1 or not node.body:
+            return None
+        op = condition.ops[0]
+        left, right = condition.left, condition.comparators[0]
+        if (op == '<' or op == '<=') and type(left) is Name:
+            name, stop = left.name, right
+        elif (op == '>' or op == '>=') and type(right) is Name:
+            name, stop = right.name, left
+        else:
+            return None
+
+        last = node.body[-1]
+        if type(last) is not Let or last.name != name or not self.isIncrement(last.value, name):
+            return None
+        # The for loop sets name itself on every pass, so the rest of the body must leave it alone.
+        assigned = assignedNames(node.body[:-1])
+        if name in assigned:
+            return None
+        assigned.add(name)
+        stopNames = readNames(stop)
+        if stopNames & assigned or stopNames & set(self.definitions) or not isSafe(stop):
+            return None
+        if self.typeOf(Name(name), scope, node.line) != INT or self.typeOf(stop, scope, node.line) != INT:
+            return None
+        # range must be Python's.
+        if 'range' in self.symbols or scope.lookup('range') is not None:
+            return None
+
+        if op == '<=' or op == '>=':
+            stop = BinOp('+', stop, Number('1'))
+        self.report.append(f"line {node.line}: {name} counts over integers, the WHILE loop runs as a for loop over range()")
+        return ForRange(name, stop, node.body[:-1], line=node.line)
+
+    def isIncrement(self, value, name):
+        if type(value) is not BinOp or value.op != '+':
+            return False
+        if type(value.left) is Name and value.left.name == name:
+            return isInteger(value.right, 1)
+        if type(value.right) is Name and value.right.name == name:
+            return isInteger(value.left, 1)
+        return False
+
+    # Simplify the expression that is the direct child of a statement, reporting it if it changed.
+    def simplify(self, node, scope, line, defined):
+        before = expressionText(node)
+        node = self.expression(node, scope, line, defined)
+        after = expressionText(node)
+        if after != before:
+            self.report.append(f"line {line}: {before} -> {after} (by type)")
+        return node
+
+    def expression(self, node, scope, line, defined):
+        kind = type(node)
+        if kind is BinOp:
+            node.left = left = self.expression(node.left, scope, line, defined)
+            node.right = right = self.expression(node.right, scope, line, defined)
+            op = node.op
+            leftType = self.typeOf(left, scope, line)
+            rightType = self.typeOf(right, scope, line)
+            # Exact for every float, -0.0, infinities and NaN included. x + 0.0 is not: -0.0 + 0.0 is 0.0.
+            if leftType == FLOAT and (op == '-' and isFloat(right, 0.0) or op == '*' and isFloat(right, 1.0)
+                                      or op == '/' and (isFloat(right, 1.0) or isInteger(right, 1))):
+                return left
+            if rightType == FLOAT and op == '*' and isFloat(left, 1.0):
+                return right
+            # x * 1, 1 * x and x - 0 are x for any number, x + 0 and 0 + x only for an integer: -0.0 + 0 is 0.0.
+            # Anything else, like the None of a function that ended without RETURN, must still fail. A call's
+            # type is left out, since the name may be a local that hides the function.
+            if (leftType == INT or leftType == FLOAT) and type(left) is not Call:
+                if (op == '*' and isInteger(right, 1) or op == '-' and isInteger(right, 0)
+                        or op == '+' and leftType == INT and isInteger(right, 0)):
+                    return left
+            if (rightType == INT or rightType == FLOAT) and type(right) is not Call:
+                if op == '*' and isInteger(left, 1) or op == '+' and rightType == INT and isInteger(left, 0):
+                    return right
+            # An integer times 0 is 0, if computing the integer cannot fail or call anything, and every name
+            # it reads is surely assigned, so dropping the read loses no NameError.
+            if op == '*' and leftType == INT and rightType == INT:
+                if isInteger(right, 0) and self.isDroppable(left, defined):
+                    return right
+                if isInteger(left, 0) and self.isDroppable(right, defined):
+                    return left
+        elif kind is Unary or kind is Not:
+            node.operand = self.expression(node.operand, scope, line, defined)
+        elif kind is Compare:
+            node.left = self.expression(node.left, scope, line, defined)
+            node.comparators = [self.expression(comparator, scope, line, defined) for comparator in node.comparators]
+        elif kind is BoolOp:
+            node.left = self.expression(node.left, scope, line, defined)
+            node.right = self.expression(node.right, scope, line, defined)
+        elif kind is Call:
+            node.args = [self.expression(arg, scope, line, defined) for arg in node.args]
+        return node
+
+    # True if an expression can be left out: it cannot fail or call anything, and reads only surely assigned
+    # names.
+    def isDroppable(self, node, defined):
+        names = readNames(node)
+        return isSafe(node) and names <= defined and not names & set(self.definitions)
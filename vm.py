@@ -0,0 +1,613 @@
+import copy
+import operator
+import sys
+from nodes import *
+from optimize import constantValue, assignedNames, statementReadNames
+from hwruntime import hwPrint, hwInput
+import hwruntime
+
+# A register machine that runs HelloWorld programs without generating Python source.
+#
+# VMCompiler turns a syntax tree from TreeParser into one VMFunction for the main program and one for each
+# FUNC. A function's code is a list of instructions, each a tuple (opcode, a, b, c, d). Operands are register
+# numbers unless noted. Every call gets a fresh list of registers, laid out as
+#
+#   [parameters and other locals][temporaries][constants]
+#
+# so variables are read and written by index, never looked up by name. Constants are loaded with the
+# registers, so instructions take them like any other operand. The main program's registers start with the
+# global variables, and functions read globals from there. VirtualMachine.run is the dispatch loop.
+#
+# A FUNC inside another FUNC reads the locals of the calls around it the way a Python closure does: when its
+# FUNC runs, the function is copied with the register lists of those calls, which outlive the calls like
+# Python's cells, and GETFREE reads them.
+#
+# Superinstructions cover the common patterns: INCR for LET x = x + 1, compare-and-branch jumps for the
+# conditions of IF and WHILE, and FORLOOP for an increment followed by the test at the bottom of a WHILE
+# loop, which is also how ForRange loops from TypeInference run.
+
+# r[x] is register x of the running call, g[x] register x of the main program (a global variable).
+MOVE = 0            # r[a] = r[b]
+INCR = 1            # r[a] += b, b a number
+FORLOOP = 2         # r[a] += b, then if r[a] < r[c]: jump to d
+FORLOOPLE = 3       # r[a] += b, then if r[a] <= r[c]: jump to d
+JUMPIFCMP = 4       # if d(r[a], r[b]): jump to c, d a comparison from the operator module
+JUMPIFNOTCMP = 5    # if not d(r[a], r[b]): jump to c
+ADD = 6             # r[a] = r[b] + r[c]
+SUB = 7             # r[a] = r[b] - r[c]
+MUL = 8             # r[a] = r[b] * r[c]
+DIV = 9             # r[a] = r[b] / r[c]
+GETGLOBAL = 10      # r[a] = g[b]
+JUMP = 11           # jump to a
+CALL = 12           # r[a] = r[b](*r[c]), c a tuple of registers
+RETURN = 13         # return r[a]
+PRINT = 14          # hwPrint(r[a])
+INPUT = 15          # r[a] = hwInput()
+NEG = 16            # r[a] = -r[b]
+POS = 17            # r[a] = +r[b]
+NOT = 18            # r[a] = not r[b]
+COMPARE = 19        # r[a] = d(r[b], r[c])
+JUMPIF = 20         # if r[a]: jump to b
+JUMPIFNOT = 21      # if not r[a]: jump to b
+COPY = 22           # r[a] = r[b], failing if r[b] is a variable that was never assigned
+CLOSURE = 23        # r[a] = function r[b], reading free names from the calls around this one and this one
+GETFREE = 24        # r[a] = register c of enclosing call b, failing if it was never assigned
+
+OPCODE_NAMES = ["MOVE", "INCR", "FORLOOP", "FORLOOPLE", "JUMPIFCMP", "JUMPIFNOTCMP", "ADD", "SUB", "MUL", "DIV",
+                "GETGLOBAL", "JUMP", "CALL", "RETURN", "PRINT", "INPUT", "NEG", "POS", "NOT", "COMPARE",
+                "JUMPIF", "JUMPIFNOT", "COPY", "CLOSURE", "GETFREE"]
+
+# Which operands of each opcode are registers, and which are jump targets.
+REGISTER_OPERANDS = {MOVE: (1, 2), INCR: (1,), FORLOOP: (1, 3), FORLOOPLE: (1, 3), JUMPIFCMP: (1, 2),
+                     JUMPIFNOTCMP: (1, 2), ADD: (1, 2, 3), SUB: (1, 2, 3), MUL: (1, 2, 3), DIV: (1, 2, 3),
+                     GETGLOBAL: (1,), JUMP: (), CALL: (1, 2), RETURN: (1,), PRINT: (1,), INPUT: (1,),
+                     NEG: (1, 2), POS: (1, 2), NOT: (1, 2), COMPARE: (1, 2, 3), JUMPIF: (1,), JUMPIFNOT: (1,),
+                     COPY: (1, 2), CLOSURE: (1, 2), GETFREE: (1,)}
+TARGET_OPERAND = {FORLOOP: 4, FORLOOPLE: 4, JUMPIFCMP: 3, JUMPIFNOTCMP: 3, JUMP: 1, JUMPIF: 2, JUMPIFNOT: 2}
+
+ARITHMETIC_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV}
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+               '==': operator.eq, '!=': operator.ne}
+# a > b is b < a for numbers, so a test of the loop variable can be written with it on the left.
+SWAPPED = {operator.gt: operator.lt, operator.ge: operator.le}
+
+
+# One compiled function, or the main program. registers is the initial register list of a call.
+class VMFunction:
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.code = []
+        self.lines = []         # Source line of each instruction.
+        self.registers = []
+        self.memo = None        # Size of the memo table calls go through, for a function picked by the Memoizer.
+        self.closure = ()       # Register lists of the enclosing calls, outermost first, for a nested FUNC.
+
+    # The function as its FUNC statement creates it inside a call, reading free names from closure.
+    def enclosedBy(self, closure):
+        function = copy.copy(self)
+        function.closure = closure
+        return function
+
+    def __repr__(self):
+        return f"<function {self.name}>"
+
+    # A readable listing of the code, one instruction per line.
+    def disassemble(self):
+        lines = [f"{self.name}({', '.join(self.params)}): {len(self.registers)} registers"]
+        for pc, instruction in enumerate(self.code):
+            operands = ", ".join(getattr(operand, '__name__', repr(operand)) for operand in instruction[1:] if operand is not None)
+            lines.append(f"{pc:5}  line {self.lines[pc]:<5} {OPCODE_NAMES[instruction[0]]:13} {operands}")
+        return '\n'.join(lines)
+
+
+# The value of a variable that was never assigned. Python fails when such a name is read; the VM fails when
+# the value is used or copied to another variable, with the same error.
+class Unassigned:
+    __slots__ = ('name', 'isLocal')
+
+    def __init__(self, name, isLocal):
+        self.name = name
+        self.isLocal = isLocal
+
+    # Python's error for a closure reading the variable before the enclosing call assigned it.
+    def failFree(self):
+        raise NameError(f"cannot access free variable '{self.name}' where it is not associated with a value in enclosing scope")
+
+    def fail(self, *args):
+        if self.isLocal:
+            raise UnboundLocalError(f"cannot access local variable '{self.name}' where it is not associated with a value")
+        raise NameError(f"name '{self.name}' is not defined")
+
+    __add__ = __radd__ = __sub__ = __rsub__ = __mul__ = __rmul__ = __truediv__ = __rtruediv__ = fail
+    __neg__ = __pos__ = __bool__ = __lt__ = __le__ = __gt__ = __ge__ = __eq__ = __ne__ = fail
+    __format__ = __call__ = fail
+
+
+# A jump target, bound to an instruction index once the code after it is emitted.
+class Label:
+    __slots__ = ('position',)
+
+    def __init__(self):
+        self.position = None
+
+
+# Compiles a syntax tree to VMFunctions. Names follow Python's rules, as in the generated code: inside a FUNC
+# the parameters and every name it assigns are locals, any other name that is a local of a FUNC around it is
+# read through the closure, and the rest are globals.
+class VMCompiler:
+    def program(self, tree):
+        globalNames = assignedNames(tree.body) | statementReadNames(tree.body)
+        for function, enclosing in self.functionNodes(tree.body, frozenset()):
+            localNames = set(function.params) | assignedNames(function.body)
+            globalNames |= statementReadNames(function.body) - localNames - enclosing
+        self.globalSlots = {}
+        for name in sorted(globalNames):
+            self.globalSlots[name] = len(self.globalSlots)
+        main = VMFunction("<main>", [])
+        self.function(main, self.globalSlots, tree.body, False, [])
+        return main
+
+    # Every function definition, nested ones included, with the locals of the functions around it.
+    def functionNodes(self, body, enclosing):
+        for node in body:
+            kind = type(node)
+            if kind is Func:
+                yield node, enclosing
+                yield from self.functionNodes(node.body, enclosing | set(node.params) | assignedNames(node.body))
+            elif kind is If:
+                yield from self.functionNodes(node.body, enclosing)
+                if node.orelse is not None:
+                    yield from self.functionNodes(node.orelse, enclosing)
+            elif kind is While or kind is ForRange:
+                yield from self.functionNodes(node.body, enclosing)
+
+    # Compile body into function. slots maps the names kept in this function's registers to their numbers;
+    # every name the body assigns is one of them. isLocal tells which error reading one before it is assigned gives.
+    # enclosing holds the slots of the functions around it, outermost first, as the closure will.
+    def function(self, function, slots, body, isLocal, enclosing):
+        outer = self.__dict__.copy()
+        self.slots = slots
+        self.enclosing = enclosing
+        self.code = function.code
+        self.lines = function.lines
+        self.line = 0
+        self.constants = []
+        self.constantIndex = {}
+        self.top = self.maxTop = len(slots)
+        self.labelPosition = -1     # Where the last label was bound; no superinstruction may span it.
+        self.block(body)
+        self.emit(RETURN, self.constant(None))
+
+        # Constants go after the temporaries: operand -1 - k becomes the register of constant k.
+        base = self.maxTop
+        for pc, instruction in enumerate(self.code):
+            instruction = list(instruction)
+            for field in REGISTER_OPERANDS[instruction[0]]:
+                if instruction[field] < 0:
+                    instruction[field] = base - 1 - instruction[field]
+            if instruction[0] == CALL:
+                instruction[3] = tuple(base - 1 - register if register < 0 else register for register in instruction[3])
+            if instruction[0] in TARGET_OPERAND:
+                field = TARGET_OPERAND[instruction[0]]
+                instruction[field] = instruction[field].position
+            self.code[pc] = tuple(instruction)
+        function.registers = [Unassigned(name, isLocal) for name in slots] + [None] * (base - len(slots)) + self.constants
+        self.__dict__.update(outer)
+
+    def emit(self, op, a=None, b=None, c=None, d=None):
+        self.code.append((op, a, b, c, d))
+        self.lines.append(self.line)
+
+    def bind(self, label):
+        label.position = len(self.code)
+        self.labelPosition = label.position
+
+    # The register of a constant. Equal numbers of different types, like 1, 1.0 and True, stay apart.
+    def constant(self, value):
+        key = (type(value), repr(value)) if not isinstance(value, VMFunction) else id(value)
+        index = self.constantIndex.get(key)
+        if index is None:
+            index = self.constantIndex[key] = len(self.constants)
+            self.constants.append(value)
+        return -1 - index
+
+    def temporary(self):
+        register = self.top
+        self.top += 1
+        if self.top > self.maxTop:
+            self.maxTop = self.top
+        return register
+
+    def block(self, body):
+        for node in body:
+            self.line = node.line
+            top = self.top
+            getattr(self, 'statement' + type(node).__name__)(node)
+            self.top = top
+
+    def statementPrintString(self, node):
+        self.emit(PRINT, self.constant(node.text))
+
+    def statementPrint(self, node):
+        self.emit(PRINT, self.expression(node.value))
+
+    def statementIf(self, node):
+        orelse = Label()
+        self.jump(node.condition, orelse, False)
+        self.block(node.body)
+        if node.orelse is not None:
+            end = Label()
+            self.emit(JUMP, end)
+            self.bind(orelse)
+            self.block(node.orelse)
+            self.bind(end)
+        else:
+            self.bind(orelse)
+
+    # The condition is tested before the first pass and then at the bottom of the loop, so a pass costs
+    # one jump, and the test can merge with an increment just before it.
+    def statementWhile(self, node):
+        top = Label()
+        end = Label()
+        self.jump(node.condition, end, False)
+        self.bind(top)
+        self.block(node.body)
+        self.line = node.line
+        self.jump(node.condition, top, True)
+        self.bind(end)
+
+    # The stop value is read once, as range() does. The body does not assign the counter, so counting it up
+    # at the bottom leaves it at stop after the loop, like the WHILE loop the node came from.
+    def statementForRange(self, node):
+        counter = self.name(node.name)
+        stop = self.expression(node.stop, self.temporary())
+        top = Label()
+        end = Label()
+        self.emit(JUMPIFNOTCMP, counter, stop, end, operator.lt)
+        self.bind(top)
+        self.block(node.body)
+        self.line = node.line
+        self.emit(FORLOOP, counter, 1, stop, top)
+        self.bind(end)
+
+    # The function is created when its FUNC statement runs, like a def: loading the compiled function into
+    # the name's register.
+    def statementFunc(self, node):
+        slots = {}
+        for name in node.params:
+            slots.setdefault(name, len(slots))
+        for name in sorted(assignedNames(node.body) - set(node.params)):
+            slots[name] = len(slots)
+        function = VMFunction(node.name, node.params)
+        function.memo = node.memo or None
+        if self.slots is self.globalSlots:
+            self.function(function, slots, node.body, True, [])
+            self.emit(MOVE, self.slots[node.name], self.constant(function))
+        else:
+            # Inside a FUNC: a closure over this call and the ones around it.
+            self.function(function, slots, node.body, True, self.enclosing + [self.slots])
+            self.emit(CLOSURE, self.slots[node.name], self.constant(function))
+
+    def statementLet(self, node):
+        value = node.value
+        if type(value) is BinOp and (value.op == '+' or value.op == '-'):
+            # LET x = x + 1 and LET x = x - 1 change the register in place. x - 0 is left to SUB, since
+            # -0.0 - 0 is -0.0 but -0.0 + 0 is 0.0.
+            left, right = value.left, value.right
+            if type(right) is Name and right.name == node.name and value.op == '+':
+                left, right = right, left
+            step = constantValue(right)
+            if type(left) is Name and left.name == node.name and type(step) in (int, float) and step:
+                register = self.slots[node.name]
+                self.emit(INCR, register, step if value.op == '+' else -step)
+                return
+        self.expression(value, self.slots[node.name])
+
+    def statementInput(self, node):
+        self.emit(INPUT, self.slots[node.name])
+
+    def statementReturn(self, node):
+        self.emit(RETURN, self.expression(node.value))
+
+    def statementCondition(self, node):
+        end = Label()
+        self.jump(node.condition, end, True)
+        self.bind(end)
+
+    # The register holding a name's value: its own, or a temporary loaded from an enclosing call or the globals.
+    def name(self, name, target=None):
+        if name in self.slots:
+            register = self.slots[name]
+            if target is not None:
+                # Even LET x = x, which fails if x was never assigned.
+                self.emit(COPY, target, register)
+                return target
+            return register
+        if target is None:
+            target = self.temporary()
+        for depth in range(len(self.enclosing) - 1, -1, -1):
+            if name in self.enclosing[depth]:
+                self.emit(GETFREE, target, depth, self.enclosing[depth][name])
+                return target
+        self.emit(GETGLOBAL, target, self.globalSlots[name])
+        return target
+
+    # Compile an expression and return the register its value ends up in: target if given, otherwise a
+    # temporary, a variable's own register, or a constant's.
+    def expression(self, node, target=None):
+        kind = type(node)
+        if kind is Number:
+            register = self.constant(constantValue(node))
+            if target is not None:
+                self.emit(MOVE, target, register)
+                return target
+            return register
+        if kind is Name:
+            return self.name(node.name, target)
+
+        top = self.top
+        if kind is BinOp:
+            left = self.expression(node.left)
+            right = self.expression(node.right)
+            self.top = top
+            target = self.temporary() if target is None else target
+            self.emit(ARITHMETIC_OPCODES[node.op], target, left, right)
+        elif kind is Call:
+            function = self.name(node.name)
+            args = tuple(self.expression(arg) for arg in node.args)
+            self.top = top
+            target = self.temporary() if target is None else target
+            self.emit(CALL, target, function, args)
+        elif kind is Unary:
+            operand = self.expression(node.operand)
+            self.top = top
+            target = self.temporary() if target is None else target
+            self.emit(NEG if node.op == '-' else POS, target, operand)
+        elif kind is Not:
+            operand = self.expression(node.operand)
+            self.top = top
+            target = self.temporary() if target is None else target
+            self.emit(NOT, target, operand)
+        elif kind is Compare and len(node.ops) == 1:
+            left = self.expression(node.left)
+            right = self.expression(node.comparators[0])
+            self.top = top
+            target = self.temporary() if target is None else target
+            self.emit(COMPARE, target, left, right, COMPARISONS[node.ops[0]])
+        elif kind is Compare:
+            # A chain gives True or False; each comparator is read once and only if needed.
+            result = self.temporary()
+            false = Label()
+            end = Label()
+            self.jump(node, false, False)
+            self.emit(MOVE, result, self.constant(True))
+            self.emit(JUMP, end)
+            self.bind(false)
+            self.emit(MOVE, result, self.constant(False))
+            self.bind(end)
+            self.top = top
+            target = self.temporary() if target is None else target
+            if target != result:
+                self.emit(MOVE, target, result)
+        elif kind is BoolOp:
+            # The value of the operand that decided, as in Python.
+            result = self.temporary()
+            end = Label()
+            self.expression(node.left, result)
+            self.emit(JUMPIFNOT if node.op == 'and' else JUMPIF, result, end)
+            self.expression(node.right, result)
+            self.bind(end)
+            self.top = top
+            target = self.temporary() if target is None else target
+            if target != result:
+                self.emit(MOVE, target, result)
+        else:
+            raise ValueError("Unknown expression " + kind.__name__)
+        return target
+
+    # Jump to label if the condition's truth equals when, otherwise fall through.
+    def jump(self, node, label, when):
+        kind = type(node)
+        top = self.top
+        if kind is Not:
+            self.jump(node.operand, label, not when)
+        elif kind is BoolOp:
+            # and: a false operand decides; or: a true one does.
+            decides = node.op == 'or'
+            if when == decides:
+                self.jump(node.left, label, when)
+                self.jump(node.right, label, when)
+            else:
+                skip = Label()
+                self.jump(node.left, skip, not when)
+                self.jump(node.right, label, when)
+                self.bind(skip)
+        elif kind is Compare:
+            skip = Label()
+            left = self.expression(node.left)
+            last = len(node.ops) - 1
+            for index, (op, comparator) in enumerate(zip(node.ops, node.comparators)):
+                right = self.expression(comparator)
+                if index == last:
+                    self.emit(JUMPIFCMP if when else JUMPIFNOTCMP, left, right, label, COMPARISONS[op])
+                    self.fuseLoopTest()
+                else:
+                    # Every comparison but the last must hold for the chain to go on.
+                    self.emit(JUMPIFNOTCMP, left, right, label if not when else skip, COMPARISONS[op])
+                left = right
+            if last:
+                self.bind(skip)
+        else:
+            self.emit(JUMPIF if when else JUMPIFNOT, self.expression(node), label)
+        self.top = top
+
+    # INCR x followed by a jump back while x < y, as at the bottom of a counting loop, becomes one FORLOOP.
+    def fuseLoopTest(self):
+        code = self.code
+        if len(code) < 2 or self.labelPosition == len(code) - 1:
+            return
+        op, a, b, target, comparison = code[-1]
+        previous = code[-2]
+        if op != JUMPIFCMP or previous[0] != INCR:
+            return
+        if comparison in SWAPPED:
+            a, b, comparison = b, a, SWAPPED[comparison]
+        if a != previous[1] or b == a or (comparison is not operator.lt and comparison is not operator.le):
+            return
+        del code[-2:]
+        del self.lines[-2:]
+        self.emit(FORLOOP if comparison is operator.lt else FORLOOPLE, a, previous[2], b, target)
+
+
+# Runs a compiled program. The main program's registers are the global variables. Calls between VMFunctions
+# do not nest Python calls: the caller's frame is pushed on a stack and the same loop goes on with the callee,
+# up to Python's recursion limit, where the generated code would fail too.
+class VirtualMachine:
+    def __init__(self, filename="<hw>"):
+        self.filename = filename
+
+    # Run a compiled program, with its output written out before returning, like hwruntime.execute.
+    def execute(self, main):
+        hwruntime.reset()
+        try:
+            self.run(main)
+        finally:
+            hwruntime.finish()
+
+    def run(self, main):
+        function = main
+        registers = globals = main.registers.copy()
+        code = main.code
+        pc = 0
+        frames = []     # (function, registers, pc, result register, memo) of each caller.
+        limit = sys.getrecursionlimit()
+        tables = {}     # MemoTable of each memoized function called so far.
+        try:
+            while True:
+                op, a, b, c, d = code[pc]
+                pc += 1
+                if op == INCR:
+                    registers[a] += b
+                elif op == FORLOOP:
+                    value = registers[a] = registers[a] + b
+                    if value < registers[c]:
+                        pc = d
+                elif op == JUMPIFNOTCMP:
+                    if not d(registers[a], registers[b]):
+                        pc = c
+                elif op == JUMPIFCMP:
+                    if d(registers[a], registers[b]):
+                        pc = c
+                elif op == MOVE:
+                    registers[a] = registers[b]
+                elif op == ADD:
+                    registers[a] = registers[b] + registers[c]
+                elif op == MUL:
+                    registers[a] = registers[b] * registers[c]
+                elif op == SUB:
+                    registers[a] = registers[b] - registers[c]
+                elif op == DIV:
+                    registers[a] = registers[b] / registers[c]
+                elif op == GETGLOBAL:
+                    registers[a] = globals[b]
+                elif op == CALL:
+                    callee = registers[b]
+                    args = [registers[register] for register in c]
+                    # Python reads the function's name and then each argument, failing at the first that was
+                    # never assigned, before it calls anything.
+                    if type(callee) is Unassigned:
+                        callee.fail()
+                    for value in args:
+                        if type(value) is Unassigned:
+                            value.fail()
+                    if type(callee) is not VMFunction:
+                        registers[a] = callee(*args)
+                        continue
+                    if len(args) != len(callee.params):
+                        raise TypeError(f"{callee.name}() takes {len(callee.params)} positional arguments but {len(args)} were given")
+                    memo = None
+                    if callee.memo is not None:
+                        # A hit is the result at once. A miss runs the call, and RETURN stores what it returns.
+                        table = tables.get(callee)
+                        if table is None:
+                            table = tables[callee] = hwruntime.MemoTable(callee.name, callee.memo)
+                        key = table.key(tuple(args))
+                        value = table.lookup(key)
+                        if value is not hwruntime.MemoTable:
+                            registers[a] = value
+                            continue
+                        memo = (table, key)
+                    if len(frames) >= limit:
+                        raise RecursionError("maximum recursion depth exceeded")
+                    frames.append((function, registers, pc, a, memo))
+                    function = callee
+                    code = callee.code
+                    registers = callee.registers.copy()
+                    registers[:len(args)] = args
+                    pc = 0
+                elif op == RETURN:
+                    value = registers[a]
+                    if type(value) is Unassigned:
+                        value.fail()
+                    if not frames:
+                        return value
+                    function, registers, pc, result, memo = frames.pop()
+                    code = function.code
+                    registers[result] = value
+                    if memo is not None:
+                        memo[0].store(memo[1], value)
+                elif op == JUMP:
+                    pc = a
+                elif op == COPY:
+                    value = registers[b]
+                    if type(value) is Unassigned:
+                        value.fail()
+                    registers[a] = value
+                elif op == CLOSURE:
+                    registers[a] = registers[b].enclosedBy(function.closure + (registers,))
+                elif op == GETFREE:
+                    value = function.closure[b][c]
+                    if type(value) is Unassigned:
+                        value.failFree()
+                    registers[a] = value
+                elif op == PRINT:
+                    hwPrint(registers[a])
+                elif op == INPUT:
+                    registers[a] = hwInput()
+                elif op == FORLOOPLE:
+                    value = registers[a] = registers[a] + b
+                    if value <= registers[c]:
+                        pc = d
+                elif op == NEG:
+                    registers[a] = -registers[b]
+                elif op == POS:
+                    registers[a] = +registers[b]
+                elif op == NOT:
+                    registers[a] = not registers[b]
+                elif op == COMPARE:
+                    registers[a] = d(registers[b], registers[c])
+                elif op == JUMPIF:
+                    if registers[a]:
+                        pc = b
+                elif op == JUMPIFNOT:
+                    if not registers[a]:
+                        pc = b
+        except Exception as error:
+            # Where it happened in the source, then where each active call was made, innermost first. Runs of
+            # the same line, as in deep recursion, are shown once, like Python's tracebacks do.
+            places = [(function, pc)] + [(caller, callerPc) for caller, _, callerPc, _, _ in reversed(frames)]
+            previous = None
+            repeats = 0
+            for caller, callerPc in places + [(None, 0)]:
+                note = caller and f'  File "{self.filename}", line {caller.lines[callerPc - 1]}, in {caller.name}'
+                if note == previous:
+                    repeats += 1
+                    continue
+                if repeats:
+                    error.add_note(f"  [Previous line repeated {repeats} more times]")
+                    repeats = 0
+                if note:
+                    error.add_note(note)
+                previous = note
+            raise